@@ -1,16 +1,19 @@
 """API路由"""
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import asyncio
 import base64
+import json
 import os
 import tempfile
 
-from database.db import get_db, User, InterviewSession, InterviewReport as DBReport
+from database.db import get_db, SessionLocal, User, InterviewSession, InterviewReport as DBReport, SESSION_DETAIL_COLUMNS
 from models.schemas import (
     InterviewStartRequest, InterviewStartResponse,
     AnswerRequest, AnswerResponse,
-    InterviewReport, UserInfo, InterviewHistoryItem, InterviewSessionDetail,
+    InterviewReport, ReportStatus, UserInfo, InterviewHistoryItem, InterviewSessionDetail,
     WxLoginRequest, UserRegisterRequest
 )
 from services.interview_service import InterviewService
@@ -20,9 +23,13 @@ from services.position_service import position_service
 from services.resume_parser_service import resume_parser_service
 from services.volcengine_tts_service import get_volcengine_tts_service
 from services.knowledge_service import knowledge_service
+from services.tts_jobs import audio_jobs
+from services.cache_warmup import cache_warmup
+from services.report_queue import ReportPending
+from services import quota_service, resilience
 from config import settings
 from datetime import datetime, date
-from fastapi.responses import Response
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
 router = APIRouter()
 interview_service = InterviewService()
@@ -137,8 +144,18 @@ async def start_interview_get_debug():
     raise HTTPException(status_code=405, detail="请使用 POST 方法。GET 请求不被支持。请检查小程序代码是否正确设置了 method: 'POST'")
 
 
+async def _refund_slot(user_id: str):
+    """退还预占的面试次数（使用独立的数据库会话：请求的会话可能处于失败或被取消的事务中）"""
+    try:
+        async with SessionLocal() as db:
+            await quota_service.refund_slot(db, user_id)
+        print(f"[配额] 面试启动失败，已退还 {user_id} 的次数")
+    except Exception as e:
+        print(f"[配额] 退还 {user_id} 的次数失败: {e}")
+
+
 @router.post("/interview/start", response_model=InterviewStartResponse)
-async def start_interview(request: InterviewStartRequest, db: Session = Depends(get_db)):
+async def start_interview(request: InterviewStartRequest, db: AsyncSession = Depends(get_db)):
     """开始面试"""
     try:
         print(f"[DEBUG] 收到开始面试请求: position_id={request.position_id}, position_name={request.position_name}, round={request.round}")
@@ -151,39 +168,29 @@ async def start_interview(request: InterviewStartRequest, db: Session = Depends(
         if not request.user_id:
             raise HTTPException(status_code=401, detail="请先登录后再使用面试功能")
 
-        # 检查用户是否存在
-        user = db.query(User).filter(User.user_id == request.user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="用户不存在，请重新登录")
-
-        # 检查今日免费次数（统一使用 UTC 时间进行日期比较）
-        today_utc = datetime.utcnow().date()
-        if user.last_free_date and user.last_free_date.date() == today_utc:
-            # 根据VIP类型获取配额
-            daily_limit = get_user_daily_limit(user.vip_type)
-            if user.vip_type == 'super':
-                pass  # 超级VIP无限制
-            elif user.free_count_today >= daily_limit:
-                raise HTTPException(status_code=403, detail=f"今日免费次数已用完（{daily_limit}次/天），请购买会员")
-        else:
-            # 重置今日计数
-            user.free_count_today = 0
-            user.last_free_date = datetime.utcnow()
-            db.commit()  # 立即提交重置，避免后续异常导致未保存
+        # 原子地检查并预占今日次数（跨天重置、超限拒绝在同一条 UPDATE 中完成）
+        try:
+            free_count_today, reserved = await quota_service.reserve_slot(db, request.user_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except quota_service.QuotaExceeded as e:
+            raise HTTPException(status_code=403, detail=str(e))
+        print(f"[配额] {request.user_id} 今日第 {free_count_today} 次")
 
         print(f"[DEBUG] 开始调用 interview_service.start_interview")
-        # 开始面试
-        response = interview_service.start_interview(
-            request,
-            db
-        )
+        # 开始面试（会话未提交时退还预占的次数，包括客户端断开导致请求被取消）
+        started = False
+        try:
+            response = await interview_service.start_interview(
+                request,
+                db
+            )
+            started = True
+        finally:
+            if reserved and not started:
+                await asyncio.shield(_refund_slot(request.user_id))
         print(f"[DEBUG] interview_service.start_interview 返回成功")
 
-        # 更新免费次数（超级VIP除外）
-        if user.vip_type != 'super':
-            user.free_count_today += 1
-            db.commit()
-
         print(f"[DEBUG] 准备返回响应: session_id={response.session_id}")
         return response
     except HTTPException:
@@ -200,11 +207,11 @@ async def start_interview(request: InterviewStartRequest, db: Session = Depends(
 
 
 @router.post("/interview/answer", response_model=AnswerResponse)
-async def submit_answer(request: AnswerRequest, db: Session = Depends(get_db)):
-    """提交回答"""
+async def submit_answer(request: AnswerRequest):
+    """提交回答（会话状态由会话缓存管理，不占用请求级数据库会话）"""
     try:
         print(f"收到回答请求 - session_id: {request.session_id}, answer长度: {len(request.answer)}")
-        response = interview_service.process_answer(request, db)
+        response = await interview_service.process_answer(request)
         return response
     except ValueError as e:
         print(f"ValueError in submit_answer: {str(e)}")
@@ -216,20 +223,69 @@ async def submit_answer(request: AnswerRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 
+@router.post("/interview/answer/stream")
+async def submit_answer_stream(request: AnswerRequest):
+    """
+    提交回答（SSE 流式版本）
+
+    事件顺序：feedback -> score -> question（多次，下一个问题的增量片段）-> done
+    done 事件的数据与 /interview/answer 的响应一致，此时对话记录已保存。
+    出错时推送 error 事件。
+    """
+    # 流开始前先校验会话，错误直接以 HTTP 状态码返回（会话状态随之进入会话缓存）
+    # 带幂等键的重试可能针对已结束的会话，已处理过的直接在流中返回
+    if await interview_service.find_answered(request, check_db=False) is None:
+        try:
+            await interview_service.get_active_session(request.session_id)
+        except ValueError as e:
+            if await interview_service.find_answered(request) is None:
+                raise HTTPException(status_code=400, detail=str(e))
+
+    async def event_stream():
+        try:
+            async for event, data in interview_service.process_answer_stream(request):
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print(f"Exception in submit_answer_stream: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            yield f"event: error\ndata: {json.dumps({'detail': f'服务器错误: {str(e)}'}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 禁用 Nginx 缓冲，保证逐条推送
+        }
+    )
+
+
 @router.get("/interview/report/{session_id}", response_model=InterviewReport)
-async def get_report(session_id: str, db: Session = Depends(get_db)):
+async def get_report(session_id: str, db: AsyncSession = Depends(get_db)):
     """获取面试报告"""
     try:
-        report = interview_service.generate_report(session_id, db)
+        report = await interview_service.get_report(session_id, db)
         return report
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ReportPending as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 
+@router.get("/interview/report/{session_id}/status", response_model=ReportStatus)
+async def get_report_status(session_id: str, db: AsyncSession = Depends(get_db)):
+    """查询面试报告生成状态（pending / ready / failed）"""
+    try:
+        return await interview_service.get_report_status(session_id, db)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 @router.post("/user/wx-login", response_model=UserInfo)
-async def wx_login(request: WxLoginRequest, db: Session = Depends(get_db)):
+async def wx_login(request: WxLoginRequest, db: AsyncSession = Depends(get_db)):
     """微信登录 - 通过code换取openid并注册/登录用户"""
     try:
         # 调用微信服务换取openid
@@ -240,15 +296,15 @@ async def wx_login(request: WxLoginRequest, db: Session = Depends(get_db)):
             raise HTTPException(status_code=400, detail="获取openid失败")
 
         # 检查用户是否存在
-        existing_user = db.query(User).filter(User.openid == openid).first()
+        existing_user = await db.scalar(select(User).where(User.openid == openid))
         if existing_user:
             # 用户已存在，更新昵称和头像
             if request.nickname:
                 existing_user.nickname = request.nickname
             if request.avatar:
                 existing_user.avatar = request.avatar
-            db.commit()
-            db.refresh(existing_user)
+            await db.commit()
+            await db.refresh(existing_user)
 
             return UserInfo(
                 user_id=existing_user.user_id,
@@ -273,8 +329,8 @@ async def wx_login(request: WxLoginRequest, db: Session = Depends(get_db)):
             avatar=request.avatar or ""
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
 
         return UserInfo(
             user_id=user.user_id,
@@ -295,11 +351,11 @@ async def wx_login(request: WxLoginRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/user/register", response_model=UserInfo)
-async def register_user(request: UserRegisterRequest, db: Session = Depends(get_db)):
+async def register_user(request: UserRegisterRequest, db: AsyncSession = Depends(get_db)):
     """用户注册（简化版，不需要微信授权）"""
     try:
         # 检查用户是否存在
-        existing_user = db.query(User).filter(User.openid == request.openid).first()
+        existing_user = await db.scalar(select(User).where(User.openid == request.openid))
         if existing_user:
             return UserInfo(
                 user_id=existing_user.user_id,
@@ -324,8 +380,8 @@ async def register_user(request: UserRegisterRequest, db: Session = Depends(get_
             avatar=request.avatar or ""
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
 
         return UserInfo(
             user_id=user.user_id,
@@ -344,9 +400,9 @@ async def register_user(request: UserRegisterRequest, db: Session = Depends(get_
 
 
 @router.get("/user/{user_id}", response_model=UserInfo)
-async def get_user_info(user_id: str, db: Session = Depends(get_db)):
+async def get_user_info(user_id: str, db: AsyncSession = Depends(get_db)):
     """获取用户信息"""
-    user = db.query(User).filter(User.user_id == user_id).first()
+    user = await db.scalar(select(User).where(User.user_id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
 
@@ -362,46 +418,98 @@ async def get_user_info(user_id: str, db: Session = Depends(get_db)):
     )
 
 
+def _encode_history_cursor(created_at: datetime, row_id: int) -> str:
+    """面试历史分页游标：最后一条记录的 (created_at, id)"""
+    raw = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_history_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="无效的分页游标") from e
+
+
 @router.get("/user/{user_id}/history", response_model=List[InterviewHistoryItem])
-async def get_user_history(user_id: str, db: Session = Depends(get_db)):
-    """获取用户面试历史记录"""
+async def get_user_history(
+    user_id: str,
+    response: Response,
+    limit: int = Query(settings.history_page_size, ge=1, le=settings.history_max_page_size),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取用户面试历史记录（按创建时间倒序，keyset 分页）
+
+    Args:
+        limit: 每页条数
+        cursor: 上一页响应头 X-Next-Cursor 的值，不传表示第一页
+
+    响应体为当前页的记录列表；还有更多记录时响应头 X-Next-Cursor 为下一页游标。
+    """
     # 验证用户存在
-    user = db.query(User).filter(User.user_id == user_id).first()
-    if not user:
+    user_exists = await db.scalar(select(User.id).where(User.user_id == user_id))
+    if user_exists is None:
         raise HTTPException(status_code=404, detail="用户不存在")
 
-    # 查询用户的所有面试会话，按创建时间倒序
-    sessions = db.query(InterviewSession).filter(
+    # 会话和报告总分一次外连接查询，只取列表需要的列
+    query = select(
+        InterviewSession.id,
+        InterviewSession.session_id,
+        InterviewSession.position,
+        InterviewSession.round,
+        InterviewSession.is_finished,
+        InterviewSession.created_at,
+        InterviewSession.finished_at,
+        DBReport.total_score
+    ).outerjoin(
+        DBReport, DBReport.session_id == InterviewSession.session_id
+    ).where(
         InterviewSession.user_id == user_id
-    ).order_by(InterviewSession.created_at.desc()).all()
-
-    # 构建历史记录列表
-    history = []
-    for session in sessions:
-        # 尝试获取对应的报告以获取总分
-        report = db.query(DBReport).filter(
-            DBReport.session_id == session.session_id
-        ).first()
-
-        history.append(InterviewHistoryItem(
-            session_id=session.session_id,
-            position=session.position,
-            round=session.round,
-            total_score=report.total_score if report else None,
-            is_finished=session.is_finished,
-            created_at=session.created_at,
-            finished_at=session.finished_at
+    )
+
+    if cursor:
+        cursor_created_at, cursor_id = _decode_history_cursor(cursor)
+        query = query.where(or_(
+            InterviewSession.created_at < cursor_created_at,
+            and_(InterviewSession.created_at == cursor_created_at, InterviewSession.id < cursor_id)
         ))
 
-    return history
+    # 多取一条判断是否还有下一页
+    rows = (await db.execute(
+        query.order_by(InterviewSession.created_at.desc(), InterviewSession.id.desc()).limit(limit + 1)
+    )).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_history_cursor(rows[-1].created_at, rows[-1].id)
+
+    return [
+        InterviewHistoryItem(
+            session_id=row.session_id,
+            position=row.position,
+            round=row.round,
+            total_score=row.total_score,
+            is_finished=row.is_finished,
+            created_at=row.created_at,
+            finished_at=row.finished_at
+        )
+        for row in rows
+    ]
 
 
 @router.get("/interview/session/{session_id}", response_model=InterviewSessionDetail)
-async def get_session_detail(session_id: str, db: Session = Depends(get_db)):
+async def get_session_detail(session_id: str, db: AsyncSession = Depends(get_db)):
     """获取面试会话详情（用于恢复未完成的面试）"""
-    session = db.query(InterviewSession).filter(
-        InterviewSession.session_id == session_id
-    ).first()
+    # 先写回会话缓存中尚未持久化的修改
+    await interview_service.session_cache.flush_session(session_id)
+
+    session = await db.scalar(
+        select(InterviewSession).options(SESSION_DETAIL_COLUMNS).where(InterviewSession.session_id == session_id)
+    )
 
     if not session:
         raise HTTPException(status_code=404, detail="会话不存在")
@@ -411,7 +519,7 @@ async def get_session_detail(session_id: str, db: Session = Depends(get_db)):
         position=session.position,
         round=session.round,
         resume=session.resume,
-        transcript=session.transcript or [],
+        transcript=await interview_service.load_transcript(session, db),
         current_question=session.current_question,
         question_count=session.question_count,
         is_finished=session.is_finished
@@ -438,8 +546,8 @@ async def recognize_voice(audio: UploadFile = File(...)):
             f.write(audio_data)
 
         try:
-            # 调用ASR服务识别
-            text = asr_service.recognize(temp_path)
+            # 调用ASR服务识别（同步 SDK + 容错策略最长等待 asr_deadline，在线程中执行，不阻塞事件循环）
+            text = await asyncio.to_thread(asr_service.recognize, temp_path)
             return {"text": text}
         finally:
             # 识别完成后删除临时文件
@@ -490,6 +598,30 @@ async def synthesize_speech(
         raise HTTPException(status_code=500, detail=f"语音合成失败: {str(e)}")
 
 
+@router.get("/tts/audio/{job_id}")
+async def get_question_audio(job_id: str):
+    """
+    获取问题语音（出题接口返回的 audio_url）
+
+    音频仍在后台合成时等待合成完成（最长 TTS_WAIT_TIMEOUT 秒）
+    """
+    path = await audio_jobs.wait(job_id, timeout=settings.tts_wait_timeout)
+    if not path:
+        raise HTTPException(status_code=404, detail="音频不存在或合成失败")
+    return FileResponse(path, media_type="audio/mpeg")
+
+
+@router.get("/tts/audio/{job_id}/status")
+async def get_question_audio_status(job_id: str):
+    """
+    查询问题语音合成状态
+
+    Returns:
+        status: ready / pending / failed / unknown（任务不在当前进程）
+    """
+    return audio_jobs.status(job_id)
+
+
 @router.get("/tts/voices")
 async def get_voices():
     """
@@ -511,20 +643,41 @@ async def get_cache_stats():
     """
     return {
         "knowledge_service": knowledge_service.get_cache_stats(),
+        "warmup": cache_warmup.get_stats(),
+        "tts_jobs": audio_jobs.get_stats(),
+        "session_cache": interview_service.session_cache.get_stats(),
+        "report_queue": interview_service.report_queue.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+@router.get("/admin/resilience")
+async def get_resilience_stats():
+    """
+    获取上游调用容错状态（管理员接口）
+
+    Returns:
+        各上游（qwen / embedding / asr）的熔断状态、超时和对冲次数、延迟分布
+    """
+    return {
+        "upstreams": resilience.get_resilience_stats(),
         "timestamp": datetime.utcnow().isoformat()
     }
 
 
 @router.post("/admin/clear-cache")
-async def clear_cache():
+async def clear_cache(position: Optional[str] = None):
     """
     清除系统缓存（管理员接口）
 
     使用场景：题库更新后需要清除缓存
+
+    Args:
+        position: 岗位完整名称（如"后端工程师 - Python后端"），只清除该岗位的题库缓存，不传时清除全部
     """
-    knowledge_service.clear_cache()
+    knowledge_service.clear_cache(position)
     return {
         "status": "success",
-        "message": "缓存已清空",
+        "message": f"岗位 {position} 的题库缓存已清空" if position else "缓存已清空",
         "timestamp": datetime.utcnow().isoformat()
     }
@@ -31,9 +31,115 @@ class Settings(BaseSettings):
             return self.database_url
         return f"postgresql://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
 
+    @property
+    def get_async_database_url(self) -> str:
+        """获取异步驱动的数据库连接URL（PostgreSQL 使用 asyncpg，SQLite 使用 aiosqlite）"""
+        url = self.get_database_url
+        for prefix, async_prefix in (
+            ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+            ("postgresql://", "postgresql+asyncpg://"),
+            ("postgres://", "postgresql+asyncpg://"),
+            ("sqlite://", "sqlite+aiosqlite://"),
+        ):
+            if url.startswith(prefix):
+                return async_prefix + url[len(prefix):]
+        return url
+
     # ==================== AI服务配置 ====================
     dashscope_api_key: str  # 阿里云通义千问API Key，必须提供
 
+    # Qwen HTTP 客户端（异步，连接池复用 keep-alive 连接）
+    qwen_api_url: str = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
+    qwen_pool_size: int = 100  # 连接池最大连接数
+    qwen_keepalive_timeout: float = 60.0  # 空闲连接保活时间（秒）
+    qwen_max_concurrency: int = 64  # 单个 worker 同时在途的 LLM 请求上限
+    qwen_request_timeout: float = 90.0  # 单次请求总超时（秒）
+
+    # 按调用场景路由模型（plan: 面试计划, first_question: 开场问题, turn: 每轮评分追问, report: 面试报告, summary: 对话摘要）
+    # timeout 为主模型的延迟预算（秒，流式调用按首个分片计时），超出后降级到 llm_fallback_model
+    llm_plan_model: str = "qwen-max"
+    llm_plan_max_tokens: int = 1000
+    llm_plan_timeout: float = 20.0
+    llm_first_question_model: str = "qwen-plus"
+    llm_first_question_max_tokens: int = 500
+    llm_first_question_timeout: float = 10.0
+    llm_turn_model: str = "qwen-plus"
+    llm_turn_max_tokens: int = 800
+    llm_turn_timeout: float = 15.0
+    llm_report_model: str = "qwen-max"
+    llm_report_max_tokens: int = 2000
+    llm_report_timeout: float = 60.0
+    llm_summary_model: str = "qwen-turbo"  # 滚动摘要，与追问并发执行
+    llm_summary_max_tokens: int = 500
+    llm_summary_timeout: float = 15.0
+    llm_fallback_model: str = "qwen-turbo"  # 为空则不降级
+    llm_fallback_timeout: float = 30.0
+    # 对冲阈值（秒，取该场景的 p95 延迟）：超过后补发一个相同请求，先返回者胜出；0 表示不对冲
+    llm_plan_hedge_after: float = 0.0
+    llm_first_question_hedge_after: float = 4.0
+    llm_turn_hedge_after: float = 8.0
+    llm_report_hedge_after: float = 0.0
+    llm_summary_hedge_after: float = 0.0
+
+    @property
+    def get_llm_routes(self) -> dict:
+        """获取按调用场景划分的模型路由 {task: {model, max_tokens, timeout, hedge_after}}"""
+        return {
+            task: {
+                "model": getattr(self, f"llm_{task}_model"),
+                "max_tokens": getattr(self, f"llm_{task}_max_tokens"),
+                "timeout": getattr(self, f"llm_{task}_timeout"),
+                "hedge_after": getattr(self, f"llm_{task}_hedge_after"),
+            }
+            for task in ("plan", "first_question", "turn", "report", "summary")
+        }
+
+    # ==================== 对话上下文配置 ====================
+    # 较早的对话增量压缩为摘要，提示词只包含「摘要 + 预算内的最近对话」
+    context_keep_recent: int = 6  # 不压缩、原样保留的最近对话条数（3轮）
+    context_summary_every: int = 4  # 未压缩的对话超出保留条数达到该值时，增量更新一次摘要
+    context_turn_token_budget: int = 2000  # 追问时对话历史的 token 预算
+    context_report_token_budget: int = 6000  # 生成报告时对话原文的 token 预算
+
+    # ==================== 会话缓存配置 ====================
+    # 进行中面试的会话状态常驻内存，修改由后台任务定期写回（write-behind），面试结束时立即写回
+    # 多 worker 部署：缓存会话的进程持有会话行上的所有权租约，续期与增量写回合并为一条 UPDATE，
+    # 会话闲置 session_handoff_idle 秒后释放所有权，其他进程才能接手；有会话亲和路由时可以调大
+    session_flush_interval: float = 1.0  # 写回间隔（秒），进程崩溃时最多丢失这段时间内的修改
+    session_handoff_idle: float = 10.0  # 会话闲置多久后写回并释放所有权（秒）
+    session_cache_idle_ttl: float = 1800.0  # 会话闲置多久后移出缓存（秒）
+    session_cache_max_entries: int = 2000  # 最多缓存的会话数
+
+    # ==================== 回答串行化配置 ====================
+    # 同一会话的回答按到达顺序逐个处理（进程内锁 + 跨进程的会话所有权），带幂等键的重试直接返回已处理的结果
+    answer_lock_timeout: float = 60.0  # 等待其他进程释放会话所有权的最长时间（秒）
+    answer_lock_ttl: float = 120.0  # 会话所有权租约有效期（秒），由后台写回任务续期，持有者崩溃后自动失效
+    answer_idempotency_cache_size: int = 10000  # 进程内缓存的已处理回答响应条数
+
+    # ==================== 报告生成配置 ====================
+    # 面试结束后报告在后台 worker 中生成，客户端轮询状态或直接请求报告（pending 时等待完成）
+    report_workers: int = 2  # 每个进程的报告生成 worker 数量
+    report_queue_size: int = 1000  # 报告队列最大长度，队列满时改为请求报告时按需生成
+    report_wait_timeout: float = 60.0  # 请求报告时等待后台生成完成的最长时间（秒）
+    report_lock_timeout: float = 90.0  # 跨进程生成同一报告时等待锁的最长时间（秒），应大于报告模型的超时
+    report_pending_timeout: float = 300.0  # pending 超过该时间且本进程没有对应任务时，视为任务丢失（进程重启或崩溃）并重新提交
+
+    # ==================== 查询向量缓存配置 ====================
+    # 同一查询文本（规范化后）只调用一次向量化接口；磁盘层跨进程共享、重启后保留
+    embedding_cache_max_bytes: int = 64 * 1024 * 1024  # 内存层字节预算（1536 维 float32 约 6KB/条）
+    embedding_cache_dir: str = ""  # 磁盘层目录，为空表示不启用
+    embedding_cache_disk_max_entries: int = 100000  # 磁盘层最多保存的向量条数，达到后不再写入
+
+    # ==================== 上游调用容错配置 ====================
+    # 截止时间（秒）和对冲阈值（秒，取该上游的 p95 延迟，0 表示不对冲），Qwen 的配置见上方
+    embedding_deadline: float = 3.0
+    embedding_hedge_after: float = 0.8
+    asr_deadline: float = 20.0
+    asr_hedge_after: float = 0.0  # 语音识别需要重新上传音频，默认不对冲
+    # 熔断：连续失败达到阈值后熔断一段时间，期间直接走降级逻辑（关键词搜索、默认面试计划等）
+    breaker_failure_threshold: int = 5
+    breaker_recovery_timeout: float = 30.0  # 熔断持续时间（秒），之后放行一个探测请求
+
     # ==================== 语音服务配置 ====================
     # 阿里云ASR（语音识别）
     aliyun_asr_app_key: str = ""
@@ -43,6 +149,9 @@ class Settings(BaseSettings):
     # 火山引擎TTS（豆包语音合成）
     volcengine_app_id: str = ""
     volcengine_access_token: str = ""
+    # 问题语音在后台合成，出题接口立即返回音频地址
+    tts_max_concurrency: int = 4  # 每个进程同时进行的合成请求数
+    tts_wait_timeout: float = 30.0  # 请求未就绪的音频时等待合成完成的最长时间（秒）
 
     # ==================== 微信小程序配置 ====================
     wechat_app_id: str = ""
@@ -55,6 +164,8 @@ class Settings(BaseSettings):
     # ==================== 业务配置 ====================
     free_user_daily_limit: int = 1  # 普通用户每天次数
     normal_vip_daily_limit: int = 2  # 普通VIP每天次数
+    history_page_size: int = 20  # 面试历史每页条数（未指定 limit 时）
+    history_max_page_size: int = 100  # 面试历史每页最大条数
     # 超级VIP无限次，无需配置
 
     vip_monthly_price: float = 9.98  # 月度会员价格
@@ -63,8 +174,28 @@ class Settings(BaseSettings):
     # ==================== Elasticsearch配置 ====================
     es_host: str = "http://47.93.141.137:9200"  # ES 服务地址
     es_index: str = "interview_questions"  # ES 索引名
+    question_cache_size: int = 5000  # 题目缓存容量（条），会话中只保存题目ID，取用时从缓存解析
+    position_cache_ttl: float = 1800.0  # 岗位题库池缓存的新鲜期（秒）
+    position_cache_stale_ttl: float = 3600.0  # 过期后仍返回旧数据并在后台刷新的宽限期（秒），超过后等待查询
+    position_cache_max_bytes: int = 32 * 1024 * 1024  # 岗位题库池缓存字节预算
+    position_pool_size: int = 50  # 开始面试时获取的岗位参考题库池条数
+    question_answer_snippet_chars: int = 200  # 检索结果中保留的参考答案字符数
+    cache_warmup_enabled: bool = True  # 启动时在后台预取 positions.json 中所有岗位的题库池
+    cache_warmup_concurrency: int = 4  # 预热的并发查询数
     es_username: str = ""
     es_password: str = ""
+    es_connections_per_node: int = 20  # 异步客户端到每个节点的连接池大小
+    es_request_timeout: float = 5.0  # 单次请求超时（秒）
+    es_max_retries: int = 2  # 连接失败或超时后的重试次数
+    # 向量检索：question_vector 为 HNSW 索引的 dense_vector，近似 kNN（修改后需运行 scripts/reindex_questions.py --force）
+    es_vector_dims: int = 1536  # 向量维度（text-embedding-v2）
+    es_hnsw_m: int = 16  # HNSW 每个节点的邻居数，越大召回越高、索引越大
+    es_hnsw_ef_construction: int = 100  # 建图时的候选数，越大图质量越高、写入越慢
+    es_knn_num_candidates: int = 100  # kNN 查询时每个分片的候选数（不小于返回条数），越大召回越高、越慢
+    # 混合搜索：关键词和 kNN 两路并发查询，RRF 融合排名（各路取不少于返回条数的结果参与融合）
+    es_rrf_k: int = 60  # RRF 排名常数，越大各名次之间的得分差距越小
+    es_hybrid_keyword_size: int = 50  # 关键词一路参与融合的条数
+    es_hybrid_knn_size: int = 50  # 向量一路参与融合的条数（kNN 的 k）
 
     # ==================== 应用配置 ====================
     port: int = 8003
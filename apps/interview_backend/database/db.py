@@ -1,21 +1,26 @@
 """数据库模型定义"""
-from sqlalchemy import create_engine, Column, String, Integer, Float, DateTime, Boolean, Text, JSON
+from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, Text, JSON, Index, UniqueConstraint
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import load_only
 from datetime import datetime
+from typing import AsyncIterator
 from config import settings
 
-# 数据库配置 - 从config获取
-DATABASE_URL = settings.get_database_url
+# 数据库配置 - 从config获取（异步驱动：PostgreSQL 使用 asyncpg）
+DATABASE_URL = settings.get_async_database_url
 
-engine = create_engine(
+engine = create_async_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
     pool_pre_ping=True,  # 连接池健康检查
-    pool_size=10,  # 连接池大小
-    max_overflow=20  # 最大溢出连接数
+    # SQLite（aiosqlite）不使用连接池
+    **({} if "sqlite" in DATABASE_URL else {
+        "pool_size": 10,  # 连接池大小
+        "max_overflow": 20  # 最大溢出连接数
+    })
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 提交后不过期对象属性：异步会话中访问过期属性会触发隐式 IO 而报错
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
 Base = declarative_base()
 
 
@@ -47,14 +52,26 @@ class InterviewSession(Base):
     position = Column(String(50), nullable=False)  # 岗位类型
     round = Column(String(50), nullable=False)  # 面试轮次
     resume = Column(Text)  # 简历
-    transcript = Column(JSON, default=list)  # 对话记录 [{role, content, timestamp, score}]
+    transcript = Column(JSON, default=list)  # 旧版对话记录 [{role, content, timestamp, score}]，新会话写入 interview_turns
     interview_plan = Column(JSON, default=dict)  # 面试计划 {topics: [], current_topic: "", planned_questions: [], completed_topics: []}
+    transcript_summary = Column(Text)  # 较早对话的滚动摘要
+    summary_upto = Column(Integer, default=0)  # 摘要已覆盖的对话条数（按 seq 计）
     current_question = Column(Text)  # 当前问题
     question_count = Column(Integer, default=0)  # 已提问数量
     is_finished = Column(Boolean, default=False)
+    report_status = Column(String(20))  # 报告生成状态: None, pending, ready, failed
+    report_error = Column(Text)  # 报告生成失败原因
+    report_requested_at = Column(DateTime)  # 报告任务最近一次提交时间（pending 过久且没有进程在处理时重新提交）
+    turn_lock_owner = Column(String(64))  # 缓存该会话、持有所有权的进程（跨进程串行化同一会话的回答）
+    turn_lock_until = Column(DateTime)  # 所有权租约到期时间
     created_at = Column(DateTime, default=datetime.utcnow)
     finished_at = Column(DateTime)
 
+    __table_args__ = (
+        # 用户面试历史按创建时间倒序的 keyset 分页
+        Index("ix_interview_sessions_user_created", "user_id", "created_at"),
+    )
+
 
 class InterviewReport(Base):
     """面试报告表"""
@@ -69,7 +86,32 @@ class InterviewReport(Base):
     logic_thinking = Column(Float)  # 逻辑思维
     experience = Column(Float)  # 项目经验
     suggestions = Column(JSON, default=list)  # 改进建议
-    transcript = Column(JSON, default=list)  # 完整对话记录
+    transcript = Column(JSON, default=list)  # 旧版报告的对话记录快照，新报告从 interview_turns 读取
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class InterviewTurn(Base):
+    """面试对话记录（每条发言一行，只追加不修改）"""
+    __tablename__ = "interview_turns"
+    __table_args__ = (
+        UniqueConstraint("session_id", "seq", name="uq_interview_turns_session_seq"),
+        Index("ix_interview_turns_session_question", "session_id", "question_number"),
+        UniqueConstraint("session_id", "idempotency_key", name="uq_interview_turns_session_idempotency"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(100), nullable=False)
+    seq = Column(Integer, nullable=False)  # 会话内的发言序号（从0开始）
+    question_number = Column(Integer)  # 所属问题编号
+    role = Column(String(20), nullable=False)  # interviewer, candidate
+    content = Column(Text, nullable=False)
+    score = Column(Float)  # 候选人回答的即时评分
+    hint = Column(Text)  # 改进提示
+    feedback = Column(String(100))  # 面试官的互动反馈
+    topic = Column(String(50))  # 所属主题
+    action = Column(String(20))  # follow_up, next_topic
+    style = Column(String(20))  # 面试官风格（仅开场问题记录）
+    idempotency_key = Column(String(64))  # 候选人回答的幂等键（客户端重试时不变）
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -88,15 +130,51 @@ class Payment(Base):
     paid_at = Column(DateTime)
 
 
-def init_db():
+# ==================== 查询投影 ====================
+# 会话行带有简历、旧版对话记录、面试计划等大字段，报告行带有旧版对话快照。
+# 各接口按需只加载用到的列；未加载的列被访问时直接报错（raiseload），不会在异步会话中触发隐式查询。
+# 对话记录统一通过 transcript_store.load_transcript 读取，不需要加载 InterviewSession.transcript。
+
+# 进行中面试的会话状态（会话缓存）：除旧版对话记录外的全部字段
+SESSION_STATE_COLUMNS = load_only(
+    InterviewSession.session_id, InterviewSession.user_id, InterviewSession.position, InterviewSession.round,
+    InterviewSession.resume, InterviewSession.interview_plan, InterviewSession.transcript_summary,
+    InterviewSession.summary_upto, InterviewSession.current_question, InterviewSession.question_count,
+    InterviewSession.is_finished, InterviewSession.finished_at, InterviewSession.report_status,
+    InterviewSession.report_error, InterviewSession.report_requested_at,
+    raiseload=True
+)
+
+# 会话详情接口（恢复未完成的面试）
+SESSION_DETAIL_COLUMNS = load_only(
+    InterviewSession.session_id, InterviewSession.position, InterviewSession.round, InterviewSession.resume,
+    InterviewSession.current_question, InterviewSession.question_count, InterviewSession.is_finished,
+    raiseload=True
+)
+
+# 报告状态查询
+SESSION_REPORT_STATUS_COLUMNS = load_only(
+    InterviewSession.session_id, InterviewSession.is_finished, InterviewSession.report_status,
+    InterviewSession.report_error, InterviewSession.report_requested_at,
+    raiseload=True
+)
+
+# 生成报告：岗位、摘要和报告状态
+SESSION_REPORT_COLUMNS = load_only(
+    InterviewSession.session_id, InterviewSession.user_id, InterviewSession.position,
+    InterviewSession.transcript_summary, InterviewSession.summary_upto, InterviewSession.report_status,
+    InterviewSession.report_error,
+    raiseload=True
+)
+
+
+async def init_db():
     """初始化数据库"""
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
 
-def get_db():
+async def get_db() -> AsyncIterator[AsyncSession]:
     """获取数据库会话"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
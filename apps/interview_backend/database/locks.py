@@ -0,0 +1,76 @@
+"""跨进程互斥锁
+
+多个 uvicorn worker 之间协调同一资源：
+- advisory_lock：基于 Postgres advisory lock（如同一会话的报告生成），锁持有在从连接池取出的一条连接上，
+  连接归还连接池时并不会释放（会话级锁），因此退出时总在 finally 中显式解锁，解锁失败则作废该连接；
+  进程崩溃时连接断开，数据库自动释放。非 Postgres 数据库（本地 SQLite 开发）直接放行
+
+同一会话的回答处理由会话缓存的所有权租约互斥，见 services/session_cache.py。
+"""
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy import text
+
+from database.db import engine
+
+
+def lock_key(name: str) -> int:
+    """把锁名映射为 advisory lock 使用的 64 位有符号整数"""
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@asynccontextmanager
+async def advisory_lock(name: str, timeout: float, poll_interval: float = 0.2) -> AsyncIterator[bool]:
+    """
+    获取跨进程互斥锁（轮询 pg_try_advisory_lock，不阻塞事件循环）
+
+    Args:
+        name: 锁名，如 "report:session_xxx"
+        timeout: 最长等待时间（秒）
+        poll_interval: 轮询间隔（秒）
+
+    Yields:
+        是否成功获取锁；超时返回 False，由调用方决定是否继续执行
+    """
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+
+    key = lock_key(name)
+    async with engine.connect() as conn:
+        acquired = False
+        held = False
+        try:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while True:
+                # 查询途中被取消时数据库端可能已经加锁，按持有处理
+                held = True
+                acquired = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})
+                held = acquired
+                if acquired or loop.time() >= deadline:
+                    break
+                await asyncio.sleep(poll_interval)
+
+            if not acquired:
+                print(f"[分布式锁] 等待 {name} 超时（{timeout}s）")
+            yield acquired
+        finally:
+            if held:
+                await _advisory_unlock(conn, key, name)
+
+
+async def _advisory_unlock(conn, key: int, name: str):
+    """释放 advisory lock；失败时作废这条连接（连接断开即释放锁），不把仍持有锁的连接还给连接池"""
+    try:
+        await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+    except BaseException as e:
+        print(f"[分布式锁] 释放 {name} 失败，丢弃该连接: {e!r}")
+        await conn.invalidate()
+        if not isinstance(e, Exception):
+            raise
+
@@ -3,11 +3,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
+import asyncio
 import os
 import logging
 
-from database.db import init_db
-from api.routes import router
+from database.db import init_db, engine
+from api.routes import router, interview_service
+from services.knowledge_service import knowledge_service
+from services.cache_warmup import cache_warmup
 from config import settings
 from utils.logger import setup_logger
 from middleware.logging_middleware import RequestLoggingMiddleware
@@ -33,13 +36,34 @@ async def lifespan(app: FastAPI):
     logger.info(f"📝 日志级别: {settings.log_level}")
     logger.info(f"📁 日志目录: {settings.log_dir}")
 
-    init_db()
+    await init_db()
     logger.info("✅ 数据库初始化完成")
 
+    await interview_service.report_queue.start()
+    # 重新提交上次关闭或崩溃时未完成的报告
+    await interview_service.report_queue.recover()
+    logger.info("✅ 报告生成队列已启动")
+
+    await interview_service.session_cache.start()
+    logger.info("✅ 会话缓存已启动")
+
+    # 后台检查题库索引映射（ES 不可用时不阻塞启动）
+    index_check = asyncio.create_task(knowledge_service.check_index())
+
+    # 后台预热所有岗位的题库池（不阻塞就绪，进度见 /admin/cache-stats）
+    cache_warmup.start()
+
     yield
 
     # 关闭时清理资源
     logger.info("👋 应用正在关闭...")
+    index_check.cancel()
+    await cache_warmup.stop()
+    await interview_service.session_cache.stop()
+    await interview_service.report_queue.stop()
+    await interview_service.qwen_service.aclose()
+    await knowledge_service.aclose()
+    await engine.dispose()
     logger.info("✅ 应用已安全关闭")
 
 
@@ -60,6 +84,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # 面试历史分页游标
 )
 
 # 注册路由
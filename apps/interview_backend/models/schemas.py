@@ -1,5 +1,5 @@
 """数据模型定义"""
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 from datetime import datetime
 from enum import Enum
@@ -44,7 +44,8 @@ class InterviewStartResponse(BaseModel):
     session_id: str
     question: str
     question_type: str = "开场"
-    audio_url: Optional[str] = None  # TTS音频URL
+    audio_url: Optional[str] = None  # TTS音频URL（后台合成，未就绪时请求会等待）
+    audio_job_id: Optional[str] = None  # TTS合成任务ID，可轮询 /tts/audio/{audio_job_id}/status
 
 
 class AnswerRequest(BaseModel):
@@ -52,6 +53,7 @@ class AnswerRequest(BaseModel):
     session_id: str
     answer: str
     finish_interview: bool = False  # 用户是否主动结束面试
+    idempotency_key: Optional[str] = Field(None, max_length=64)  # 客户端为每次提交生成的唯一键，重试时保持不变
 
 
 class AnswerResponse(BaseModel):
@@ -60,7 +62,8 @@ class AnswerResponse(BaseModel):
     instant_score: Optional[float]
     hint: Optional[str]
     is_finished: bool = False
-    audio_url: Optional[str] = None  # TTS音频URL（预生成）
+    audio_url: Optional[str] = None  # TTS音频URL（后台合成，未就绪时请求会等待）
+    audio_job_id: Optional[str] = None  # TTS合成任务ID，可轮询 /tts/audio/{audio_job_id}/status
 
 
 class InterviewReport(BaseModel):
@@ -76,6 +79,13 @@ class InterviewReport(BaseModel):
     created_at: datetime
 
 
+class ReportStatus(BaseModel):
+    """面试报告生成状态"""
+    session_id: str
+    status: str  # not_started（面试未结束）, pending, ready, failed
+    error: Optional[str] = None  # 生成失败原因
+
+
 class UserInfo(BaseModel):
     """用户信息"""
     user_id: str
@@ -0,0 +1,211 @@
+"""同步 / 异步数据库访问压测 - 模拟并发的 /interview/answer
+
+每个模拟请求按回答接口的数据库访问模式执行：读取会话和对话记录 → 等待大模型（sleep 模拟）→ 写回本轮修改。
+
+- sync：迁移前的写法，async 路由中直接调用同步 SQLAlchemy，请求级会话在整个请求期间（包括等待大模型）占用连接，
+  连接池（10 + 20）耗尽时 checkout 会阻塞整个事件循环
+- async：当前写法，asyncpg / aiosqlite 异步会话，只在读写时短暂占用连接
+
+用法（在 apps/interview_backend 目录下，使用 .env 中的数据库配置）：
+    python scripts/benchmark_db_modes.py --concurrency 50 --requests 500 --llm-latency 0.5
+
+输出每种模式的吞吐、延迟分位数、失败数和事件循环最大延迟。测试数据写入 interview_sessions / interview_turns，结束后删除。
+同步模式下连接池 checkout 超时的客户端计为失败并停止发送请求。应在 PostgreSQL 上运行，SQLite 的写入串行化会掩盖差异。
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, delete, select, update
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+
+from config import settings
+from database.db import SessionLocal, InterviewSession, InterviewTurn, engine as async_engine, init_db
+
+
+SESSION_PREFIX = "bench_"
+
+
+def create_sync_factory(pool_timeout: float):
+    """迁移前的同步引擎配置（连接池 10 + 20）"""
+    url = settings.get_database_url
+    sync_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False} if "sqlite" in url else {},
+        pool_pre_ping=True,
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout=pool_timeout
+    )
+    return sync_engine, sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+
+
+async def seed_sessions(count: int) -> list:
+    """创建压测用的会话"""
+    session_ids = [f"{SESSION_PREFIX}{uuid.uuid4().hex[:16]}" for _ in range(count)]
+    async with SessionLocal() as db:
+        for session_id in session_ids:
+            db.add(InterviewSession(
+                session_id=session_id,
+                position="压测岗位",
+                round="技术一面",
+                interview_plan={"topics": ["a", "b", "c"], "current_topic_index": 0, "completed_topics": []},
+                current_question="压测问题",
+                question_count=1
+            ))
+        await db.commit()
+    return session_ids
+
+
+async def cleanup_sessions():
+    async with SessionLocal() as db:
+        await db.execute(delete(InterviewTurn).where(InterviewTurn.session_id.like(f"{SESSION_PREFIX}%")))
+        await db.execute(delete(InterviewSession).where(InterviewSession.session_id.like(f"{SESSION_PREFIX}%")))
+        await db.commit()
+
+
+async def sync_turn(factory, session_id: str, seq: int, llm_latency: float):
+    """迁移前：请求级同步会话，等待大模型期间一直占用连接"""
+    db = factory()
+    try:
+        session = db.query(InterviewSession).filter(InterviewSession.session_id == session_id).first()
+        db.query(InterviewTurn).filter(InterviewTurn.session_id == session_id).order_by(InterviewTurn.seq).all()
+
+        await asyncio.sleep(llm_latency)
+
+        session.question_count += 1
+        db.add(InterviewTurn(session_id=session_id, seq=seq, question_number=session.question_count, role="candidate", content="压测回答"))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def async_turn(session_id: str, seq: int, llm_latency: float):
+    """当前：异步会话，只在读写时占用连接"""
+    async with SessionLocal() as db:
+        session = await db.scalar(select(InterviewSession).where(InterviewSession.session_id == session_id))
+        (await db.scalars(select(InterviewTurn).where(InterviewTurn.session_id == session_id).order_by(InterviewTurn.seq))).all()
+        question_count = session.question_count
+
+    await asyncio.sleep(llm_latency)
+
+    async with SessionLocal() as db:
+        db.add(InterviewTurn(session_id=session_id, seq=seq, question_number=question_count + 1, role="candidate", content="压测回答"))
+        await db.execute(
+            update(InterviewSession).where(InterviewSession.session_id == session_id).values(question_count=question_count + 1)
+        )
+        await db.commit()
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """事件循环最大延迟：定时任务实际唤醒时间与预期的最大差值"""
+    loop = asyncio.get_running_loop()
+    max_lag = 0.0
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, loop.time() - expected)
+    return max_lag
+
+
+async def run_mode(mode: str, args) -> dict:
+    session_ids = await seed_sessions(args.concurrency)
+    sync_engine, factory = create_sync_factory(args.pool_timeout) if mode == "sync" else (None, None)
+
+    latencies = []
+    errors = 0
+    counter = iter(range(args.requests))
+
+    async def client(index: int):
+        nonlocal errors
+        session_id = session_ids[index]
+        seq = 0
+        for _ in counter:
+            seq += 1
+            started = time.perf_counter()
+            try:
+                if mode == "sync":
+                    await sync_turn(factory, session_id, seq, args.llm_latency)
+                else:
+                    await async_turn(session_id, seq, args.llm_latency)
+                latencies.append(time.perf_counter() - started)
+            except PoolTimeoutError:
+                # 同步连接池耗尽：checkout 期间整个事件循环被阻塞，该客户端放弃（相当于请求超时）
+                errors += 1
+                return
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"[压测] {mode} 请求失败: {type(e).__name__}: {e}")
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    max_lag = await lag_task
+
+    if sync_engine is not None:
+        sync_engine.dispose()
+    await cleanup_sessions()
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "mode": mode,
+        "completed": len(latencies),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+        "max_loop_lag_ms": max_lag * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="同步 / 异步数据库访问压测（模拟并发回答请求）")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发请求数（默认 50，超过同步连接池上限 30）")
+    parser.add_argument("--requests", type=int, default=500, help="每种模式的总请求数")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="模拟的大模型响应时间（秒）")
+    parser.add_argument("--pool-timeout", type=float, default=2.0, help="同步模式连接池 checkout 超时（秒）")
+    parser.add_argument("--modes", default="sync,async", help="要测试的模式，逗号分隔")
+    args = parser.parse_args()
+
+    await init_db()
+    print(f"[压测] 数据库: {settings.get_async_database_url.split('@')[-1]}，并发 {args.concurrency}，"
+          f"请求 {args.requests}，模拟大模型延迟 {args.llm_latency}s，开始时间 {datetime.now().isoformat(timespec='seconds')}")
+
+    results = []
+    for mode in args.modes.split(","):
+        result = await run_mode(mode.strip(), args)
+        results.append(result)
+        print(f"[压测] {mode} 完成")
+
+    await async_engine.dispose()
+
+    header = f"{'模式':<6}{'完成':>8}{'失败':>6}{'耗时s':>9}{'吞吐rps':>10}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'循环延迟ms':>12}"
+    print(header)
+    for r in results:
+        print(f"{r['mode']:<8}{r['completed']:>8}{r['errors']:>6}{r['elapsed_s']:>9.2f}{r['throughput_rps']:>10.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_loop_lag_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
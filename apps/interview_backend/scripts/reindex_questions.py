@@ -0,0 +1,145 @@
+"""题库索引迁移 - 重建为 HNSW 向量索引（近似 kNN 检索）
+
+旧索引的 question_vector 没有图索引时，kNN 查询会失败（检索降级为关键词搜索）。本命令：
+1. 新建带版本号的索引（托管映射，保留旧索引中其他字段的映射）
+2. 用 _reindex 复制全部题目（后台任务，打印进度）
+3. 可选：为缺少向量的题目补算向量（--embed-missing）
+4. 把别名 ES_INDEX 原子地切换到新索引
+
+ES_INDEX 原本是实体索引（不是别名）时，别名不能与其同名，需要加 --delete-old 在切换的同一操作中删除旧索引。
+
+用法（在 apps/interview_backend 目录下，使用 .env 中的 ES 配置）：
+    python scripts/reindex_questions.py --dry-run
+    python scripts/reindex_questions.py --delete-old --embed-missing
+
+切换完成后调用 POST /admin/clear-cache 清除各进程的题库缓存。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from elasticsearch.helpers import async_bulk, async_scan
+
+from config import settings
+from services.knowledge_service import knowledge_service
+from services.question_index import (
+    VECTOR_FIELD,
+    build_index_mapping,
+    ensure_index,
+    get_properties,
+    supports_knn,
+    versioned_index_name,
+)
+
+
+async def wait_for_task(es, task_id: str, poll_interval: float = 2.0) -> dict:
+    """轮询 _reindex 后台任务直到完成"""
+    while True:
+        task = (await es.tasks.get(task_id=task_id)).body
+        status = task["task"]["status"]
+        print(f"[重建索引] 进度 {status['created'] + status['updated']}/{status['total']}")
+        if task.get("completed"):
+            return task
+        await asyncio.sleep(poll_interval)
+
+
+async def embed_missing(es, index: str, batch_size: int) -> int:
+    """为缺少向量的题目补算向量（用题目文本），返回补算条数"""
+    missing_query = {"bool": {"must_not": {"exists": {"field": VECTOR_FIELD}}}}
+
+    async def actions():
+        async for hit in async_scan(es, index=index, query={"query": missing_query, "_source": ["question"]}, size=batch_size):
+            question = hit["_source"].get("question")
+            vector = await knowledge_service._get_query_vector(question) if question else None
+            if vector is None:
+                print(f"[重建索引] 题目 {hit['_id']} 向量化失败，跳过")
+                continue
+            yield {"_op_type": "update", "_index": index, "_id": hit["_id"], "doc": {VECTOR_FIELD: vector}}
+
+    updated, _ = await async_bulk(es, actions(), chunk_size=batch_size, refresh=True)
+    return updated
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="把题库重建为 HNSW 向量索引并切换别名")
+    parser.add_argument("--index", default=settings.es_index, help="题库别名（默认 ES_INDEX）")
+    parser.add_argument("--dry-run", action="store_true", help="只打印新索引映射，不做修改")
+    parser.add_argument("--force", action="store_true", help="已支持 kNN 时也重建（如修改了 HNSW 参数）")
+    parser.add_argument("--delete-old", action="store_true", help="切换后删除旧索引（旧索引是实体索引时必需）")
+    parser.add_argument("--embed-missing", action="store_true", help="为缺少向量的题目补算向量")
+    parser.add_argument("--batch-size", type=int, default=500, help="复制和补算向量的批大小")
+    args = parser.parse_args()
+
+    try:
+        await reindex(knowledge_service.es, args)
+    finally:
+        await knowledge_service.aclose()
+
+
+async def reindex(es, args):
+    """按命令行参数重建题库索引"""
+    alias = args.index
+    properties = await get_properties(es, alias)
+
+    if properties is None:
+        if args.dry_run:
+            print(json.dumps(build_index_mapping(), ensure_ascii=False, indent=2))
+            return
+        print(f"[重建索引] 题库 {alias} 不存在，按托管映射创建: {await ensure_index(es, alias)}")
+        return
+
+    if supports_knn(properties) and not args.force:
+        print(f"[重建索引] 题库 {alias} 已是 HNSW 向量索引，无需重建（修改 HNSW 参数后用 --force）")
+        return
+
+    is_alias = bool(await es.indices.exists_alias(name=alias))
+    old_indices = list((await es.indices.get_alias(name=alias)).body) if is_alias else [alias]
+    if not is_alias and not args.delete_old:
+        print(f"[重建索引] {alias} 是实体索引，别名不能与其同名，请加 --delete-old（切换时删除旧索引）")
+        sys.exit(1)
+
+    target = versioned_index_name(alias)
+    mappings = build_index_mapping(properties)
+    if args.dry_run:
+        print(f"[重建索引] 将创建 {target}，复制 {old_indices}，切换别名 {alias}")
+        print(json.dumps(mappings, ensure_ascii=False, indent=2))
+        return
+
+    await es.indices.create(index=target, mappings=mappings)
+    print(f"[重建索引] 已创建 {target}")
+
+    task_id = (await es.reindex(
+        source={"index": alias, "size": args.batch_size},
+        dest={"index": target},
+        wait_for_completion=False,
+        refresh=True
+    ))["task"]
+    task = await wait_for_task(es, task_id)
+    failures = task.get("response", {}).get("failures") or []
+    if failures or task.get("error"):
+        print(f"[重建索引] 复制失败，保留旧索引，新索引 {target} 未切换: {task.get('error') or failures[:3]}")
+        sys.exit(1)
+
+    if args.embed_missing:
+        print(f"[重建索引] 补算向量 {await embed_missing(es, target, args.batch_size)} 条")
+    missing = (await es.count(index=target, query={"bool": {"must_not": {"exists": {"field": VECTOR_FIELD}}}}))["count"]
+    if missing:
+        print(f"[重建索引] ⚠️ {missing} 条题目没有向量，kNN 检索不到（可加 --embed-missing 补算）")
+
+    # 原子切换：旧别名移除（或删除旧实体索引）与新别名添加在同一请求中完成
+    actions = [{"add": {"index": target, "alias": alias}}]
+    if args.delete_old:
+        actions += [{"remove_index": {"index": index}} for index in old_indices]
+    else:
+        actions += [{"remove": {"index": index, "alias": alias}} for index in old_indices]
+    await es.indices.update_aliases(actions=actions)
+    print(f"[重建索引] ✅ 别名 {alias} 已切换到 {target}" + ("，旧索引已删除" if args.delete_old else f"，旧索引 {old_indices} 保留"))
+    print("[重建索引] 请调用 POST /admin/clear-cache 清除各进程的题库缓存")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,6 +2,7 @@
 import dashscope
 from dashscope.audio.asr import Recognition
 from config import settings
+from services.resilience import resilience_policies, upstream_error
 import os
 
 
@@ -62,58 +63,59 @@ class ASRService:
                 audio_format = 'mp3'
                 print(f"未知格式(header: {header[:4].hex()})，默认使用mp3格式识别")
 
-            # 创建 Recognition 实例并调用
-            recognition = Recognition(
-                model='paraformer-realtime-v2',
-                format=audio_format,
-                sample_rate=16000,
-                callback=None
-            )
-
-            # 调用实时语音识别 API（传入文件路径）
+            def recognize_call():
+                # 每次调用创建新的 Recognition 实例（对冲请求不能共享实例）
+                recognition = Recognition(
+                    model='paraformer-realtime-v2',
+                    format=audio_format,
+                    sample_rate=16000,
+                    callback=None
+                )
+                result = recognition.call(audio_file_path)
+                if result.status_code != 200:
+                    # 4xx（如音频格式不支持）不重试、不计入熔断，其余错误可以对冲重试
+                    raise upstream_error(
+                        result.status_code,
+                        f"ASR识别失败，状态码: {result.status_code}, 错误信息: {getattr(result, 'message', '')}"
+                    )
+                return result
+
+            # 调用实时语音识别 API（传入文件路径），经过容错策略：截止时间 + 对冲请求 + 熔断
             print(f"调用ASR API，文件路径: {audio_file_path}")
-            result = recognition.call(audio_file_path)
+            result = resilience_policies["asr"].call_sync(recognize_call)
 
             print(f"ASR调用完成，状态码: {result.status_code}")
             print(f"完整结果: {result}")
 
-            # 解析识别结果
-            if result.status_code == 200:
-                # 从 result.output 提取文本
-                if hasattr(result, 'output') and result.output:
-                    print(f"result.output: {result.output}")
-
-                    # 方式1: output['sentence'][0]['text'] (数组格式)
-                    if isinstance(result.output, dict):
-                        if 'sentence' in result.output:
-                            sentence = result.output['sentence']
-                            # sentence 是数组
-                            if isinstance(sentence, list) and len(sentence) > 0:
-                                if isinstance(sentence[0], dict) and 'text' in sentence[0]:
-                                    text = sentence[0]['text']
-                                    print(f"ASR识别结果: {text}")
-                                    return text
-                            # sentence 是字典
-                            elif isinstance(sentence, dict) and 'text' in sentence:
-                                text = sentence['text']
+            # 解析识别结果：从 result.output 提取文本（非 200 的结果已在 recognize_call 中抛出）
+            if hasattr(result, 'output') and result.output:
+                print(f"result.output: {result.output}")
+
+                # 方式1: output['sentence'][0]['text'] (数组格式)
+                if isinstance(result.output, dict):
+                    if 'sentence' in result.output:
+                        sentence = result.output['sentence']
+                        # sentence 是数组
+                        if isinstance(sentence, list) and len(sentence) > 0:
+                            if isinstance(sentence[0], dict) and 'text' in sentence[0]:
+                                text = sentence[0]['text']
                                 print(f"ASR识别结果: {text}")
                                 return text
-
-                        # 方式2: output['text']
-                        if 'text' in result.output:
-                            text = result.output['text']
-                            print(f"ASR识别结果（方式2）: {text}")
+                        # sentence 是字典
+                        elif isinstance(sentence, dict) and 'text' in sentence:
+                            text = sentence['text']
+                            print(f"ASR识别结果: {text}")
                             return text
 
-                print("警告：ASR返回结果为空")
-                print(f"详细信息 - output: {result.output if hasattr(result, 'output') else 'No output'}")
-                return self._mock_recognize(audio_file_path)
-            else:
-                error_msg = f"ASR识别失败，状态码: {result.status_code}"
-                print(error_msg)
-                if hasattr(result, 'message'):
-                    print(f"错误信息: {result.message}")
-                raise Exception(error_msg)
+                    # 方式2: output['text']
+                    if 'text' in result.output:
+                        text = result.output['text']
+                        print(f"ASR识别结果（方式2）: {text}")
+                        return text
+
+            print("警告：ASR返回结果为空")
+            print(f"详细信息 - output: {result.output if hasattr(result, 'output') else 'No output'}")
+            return self._mock_recognize(audio_file_path)
 
         except Exception as e:
             print(f"ASR识别错误: {e}")
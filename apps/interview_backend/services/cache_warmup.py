@@ -0,0 +1,106 @@
+"""启动缓存预热 - 在后台预取 positions.json 中所有岗位的参考题库池
+
+每个岗位第一次开始面试时需要一次混合检索（向量化 + ES 查询）。部署后在后台按有限并发预取，
+同时填充岗位题库池缓存和查询向量缓存；不阻塞应用就绪，预热完成前的请求照常按需查询。
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import settings
+from services.knowledge_service import knowledge_service
+from services.position_service import position_service
+
+
+class CacheWarmup:
+    """岗位题库池预热（每个进程启动时执行一次）"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "status": "idle",  # idle / running / done / cancelled / disabled
+            "total": 0,
+            "completed": 0,
+            "failed": 0,
+            "started_at": None,
+            "finished_at": None,
+            "elapsed_s": None,
+        }
+        self._failed_positions: List[str] = []
+        self._started = 0.0
+
+    def start(self):
+        """在后台开始预热（立即返回）"""
+        if not settings.cache_warmup_enabled:
+            self._stats["status"] = "disabled"
+            return
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """取消未完成的预热"""
+        if self._task is None or self._task.done():
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    @staticmethod
+    def _positions() -> List[str]:
+        """需要预热的岗位（与开始面试时查询题库池使用的完整名称一致）"""
+        return sorted({
+            position_service.get_position_full_name(position_id)
+            for position_id in position_service.position_map
+        })
+
+    async def _run(self):
+        positions = self._positions()
+        self._started = time.monotonic()
+        self._stats.update(status="running", total=len(positions), started_at=datetime.utcnow().isoformat())
+        print(f"[缓存预热] 开始预取 {len(positions)} 个岗位的题库池，并发 {settings.cache_warmup_concurrency}")
+
+        semaphore = asyncio.Semaphore(settings.cache_warmup_concurrency)
+
+        async def warm(position: str):
+            async with semaphore:
+                try:
+                    results = await knowledge_service.search_by_position(position, limit=settings.position_pool_size)
+                except Exception as e:
+                    print(f"[缓存预热] {position} 预取失败: {e}")
+                    results = []
+                self._stats["completed"] += 1
+                if not results:
+                    self._stats["failed"] += 1
+                    self._failed_positions.append(position)
+
+        try:
+            await asyncio.gather(*(warm(position) for position in positions))
+        except asyncio.CancelledError:
+            self._finish("cancelled")
+            raise
+        self._finish("done")
+        print(f"[缓存预热] 完成 {self._stats['completed'] - self._stats['failed']}/{self._stats['total']}，"
+              f"失败 {self._stats['failed']}，耗时 {self._stats['elapsed_s']}s")
+
+    def _finish(self, status: str):
+        self._stats.update(
+            status=status,
+            finished_at=datetime.utcnow().isoformat(),
+            elapsed_s=round(time.monotonic() - self._started, 2)
+        )
+
+    def get_stats(self) -> Dict:
+        """获取预热进度"""
+        stats = dict(self._stats)
+        if stats["status"] == "running":
+            stats["elapsed_s"] = round(time.monotonic() - self._started, 2)
+        stats["failed_positions"] = self._failed_positions[:20]
+        return stats
+
+
+# 全局单例
+cache_warmup = CacheWarmup()
@@ -0,0 +1,113 @@
+"""对话上下文构建 - 滚动摘要 + 按 token 预算截取最近对话
+
+会话中较早的对话会被增量压缩进 InterviewSession.transcript_summary（summary_upto 记录已覆盖的条数），
+之后的对话原样保留。每轮追问和最终报告都只发送「摘要 + 预算内的最近对话」，
+提示词长度不再随面试时长线性增长。
+"""
+import re
+from typing import List, Dict, Optional, Tuple
+
+
+_CJK_PATTERN = re.compile(r'[\u4e00-\u9fff\u3000-\u303f\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文字符和全角标点约 1 token/字，其余约 4 字符/token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def format_entry(item: dict) -> str:
+    """将单条对话格式化为文本"""
+    speaker = "面试官" if item["role"] == "interviewer" else "候选人"
+    return f"{speaker}: {item['content']}"
+
+
+def select_recent(entries: List[dict], token_budget: int) -> List[dict]:
+    """从最新的对话往前选取，直到用完 token 预算（至少保留最后一条）"""
+    selected = []
+    used = 0
+    for item in reversed(entries):
+        cost = estimate_tokens(item.get("content", ""))
+        if selected and used + cost > token_budget:
+            break
+        selected.append(item)
+        used += cost
+    selected.reverse()
+    return selected
+
+
+def summary_window(transcript_len: int, summary_upto: int, keep_recent: int, update_every: int) -> Optional[Tuple[int, int]]:
+    """
+    判断是否需要增量更新摘要
+
+    Returns:
+        需要压缩进摘要的对话区间 (start, end)，无需更新时返回 None
+    """
+    end = transcript_len - keep_recent
+    if end - summary_upto >= update_every:
+        return summary_upto, end
+    return None
+
+
+def build_summary_prompt(previous_summary: Optional[str], entries: List[dict]) -> List[Dict[str, str]]:
+    """构建增量摘要的 LLM 请求"""
+    dialogue = "\n".join(format_entry(item) + (f"（得分 {item['score']}）" if "score" in item else "") for item in entries)
+    return [{
+        "role": "user",
+        "content": f"""【已有摘要】
+{previous_summary or "无"}
+
+【新增对话】
+{dialogue}
+
+请把新增对话合并进已有摘要，输出更新后的完整摘要，要求：
+1. 保留已考察的主题和知识点、候选人的技术栈和项目经历
+2. 保留候选人回答的亮点、不足和每题得分
+3. 不超过300字，直接输出摘要正文，不要输出其他内容"""
+    }]
+
+
+def build_turn_history(transcript: List[dict], summary_upto: int, token_budget: int) -> List[Dict[str, str]]:
+    """构建追问时的对话历史（仅包含尚未压缩进摘要的最近对话）"""
+    recent = select_recent(transcript[summary_upto:], token_budget)
+    return [
+        {"role": "assistant" if item["role"] == "interviewer" else "user", "content": item["content"]}
+        for item in recent
+    ]
+
+
+def build_summary_context(summary: Optional[str]) -> str:
+    """构建拼接到系统提示词中的摘要段落"""
+    if not summary:
+        return ""
+    return f"\n\n【此前面试摘要】（更早的对话已压缩为摘要）\n{summary}"
+
+
+def build_report_transcript(transcript: List[dict], summary: Optional[str], summary_upto: int, token_budget: int) -> str:
+    """
+    构建报告用的面试记录文本
+
+    包含：每题得分一览（保证评分依据完整）+ 摘要 + 预算内的最近对话原文
+    """
+    parts = []
+
+    scores = [
+        f"问题{item.get('question_number', '?')}: {item['score']}分"
+        for item in transcript
+        if item["role"] == "candidate" and item.get("score") is not None
+    ]
+    if scores:
+        parts.append("【每题得分】\n" + "，".join(scores))
+
+    if summary:
+        parts.append(f"【前期面试摘要】\n{summary}")
+
+    recent = select_recent(transcript[summary_upto:], token_budget)
+    if recent:
+        title = "【近期对话原文】" if summary else "【对话原文】"
+        parts.append(title + "\n" + "\n\n".join(format_entry(item) for item in recent))
+
+    return "\n\n".join(parts)
@@ -0,0 +1,324 @@
+"""查询向量缓存 - 避免重复调用 DashScope 向量化接口
+
+岗位名称、从回答中提取的技术关键词（如 "MySQL Redis"）会反复出现，同一文本的向量只需计算一次：
+- 内存层：按字节预算的 LRU（float32 存储，1536 维约 6KB/条）
+- 磁盘层（可选）：内存映射的 float32 定长记录文件 + 追加写的索引，进程重启后仍然有效；
+  多个 worker 共享同一目录，写入时用文件锁互斥，未命中时读取其他进程追加的索引
+
+缓存键为规范化后的文本（Unicode NFKC、大小写折叠、合并空白）加上向量模型名。
+"""
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+def normalize_text(text: str) -> str:
+    """规范化查询文本：NFKC、大小写折叠、合并空白"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class DiskVectorStore:
+    """
+    磁盘向量存储
+
+    目录结构：
+    - meta.json：模型名和向量维度，不一致时（换了模型）不使用已有数据
+    - vectors.f32：定长 float32 记录，按行号寻址，通过 mmap 读取
+    - index.log：追加写的 "键\\t行号" 索引
+
+    只追加不淘汰，达到 max_entries 后不再写入。
+    """
+
+    def __init__(self, directory: str, model: str, dim: int, max_entries: int):
+        self.directory = directory
+        self.model = model
+        self.dim = dim
+        self.max_entries = max_entries
+        self._row_bytes = dim * 4
+        self._rows: Dict[str, int] = {}
+        self._index_offset = 0
+        self._mmap: Optional[mmap.mmap] = None
+        self._mmap_size = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._index_path = os.path.join(directory, "index.log")
+        self._lock_path = os.path.join(directory, ".lock")
+        self._check_meta()
+        self._read_index()
+
+    def _check_meta(self):
+        meta_path = os.path.join(self.directory, "meta.json")
+        meta = {"model": self.model, "dim": self.dim}
+        with self._file_lock():
+            if os.path.exists(meta_path):
+                with open(meta_path, encoding="utf-8") as f:
+                    existing = json.load(f)
+                if existing == meta:
+                    return
+                print(f"[向量缓存] 磁盘缓存的模型或维度已变化（{existing} -> {meta}），清空重建")
+            for path in (self._vectors_path, self._index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+    def _file_lock(self):
+        return _FileLock(self._lock_path)
+
+    def _read_index(self):
+        """读取索引中新追加的记录（包括其他进程写入的）"""
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_offset)
+            data = f.read()
+        # 只处理完整的行，写了一半的行留到下次
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8").splitlines():
+            key, _, row = line.partition("\t")
+            if row.isdigit():
+                self._rows[key] = int(row)
+        self._index_offset += end
+
+    def _remap(self):
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        if size == self._mmap_size:
+            return
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if size:
+            with open(self._vectors_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mmap_size = size
+
+    def get(self, key: str) -> Optional[array]:
+        row = self._rows.get(key)
+        if row is None:
+            self._read_index()
+            row = self._rows.get(key)
+            if row is None:
+                return None
+
+        offset = row * self._row_bytes
+        if offset + self._row_bytes > self._mmap_size:
+            self._remap()
+            if offset + self._row_bytes > self._mmap_size:
+                return None
+        return array("f", self._mmap[offset:offset + self._row_bytes])
+
+    def put(self, key: str, vector: array) -> bool:
+        """追加一条向量，已满或维度不符时返回 False"""
+        if len(vector) != self.dim:
+            return False
+        with self._file_lock():
+            self._read_index()
+            if key in self._rows:
+                return True
+            size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+            row = size // self._row_bytes
+            if row >= self.max_entries:
+                return False
+            if size != row * self._row_bytes:
+                # 上次写入中途崩溃留下的不完整记录（索引不会指向它）：截掉，保证新记录按行对齐
+                os.truncate(self._vectors_path, row * self._row_bytes)
+            with open(self._vectors_path, "ab") as f:
+                f.write(vector.tobytes())
+            with open(self._index_path, "ab") as f:
+                f.write(f"{key}\t{row}\n".encode("utf-8"))
+            self._read_index()
+        return True
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._mmap_size = 0
+
+
+class _FileLock:
+    """跨进程文件锁（flock）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = open(self.path, "a")
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._fd.close()
+        self._fd = None
+
+
+class EmbeddingCache:
+    """
+    查询向量缓存（内存 LRU + 可选磁盘层，线程安全）
+
+    内存层的锁不会在文件 IO 期间持有：get_memory 可以直接在事件循环中调用；
+    启用磁盘层（has_disk）时 get / put 可能读写磁盘（包括等待其他进程的文件锁），应在线程中调用，
+    未启用时只操作内存，可以直接调用。
+    """
+
+    def __init__(self, model: str, max_bytes: int, disk_dir: str = "", disk_max_entries: int = 100000):
+        """
+        Args:
+            model: 向量模型名（参与缓存键，换模型后不会命中旧向量）
+            max_bytes: 内存层字节预算
+            disk_dir: 磁盘层目录，为空时不启用
+            disk_max_entries: 磁盘层最多保存的向量条数
+        """
+        self.model = model
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        self._bytes = 0
+        self._disk: Optional[DiskVectorStore] = None
+        self._disk_failed = False
+        # _lock 保护内存层和统计，_disk_lock 保护磁盘层（打开、读取索引、写入）
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_writes": 0}
+
+    @property
+    def has_disk(self) -> bool:
+        """是否启用了磁盘层（配置了目录且未因错误停用）"""
+        return bool(self.disk_dir) and not self._disk_failed
+
+    def _key(self, normalized: str) -> str:
+        return hashlib.sha1(f"{self.model}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def get_memory(self, normalized: str) -> Optional[List[float]]:
+        """只查找内存层（不做文件 IO），未命中返回 None（不计入未命中统计）"""
+        key = self._key(normalized)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is None:
+                return None
+            self._memory.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return vector.tolist()
+
+    def get(self, normalized: str) -> Optional[List[float]]:
+        """查找规范化文本的向量（内存层未命中时查找磁盘层），未命中返回 None"""
+        cached = self.get_memory(normalized)
+        if cached is not None:
+            return cached
+
+        key = self._key(normalized)
+        vector = None
+        with self._disk_lock:
+            disk = self._get_disk()
+            if disk is not None:
+                try:
+                    vector = disk.get(key)
+                except OSError as e:
+                    print(f"[向量缓存] 读取磁盘缓存失败: {e}")
+
+        with self._lock:
+            if vector is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, vector)
+            return vector.tolist()
+
+    def put(self, normalized: str, vector: List[float]):
+        """写入向量（内存层，启用时同时写入磁盘层）"""
+        key = self._key(normalized)
+        packed = array("f", vector)
+        with self._lock:
+            self._remember(key, packed)
+
+        with self._disk_lock:
+            disk = self._get_disk(len(packed))
+            if disk is not None:
+                try:
+                    written = disk.put(key, packed)
+                except OSError as e:
+                    written = False
+                    print(f"[向量缓存] 写入磁盘缓存失败: {e}")
+                if written:
+                    with self._lock:
+                        self._stats["disk_writes"] += 1
+
+    def _remember(self, key: str, vector: array):
+        """写入内存层，超出字节预算时淘汰最久未使用的向量"""
+        size = len(vector) * vector.itemsize
+        if size > self.max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous) * previous.itemsize
+        self._memory[key] = vector
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._bytes -= len(evicted) * evicted.itemsize
+            self._stats["evictions"] += 1
+
+    def _get_disk(self, dim: Optional[int] = None) -> Optional[DiskVectorStore]:
+        """
+        打开磁盘层（维度由模型决定）
+
+        读取时维度取自已有的 meta.json（重启后第一次查询即可命中磁盘），没有已有数据时等首次写入再创建
+        """
+        if self._disk is not None or not self.disk_dir or self._disk_failed:
+            return self._disk
+        if dim is None:
+            dim = self._read_disk_dim()
+            if dim is None:
+                return None
+        try:
+            self._disk = DiskVectorStore(self.disk_dir, self.model, dim, self.disk_max_entries)
+            print(f"[向量缓存] 磁盘缓存已打开: {self.disk_dir}（{len(self._disk)} 条）")
+        except OSError as e:
+            self._disk_failed = True
+            print(f"[向量缓存] 磁盘缓存不可用，仅使用内存缓存: {e}")
+        return self._disk
+
+    def _read_disk_dim(self) -> Optional[int]:
+        """已有磁盘数据的向量维度（模型不一致或不存在时返回 None）"""
+        meta_path = os.path.join(self.disk_dir, "meta.json")
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta.get("dim") if meta.get("model") == self.model else None
+
+    def clear_memory(self):
+        """清空内存层（磁盘层保留）"""
+        with self._lock:
+            self._memory.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            total = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": f"{(hits / total * 100) if total else 0:.2f}%",
+                "entries": len(self._memory),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": self._disk is not None,
+                "disk_entries": len(self._disk) if self._disk is not None else 0,
+            }
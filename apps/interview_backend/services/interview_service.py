@@ -1,38 +1,92 @@
 """面试服务逻辑"""
-import json
+import asyncio
+import math
 import uuid
+from collections import OrderedDict
+from contextlib import aclosing, asynccontextmanager
 from datetime import datetime
-from typing import Optional, List, Dict
-from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
+from typing import AsyncIterator, Optional, List, Dict
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from functools import lru_cache
 
-from database.db import InterviewSession, InterviewReport, User
+from database.db import (
+    SessionLocal, InterviewSession, InterviewReport,
+    SESSION_REPORT_COLUMNS, SESSION_REPORT_STATUS_COLUMNS
+)
+from database.locks import advisory_lock
 from models.schemas import (
     InterviewStartRequest, InterviewStartResponse,
-    AnswerRequest, AnswerResponse, InterviewReport as InterviewReportSchema
+    AnswerRequest, AnswerResponse, InterviewReport as InterviewReportSchema,
+    ReportStatus
 )
 from config import settings
 from services.qwen_service import QwenService
 from services.position_service import position_service
 from services.knowledge_service import knowledge_service
+from services.question_ref import QuestionRef
+from services.resilience import resilience_policies
+from services import context_builder, transcript_store
+from services.tts_jobs import audio_jobs
+from services.report_queue import ReportPending, ReportQueue
+from services.session_cache import SessionCache, SessionState
+from utils.json_stream import IncrementalJSONParser, parse_json_object
 
 
 class InterviewService:
     """面试服务"""
 
+    # 开场主题：开场问题不等待面试计划，固定使用热身主题
+    OPENING_TOPIC = ("开场热身", "简单介绍，缓解紧张")
+
     def __init__(self):
-        # 初始化 Qwen 服务
-        self.qwen_service = QwenService(api_key=settings.dashscope_api_key)
+        # 初始化 Qwen 服务（异步客户端，连接池参数来自配置）
+        self.qwen_service = QwenService(
+            api_key=settings.dashscope_api_key,
+            api_url=settings.qwen_api_url,
+            pool_size=settings.qwen_pool_size,
+            keepalive_timeout=settings.qwen_keepalive_timeout,
+            max_concurrency=settings.qwen_max_concurrency,
+            request_timeout=settings.qwen_request_timeout,
+            routes=settings.get_llm_routes,
+            fallback_model=settings.llm_fallback_model,
+            fallback_timeout=settings.llm_fallback_timeout,
+            resilience=resilience_policies["qwen"],
+        )
+
+        # 报告后台生成队列（worker 在应用启动时启动）
+        self.report_queue = ReportQueue(
+            self._generate_report_job,
+            workers=settings.report_workers,
+            maxsize=settings.report_queue_size,
+        )
+        # 进程内正在生成的报告任务 {session_id: Task}
+        self._report_flights: Dict[str, asyncio.Task] = {}
+
+        # 进行中面试的会话状态缓存（后台写回任务在应用启动时启动）
+        self.session_cache = SessionCache(
+            flush_interval=settings.session_flush_interval,
+            lease_ttl=settings.answer_lock_ttl,
+            handoff_idle=settings.session_handoff_idle,
+            claim_timeout=settings.answer_lock_timeout,
+            idle_ttl=settings.session_cache_idle_ttl,
+            max_entries=settings.session_cache_max_entries,
+        )
 
-    def _call_llm(self, messages: List[dict], system: str = None, temperature: float = 0.8) -> str:
-        """调用大模型 API（使用 Qwen）"""
+        # 同一会话的回答串行处理 {session_id: [Lock, 持有和等待的请求数]}
+        self._turn_locks: Dict[str, list] = {}
+        # 已处理回答的响应（按幂等键）{(session_id, idempotency_key): AnswerResponse}
+        self._answered: "OrderedDict[tuple, AnswerResponse]" = OrderedDict()
+
+    async def _call_llm(self, messages: List[dict], task: str, system: str = None, temperature: float = 0.8) -> str:
+        """调用大模型 API（使用 Qwen，按调用场景路由模型）"""
         try:
-            return self.qwen_service.chat(
+            return await self.qwen_service.achat_task(
+                task,
                 messages=messages,
                 system=system,
-                temperature=temperature,
-                max_tokens=2000
+                temperature=temperature
             )
         except Exception as e:
             raise Exception(f"调用 Qwen API 失败: {str(e)}")
@@ -81,8 +135,8 @@ class InterviewService:
             matches = re.findall(pattern, answer)
             keywords.update(matches)
 
-        # 限制关键词数量，避免查询过长
-        keywords_list = list(keywords)[:5]
+        # 限制关键词数量，避免查询过长（排序保证同一回答得到相同的查询文本，可命中向量缓存）
+        keywords_list = sorted(keywords)[:5]
         return " ".join(keywords_list) if keywords_list else ""
 
     @staticmethod
@@ -212,7 +266,7 @@ class InterviewService:
 
         return base_prompt
 
-    def _get_position_questions(self, position_id: str, round_name: str = None) -> tuple[str, List[Dict]]:
+    async def _get_position_questions(self, position_id: str, round_name: str = None) -> tuple[str, List[QuestionRef]]:
         """获取岗位相关问题提示和知识库参考题目
 
         Returns:
@@ -232,9 +286,9 @@ class InterviewService:
         # 从知识库获取参考题目（获取较多题目作为题库池）
         reference_questions = []
         try:
-            reference_questions = knowledge_service.search_by_position(
+            reference_questions = await knowledge_service.search_by_position(
                 position=full_name,
-                limit=50  # 获取50条作为参考池
+                limit=settings.position_pool_size  # 获取较多题目作为参考池（与启动预热使用相同的缓存键）
             )
             print(f"[知识库] 为 {full_name} 获取了 {len(reference_questions)} 条参考题目")
         except Exception as e:
@@ -243,7 +297,7 @@ class InterviewService:
         hint = f"重点考察：{keywords_str}（针对{full_name}岗位）"
         return hint, reference_questions
 
-    def _generate_interview_plan(self, position: str, round: str, resume: Optional[str] = None, reference_questions: List[Dict] = None) -> dict:
+    async def _generate_interview_plan(self, position: str, round: str, resume: Optional[str] = None, reference_questions: List[QuestionRef] = None) -> dict:
         """生成动态面试计划
 
         Args:
@@ -258,7 +312,7 @@ class InterviewService:
             # 随机选择10条参考题目展示给LLM
             import random
             sample_questions = random.sample(reference_questions, min(10, len(reference_questions)))
-            questions_preview = "\n".join([f"- {q.get('question', '')}" for q in sample_questions])
+            questions_preview = "\n".join([f"- {q.question}" for q in sample_questions])
             knowledge_context = f"\n\n【知识库参考题目示例】（仅供参考，不要照搬，要结合候选人情况改编和延伸）：\n{questions_preview}"
 
         messages = [{
@@ -290,15 +344,10 @@ class InterviewService:
 }}"""
         }]
 
-        response_text = self._call_llm(messages, temperature=0.7)
-
         try:
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                plan = json.loads(json_match.group())
-            else:
-                plan = json.loads(response_text)
+            # LLM 调用失败（超时、熔断等）同样降级为默认计划
+            response_text = await self._call_llm(messages, "plan", temperature=0.7)
+            plan = parse_json_object(response_text)
 
             # 添加运行时状态
             plan["current_topic_index"] = 0
@@ -322,8 +371,12 @@ class InterviewService:
                 "should_continue": True
             }
 
-    def start_interview(self, request: InterviewStartRequest, db: Session) -> InterviewStartResponse:
-        """开始面试"""
+    async def start_interview(self, request: InterviewStartRequest, db: AsyncSession) -> InterviewStartResponse:
+        """开始面试
+
+        各阶段并发执行：知识库检索完成后，面试计划和开场问题同时生成，
+        开场问题的 TTS 在后台合成，响应中只返回音频地址。
+        """
         # 生成会话ID
         session_id = f"session_{uuid.uuid4().hex[:16]}"
 
@@ -339,18 +392,18 @@ class InterviewService:
         position_full_name = position_service.get_position_full_name(request.position_id)
 
         # 获取知识库参考题目
-        questions_guide, reference_questions = self._get_position_questions(request.position_id, request.round)
+        questions_guide, reference_questions = await self._get_position_questions(request.position_id, request.round)
 
-        # 生成面试计划（传入参考题目）
-        interview_plan = self._generate_interview_plan(position_full_name, request.round, request.resume, reference_questions)
-        print(f"[面试计划] {interview_plan}")
+        # 生成面试计划（传入参考题目），与开场问题并发
+        plan_task = asyncio.create_task(
+            self._generate_interview_plan(position_full_name, request.round, request.resume, reference_questions)
+        )
 
         # 生成系统提示词（使用面试官风格）
         system_prompt = self._get_system_prompt(position_full_name, request.round, interviewer_style, request.resume)
 
-        # 获取当前主题
-        current_topic = interview_plan["topics"][0] if interview_plan["topics"] else "开场"
-        topic_desc = interview_plan.get("topic_descriptions", {}).get(current_topic, "")
+        # 开场问题只依赖开场主题，不等待面试计划
+        opening_topic, opening_desc = self.OPENING_TOPIC
 
         # 构建知识库参考（仅用于开场阶段，选择简单题目）
         knowledge_hint = ""
@@ -358,7 +411,7 @@ class InterviewService:
             # 随机选择3条简单的参考题目
             import random
             sample = random.sample(reference_questions, min(3, len(reference_questions)))
-            sample_text = "\n".join([f"- {q.get('question', '')}" for q in sample])
+            sample_text = "\n".join([f"- {q.question}" for q in sample])
             knowledge_hint = f"\n\n【参考方向】（不要照搬，要自然改编）：\n{sample_text}"
 
         # 生成开场问题
@@ -369,7 +422,7 @@ class InterviewService:
 
 {questions_guide}
 
-当前主题：{current_topic} - {topic_desc}
+当前主题：{opening_topic} - {opening_desc}
 {knowledge_hint}
 
 请提出第一个开场问题，要求：
@@ -382,10 +435,24 @@ class InterviewService:
             }
         ]
 
-        first_question = self._call_llm(messages, system=system_prompt, temperature=0.7)
+        try:
+            first_question = await self._call_llm(messages, "first_question", system=system_prompt, temperature=0.7)
+        except Exception:
+            plan_task.cancel()
+            raise
+
+        # TTS音频在后台合成，不阻塞开场问题返回
+        audio_job_id = self._submit_question_audio(first_question)
 
-        # 将参考题目保存到面试计划中
-        interview_plan["reference_questions"] = reference_questions
+        # 面试计划失败时内部会降级为默认计划，这里不会抛出异常
+        interview_plan = await plan_task
+        print(f"[面试计划] {interview_plan}")
+
+        # 记录计划中的首个主题
+        current_topic = interview_plan["topics"][0] if interview_plan["topics"] else "开场"
+
+        # 面试计划中只保存参考题目ID，追问时从共享的题目缓存解析
+        interview_plan["reference_question_ids"] = [q.id for q in reference_questions]
 
         # 创建会话记录
         session = InterviewSession(
@@ -394,81 +461,198 @@ class InterviewService:
             position=position_full_name,  # 保存完整岗位名称
             round=request.round,
             resume=request.resume,
-            interview_plan=interview_plan,  # 保存面试计划（包含参考题目）
+            interview_plan=interview_plan,  # 保存面试计划（包含参考题目ID）
             current_question=first_question,
-            question_count=1,
-            transcript=[
-                {
-                    "role": "interviewer",
-                    "content": first_question,
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "question_number": 1,
-                    "style": interviewer_style,  # 保存面试官风格
-                    "topic": current_topic  # 保存当前主题
-                }
-            ]
+            question_count=1
         )
         db.add(session)
-        db.commit()
 
-        # 生成TTS音频（在准备阶段完成）
-        audio_url = None
-        try:
-            from services.volcengine_tts_service import get_volcengine_tts_service
-            audio_url = get_volcengine_tts_service().text_to_speech_url(first_question)
-            print(f"[TTS] 第一个问题音频生成成功: {audio_url}")
-        except Exception as e:
-            print(f"[TTS] 音频生成失败: {e}")
-            # 不影响面试继续，只是没有音频
+        # 对话记录写入 interview_turns
+        transcript = transcript_store.Transcript(session_id, [], persisted=0)
+        transcript.append({
+            "role": "interviewer",
+            "content": first_question,
+            "timestamp": datetime.utcnow().isoformat(),
+            "question_number": 1,
+            "style": interviewer_style,  # 保存面试官风格
+            "topic": current_topic  # 保存当前主题
+        })
+        transcript.seal()
+        transcript.flush(db)
+        await db.commit()
 
         return InterviewStartResponse(
             session_id=session_id,
             question=first_question,
             question_type="开场",
-            audio_url=audio_url
+            audio_url=audio_jobs.audio_url(audio_job_id) if audio_job_id else None,
+            audio_job_id=audio_job_id
         )
 
-    def process_answer(self, request: AnswerRequest, db: Session) -> AnswerResponse:
-        """处理候选人回答"""
-        # 获取会话
-        session = db.query(InterviewSession).filter(
-            InterviewSession.session_id == request.session_id
-        ).first()
-
-        if not session:
-            raise ValueError("会话不存在")
+    async def get_active_session(self, session_id: str) -> SessionState:
+        """获取进行中的面试会话（优先读会话缓存），不存在或已结束时抛出 ValueError"""
+        return await self.session_cache.get_active(session_id)
 
-        if session.is_finished:
-            raise ValueError("面试已结束")
+    @staticmethod
+    async def load_transcript(session: InterviewSession, db: AsyncSession) -> transcript_store.Transcript:
+        """读取会话的对话记录（兼容旧版 JSON 对话记录）"""
+        return await transcript_store.load_transcript(db, session.session_id)
 
-        # 记录候选人回答
-        session.transcript.append({
+    def _record_answer(self, session: SessionState, transcript: transcript_store.Transcript, request: AnswerRequest):
+        """记录候选人回答到对话历史（评分完成后随本轮结果一起写入）"""
+        transcript.append({
             "role": "candidate",
             "content": request.answer,
             "timestamp": datetime.utcnow().isoformat(),
-            "question_number": session.question_count
+            "question_number": session.question_count,
+            "idempotency_key": request.idempotency_key
         })
-        flag_modified(session, "transcript")
 
-        # 检查用户是否主动结束面试
-        if request.finish_interview:
-            print(f"[面试结束] 用户主动结束面试")
-            session.is_finished = True
-            session.finished_at = datetime.utcnow()
-            db.commit()
+    @asynccontextmanager
+    async def _serialize_turn(self, session_id: str):
+        """
+        串行处理同一会话的回答：进程内按到达顺序排队
 
-            return AnswerResponse(
+        跨进程由会话缓存的所有权互斥：get_active_session() 在本进程未持有所有权时获取，
+        处理期间会话不会被后台任务释放。
+        """
+        entry = self._turn_locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self.session_cache.hold(session_id):
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._turn_locks.pop(session_id, None)
+
+    async def find_answered(
+        self,
+        request: AnswerRequest,
+        check_db: bool = True,
+        transcript: Optional[transcript_store.Transcript] = None
+    ) -> Optional[AnswerResponse]:
+        """
+        按幂等键查找已处理过的回答，返回当时的响应（未带幂等键或未处理过返回 None）
+
+        先查进程内缓存；再查对话记录（其他 worker 处理过的请求），从记录中重建响应：
+        提供了本进程持有所有权的会话的 transcript 时在内存中查找，否则 check_db 时查询数据库。
+        """
+        if not request.idempotency_key:
+            return None
+
+        cache_key = (request.session_id, request.idempotency_key)
+        response = self._answered.get(cache_key)
+        if response is not None:
+            return response
+
+        if transcript is not None:
+            found = transcript.find_answer(request.idempotency_key)
+        elif check_db:
+            async with SessionLocal() as db:
+                found = await transcript_store.find_answer(db, request.session_id, request.idempotency_key)
+        else:
+            return None
+        if found is None:
+            return None
+
+        answer, next_turn = found
+        if next_turn is None or next_turn["role"] != "interviewer":
+            response = AnswerResponse(
                 next_question=None,
                 instant_score=None,
-                hint="感谢您参加本次面试，报告已生成",
+                hint="面试已结束，感谢您的参与！",
                 is_finished=True
             )
+        else:
+            audio_job_id = self._submit_question_audio(next_turn["content"])
+            response = AnswerResponse(
+                next_question=next_turn["content"],
+                instant_score=answer.get("score"),
+                hint=answer.get("hint"),
+                is_finished=False,
+                audio_url=audio_jobs.audio_url(audio_job_id) if audio_job_id else None,
+                audio_job_id=audio_job_id
+            )
+        self._remember_answer(request, response)
+        return response
+
+    def _remember_answer(self, request: AnswerRequest, response: AnswerResponse):
+        """缓存带幂等键的回答的响应，供客户端重试时直接返回"""
+        if not request.idempotency_key:
+            return
+        self._answered[(request.session_id, request.idempotency_key)] = response
+        self._answered.move_to_end((request.session_id, request.idempotency_key))
+        while len(self._answered) > settings.answer_idempotency_cache_size:
+            self._answered.popitem(last=False)
+
+    async def _get_turn_session(self, request: AnswerRequest) -> tuple[Optional[SessionState], Optional[AnswerResponse]]:
+        """
+        获取本轮要处理的会话状态 (session, None)；相同的请求已处理过时返回 (None, 当时的响应)
+
+        Raises:
+            ValueError: 会话不存在、已结束（且不是已处理请求的重试），或等待其他进程释放会话超时
+        """
+        try:
+            session = await self.get_active_session(request.session_id)
+        except ValueError:
+            # 结束面试那一轮的重试：会话已结束，只能从数据库中查找
+            replay = await self.find_answered(request)
+            if replay is not None:
+                return None, replay
+            raise
+        # 持有所有权时内存中的对话记录就是最新的，不需要查询数据库
+        replay = await self.find_answered(request, transcript=session.transcript)
+        if replay is not None:
+            return None, replay
+        return session, None
+
+    async def _finish_session(self, session: SessionState, transcript: transcript_store.Transcript):
+        """标记会话结束并立即写回，随后提交报告生成任务"""
+        transcript.seal()
+        session.is_finished = True
+        session.finished_at = datetime.utcnow()
+        session.report_status = "pending"
+        session.report_error = None
+        session.report_requested_at = datetime.utcnow()
+        # 报告 worker 从数据库读取会话，入队前必须先写回
+        await self.session_cache.persist(session)
+
+        if not self.report_queue.enqueue(session.session_id):
+            # 未能入队，状态回退，报告在请求时按需生成
+            session.report_status = None
+        # 释放所有权并移出缓存（状态回退时一并写回）
+        await self.session_cache.finish(session)
+
+    async def _enqueue_report(self, session: InterviewSession, db: AsyncSession):
+        """把报告生成任务放入后台队列（状态先提交为 pending，worker 才能读到已结束的会话）"""
+        session.report_status = "pending"
+        session.report_error = None
+        session.report_requested_at = datetime.utcnow()
+        await db.commit()
+
+        if not self.report_queue.enqueue(session.session_id):
+            # 未能入队，状态回退，报告在请求时按需生成
+            session.report_status = None
+            await db.commit()
+
+    def _all_topics_completed(self, session: SessionState) -> bool:
+        """判断面试计划中的主题是否已全部完成"""
+        interview_plan = session.interview_plan or {}
+        return interview_plan.get("current_topic_index", 0) >= len(interview_plan.get("topics", []))
+
+    async def _build_turn_prompt(self, session: SessionState, transcript: List[dict], request: AnswerRequest) -> tuple[List[dict], str, dict]:
+        """构建单轮追问的 LLM 请求
 
-        # 构建对话历史
-        messages = []
-        for item in session.transcript[-6:]:  # 最近3轮对话
-            role = "assistant" if item["role"] == "interviewer" else "user"
-            messages.append({"role": role, "content": item["content"]})
+        Returns:
+            (messages, 系统提示词, 本轮主题状态)
+        """
+        # 构建对话历史：较早的对话已压缩进摘要，这里只取预算内的最近对话
+        messages = context_builder.build_turn_history(
+            transcript,
+            session.summary_upto or 0,
+            settings.context_turn_token_budget
+        )
 
         # 获取面试计划
         interview_plan = session.interview_plan or {}
@@ -476,53 +660,47 @@ class InterviewService:
         current_topic_index = interview_plan.get("current_topic_index", 0)
         completed_topics = interview_plan.get("completed_topics", [])
 
-        # 判断是否完成所有主题
-        all_topics_completed = current_topic_index >= len(topics)
+        # 生成下一个问题（使用会话中保存的面试官风格，默认为 friendly）
+        interviewer_style = transcript[0].get("style", "friendly") if transcript else "friendly"
+        system_prompt = self._get_system_prompt(session.position, session.round, interviewer_style, session.resume)
+        system_prompt += context_builder.build_summary_context(session.transcript_summary)
 
-        if not all_topics_completed:
-            # 继续面试
-            # 生成下一个问题（使用会话中保存的面试官风格，默认为 friendly）
-            interviewer_style = session.transcript[0].get("style", "friendly") if session.transcript else "friendly"
-            system_prompt = self._get_system_prompt(session.position, session.round, interviewer_style, session.resume)
+        # 获取当前主题信息
+        current_topic = topics[current_topic_index] if current_topic_index < len(topics) else "综合评估"
+        topic_desc = interview_plan.get("topic_descriptions", {}).get(current_topic, "")
 
-            # 获取当前主题信息
-            current_topic = topics[current_topic_index] if current_topic_index < len(topics) else "综合评估"
-            topic_desc = interview_plan.get("topic_descriptions", {}).get(current_topic, "")
+        # 动态知识库检索：根据候选人回答提取关键词并搜索相关题目
+        dynamic_references = []
+        try:
+            # 简单关键词提取（从回答中提取技术词汇）
+            answer_keywords = self._extract_tech_keywords(request.answer)
+            if answer_keywords:
+                print(f"[知识库] 从回答中提取关键词: {answer_keywords}")
+                dynamic_references = await knowledge_service.search_related_questions(
+                    keywords=answer_keywords,
+                    position=session.position,
+                    limit=5
+                )
+                print(f"[知识库] 动态检索到 {len(dynamic_references)} 条相关题目")
+        except Exception as e:
+            print(f"[知识库] 动态检索失败: {e}")
 
-            # 动态知识库检索：根据候选人回答提取关键词并搜索相关题目
-            dynamic_references = []
-            try:
-                # 简单关键词提取（从回答中提取技术词汇）
-                answer_keywords = self._extract_tech_keywords(request.answer)
-                if answer_keywords:
-                    print(f"[知识库] 从回答中提取关键词: {answer_keywords}")
-                    dynamic_references = knowledge_service.search_related_questions(
-                        keywords=answer_keywords,
-                        position=session.position,
-                        limit=5
-                    )
-                    print(f"[知识库] 动态检索到 {len(dynamic_references)} 条相关题目")
-            except Exception as e:
-                print(f"[知识库] 动态检索失败: {e}")
-
-            # 构建知识库参考提示
-            knowledge_hint = ""
-            if dynamic_references:
-                # 使用动态检索结果
-                ref_text = "\n".join([f"- {q.get('question', '')}" for q in dynamic_references[:3]])
-                knowledge_hint = f"\n\n【相关参考题目】（可作为追问方向，但要自然延伸，不要照搬）：\n{ref_text}"
-            else:
-                # 使用初始参考题库
-                reference_questions = interview_plan.get("reference_questions", [])
-                if reference_questions:
-                    import random
-                    sample = random.sample(reference_questions, min(3, len(reference_questions)))
-                    ref_text = "\n".join([f"- {q.get('question', '')}" for q in sample])
-                    knowledge_hint = f"\n\n【参考题库】（可作为提问方向）：\n{ref_text}"
-
-            messages.append({
-                "role": "user",
-                "content": f"""候选人已回答问题{session.question_count}。
+        # 构建知识库参考提示
+        knowledge_hint = ""
+        if dynamic_references:
+            # 使用动态检索结果
+            ref_text = "\n".join([f"- {q.question}" for q in dynamic_references[:3]])
+            knowledge_hint = f"\n\n【相关参考题目】（可作为追问方向，但要自然延伸，不要照搬）：\n{ref_text}"
+        else:
+            # 使用初始参考题库
+            sample = await self._sample_reference_questions(interview_plan, 3)
+            if sample:
+                ref_text = "\n".join([f"- {q.question}" for q in sample])
+                knowledge_hint = f"\n\n【参考题库】（可作为提问方向）：\n{ref_text}"
+
+        messages.append({
+            "role": "user",
+            "content": f"""候选人已回答问题{session.question_count}。
 
 【面试计划状态】
 - 当前主题：{current_topic} - {topic_desc}
@@ -560,122 +738,229 @@ class InterviewService:
     "next_question": "问题内容",
     "topic_completed": false  // 当前主题是否已完成（如果action是next_topic，设为true）
 }}"""
-            })
+        })
 
-            response_text = self._call_llm(messages, system=system_prompt, temperature=0.8)
-            print(f"[DEBUG] Qwen 原始响应: {response_text}")
+        topic_state = {
+            "interview_plan": interview_plan,
+            "topics": topics,
+            "current_topic_index": current_topic_index,
+            "completed_topics": completed_topics,
+            "current_topic": current_topic
+        }
+        return messages, system_prompt, topic_state
 
-            # 解析响应
-            try:
-                # 尝试提取JSON
-                import re
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    response_data = json.loads(json_match.group())
-                else:
-                    response_data = json.loads(response_text)
-
-                print(f"[DEBUG] 解析后的数据: {response_data}")
-                feedback = response_data.get("feedback", "好的")
-                instant_score = response_data.get("score", 7.0)
-                hint = response_data.get("hint", "")
-                next_question = response_data.get("next_question", "")
-                action = response_data.get("action", "next_topic")  # follow_up 或 next_topic
-                topic_completed = response_data.get("topic_completed", False)
-
-                print(f"[DEBUG] feedback={feedback}, score={instant_score}, action={action}, topic_completed={topic_completed}")
-            except Exception as e:
-                # 如果解析失败，使用默认值
-                print(f"[DEBUG] JSON解析失败: {e}")
-                feedback = "好的"
-                instant_score = 7.0
-                hint = ""
-                next_question = response_text
-                action = "next_topic"
-                topic_completed = False
-
-            # 更新最后一条候选人回答的评分和反馈
-            session.transcript[-1]["score"] = instant_score
-            session.transcript[-1]["hint"] = hint
-            session.transcript[-1]["feedback"] = feedback
-
-            # 更新面试计划状态
-            if topic_completed and action == "next_topic":
-                # 当前主题完成，移动到下一个主题
-                if current_topic not in completed_topics:
-                    completed_topics.append(current_topic)
-                interview_plan["current_topic_index"] = current_topic_index + 1
-                interview_plan["completed_topics"] = completed_topics
-
-                # 获取新主题
-                new_topic_index = interview_plan["current_topic_index"]
-                if new_topic_index < len(topics):
-                    new_topic = topics[new_topic_index]
-                    print(f"[面试进度] 完成主题：{current_topic}，进入新主题：{new_topic}")
-                else:
-                    print(f"[面试进度] 所有主题已完成")
-            else:
-                # 延伸追问，保持当前主题
-                print(f"[面试进度] 延伸追问，继续主题：{current_topic}")
+    async def _sample_reference_questions(self, interview_plan: dict, count: int) -> List[QuestionRef]:
+        """从面试计划的参考题库中随机抽取题目"""
+        import random
+
+        question_ids = interview_plan.get("reference_question_ids")
+        if question_ids:
+            sample_ids = random.sample(question_ids, min(count, len(question_ids)))
+            return await knowledge_service.get_questions_by_ids(sample_ids)
+
+        # 旧会话在面试计划中保存了完整题目
+        reference_questions = interview_plan.get("reference_questions", [])
+        sample = random.sample(reference_questions, min(count, len(reference_questions)))
+        return [QuestionRef.from_source(q.get("_id"), q) for q in sample]
+
+    async def _refresh_summary(self, session: SessionState, transcript: List[dict]) -> Optional[tuple[str, int]]:
+        """按需增量更新滚动摘要（与本轮追问并发执行）
+
+        Returns:
+            (新摘要, 摘要覆盖到的对话条数)，无需更新或更新失败时返回 None
+        """
+        window = context_builder.summary_window(
+            len(transcript),
+            session.summary_upto or 0,
+            settings.context_keep_recent,
+            settings.context_summary_every
+        )
+        if not window:
+            return None
+
+        start, end = window
+        messages = context_builder.build_summary_prompt(session.transcript_summary, transcript[start:end])
+        try:
+            summary = await self._call_llm(messages, "summary", temperature=0.3)
+            print(f"[对话摘要] 已压缩对话 {start}-{end}，摘要 {len(summary)} 字")
+            return summary.strip(), end
+        except Exception as e:
+            # 摘要失败不影响面试，下一轮继续尝试
+            print(f"[对话摘要] 更新失败: {e}")
+            return None
+
+    def _store_summary(self, session: SessionState, result: Optional[tuple[str, int]]):
+        """写回滚动摘要（随本轮结果一起提交）"""
+        if result:
+            session.transcript_summary, session.summary_upto = result
 
-            # 保存更新后的计划
-            session.interview_plan = interview_plan
-            flag_modified(session, "interview_plan")
+    def _parse_turn_response(self, response_text: str) -> dict:
+        """解析单轮 LLM 输出，解析失败时返回默认值"""
+        try:
+            response_data = parse_json_object(response_text)
+
+            print(f"[DEBUG] 解析后的数据: {response_data}")
+            result = {
+                "feedback": response_data.get("feedback", "好的"),
+                "score": self._parse_score(response_data.get("score")),
+                "hint": response_data.get("hint", ""),
+                "next_question": response_data.get("next_question", ""),
+                "action": response_data.get("action", "next_topic"),  # follow_up 或 next_topic
+                "topic_completed": response_data.get("topic_completed", False)
+            }
+            print(f"[DEBUG] feedback={result['feedback']}, score={result['score']}, action={result['action']}, topic_completed={result['topic_completed']}")
+            return result
+        except Exception as e:
+            # 如果解析失败，使用默认值
+            print(f"[DEBUG] JSON解析失败: {e}")
+            return {
+                "feedback": "好的",
+                "score": 7.0,
+                "hint": "",
+                "next_question": response_text,
+                "action": "next_topic",
+                "topic_completed": False
+            }
+
+    @staticmethod
+    def _parse_score(value, default: float = 7.0) -> float:
+        """评分转换为数值（模型偶尔输出 "8分"、null 等，写入 Float 列会失败），无法转换时使用默认值"""
+        if isinstance(value, bool):
+            return default
+        try:
+            score = float(value)
+        except (TypeError, ValueError):
+            return default
+        return score if math.isfinite(score) else default
 
-            # 将反馈和问题组合（如果有反馈的话）
-            if feedback:
-                full_response = f"{feedback}\n\n{next_question}"
+    def _apply_turn_result(self, session: SessionState, transcript: transcript_store.Transcript, topic_state: dict, result: dict) -> str:
+        """将本轮评分和下一个问题写回会话状态（由会话缓存写回数据库）
+
+        Returns:
+            组合了反馈的下一个问题全文
+        """
+        feedback = result["feedback"]
+        next_question = result["next_question"]
+        action = result["action"]
+
+        interview_plan = topic_state["interview_plan"]
+        topics = topic_state["topics"]
+        current_topic_index = topic_state["current_topic_index"]
+        completed_topics = topic_state["completed_topics"]
+        current_topic = topic_state["current_topic"]
+
+        # 更新最后一条候选人回答的评分和反馈
+        transcript[-1]["score"] = result["score"]
+        transcript[-1]["hint"] = result["hint"]
+        transcript[-1]["feedback"] = feedback
+
+        # 更新面试计划状态
+        if result["topic_completed"] and action == "next_topic":
+            # 当前主题完成，移动到下一个主题
+            if current_topic not in completed_topics:
+                completed_topics.append(current_topic)
+            interview_plan["current_topic_index"] = current_topic_index + 1
+            interview_plan["completed_topics"] = completed_topics
+
+            # 获取新主题
+            new_topic_index = interview_plan["current_topic_index"]
+            if new_topic_index < len(topics):
+                new_topic = topics[new_topic_index]
+                print(f"[面试进度] 完成主题：{current_topic}，进入新主题：{new_topic}")
             else:
-                full_response = next_question
-
-            # 记录下一个问题
-            session.question_count += 1
-            session.current_question = full_response
-
-            # 确定当前所在主题
-            active_topic_index = interview_plan.get("current_topic_index", 0)
-            active_topic = topics[active_topic_index] if active_topic_index < len(topics) else current_topic
-
-            session.transcript.append({
-                "role": "interviewer",
-                "content": full_response,
-                "timestamp": datetime.utcnow().isoformat(),
-                "question_number": session.question_count,
-                "feedback": feedback,  # 单独保存反馈用于统计
-                "topic": active_topic,  # 保存当前主题
-                "action": action  # 保存动作类型
-            })
-            flag_modified(session, "transcript")
+                print(f"[面试进度] 所有主题已完成")
+        else:
+            # 延伸追问，保持当前主题
+            print(f"[面试进度] 延伸追问，继续主题：{current_topic}")
+
+        # 保存更新后的计划
+        session.interview_plan = interview_plan
 
-            db.commit()
+        # 将反馈和问题组合（如果有反馈的话）
+        if feedback:
+            full_response = f"{feedback}\n\n{next_question}"
+        else:
+            full_response = next_question
+
+        # 记录下一个问题
+        session.question_count += 1
+        session.current_question = full_response
+
+        # 确定当前所在主题
+        active_topic_index = interview_plan.get("current_topic_index", 0)
+        active_topic = topics[active_topic_index] if active_topic_index < len(topics) else current_topic
+
+        transcript.append({
+            "role": "interviewer",
+            "content": full_response,
+            "timestamp": datetime.utcnow().isoformat(),
+            "question_number": session.question_count,
+            "feedback": feedback,  # 单独保存反馈用于统计
+            "topic": active_topic,  # 保存当前主题
+            "action": action  # 保存动作类型
+        })
 
-            # 生成下一个问题的TTS音频（并行处理）
-            audio_url = None
+        # 本轮的回答和下一个问题一次性追加写入（由调用方交给会话缓存写回）
+        transcript.seal()
+        return full_response
+
+    def _submit_question_audio(self, text: str) -> Optional[str]:
+        """提交问题的TTS后台合成任务，返回任务ID（不等待合成完成），失败返回None"""
+        try:
+            job_id = audio_jobs.submit(text)
+            print(f"[TTS] 已提交后台合成: {job_id}")
+            return job_id
+        except Exception as e:
+            print(f"[TTS] 提交合成任务失败: {e}")
+            return None
+
+    async def process_answer(self, request: AnswerRequest) -> AnswerResponse:
+        """处理候选人回答（会话状态来自会话缓存，处理期间不占用数据库连接）
+
+        同一会话的回答按到达顺序逐个处理；带幂等键的重试直接返回首次处理的响应。
+        """
+        replay = await self.find_answered(request, check_db=False)
+        if replay is not None:
+            print(f"[幂等] 重复提交，返回已处理的响应: {request.session_id}")
+            return replay
+
+        async with self._serialize_turn(request.session_id):
+            # 获取会话（持有锁之后读取，拿到上一轮处理后的状态）
+            session, replay = await self._get_turn_session(request)
+            if replay is not None:
+                # 排队期间相同的请求可能已处理完成
+                print(f"[幂等] 重复提交，返回已处理的响应: {request.session_id}")
+                return replay
+            transcript = session.transcript
+
+            # 记录候选人回答
+            self._record_answer(session, transcript, request)
             try:
-                from services.volcengine_tts_service import get_volcengine_tts_service
-                audio_url = get_volcengine_tts_service().text_to_speech_url(full_response)
-                if audio_url:
-                    print(f"[TTS] 下一个问题音频生成成功: {audio_url}")
-                else:
-                    print("[TTS] 音频生成失败，前端将动态请求")
-            except Exception as e:
-                print(f"[TTS] 音频生成异常: {e}")
+                response = await self._answer_turn(session, transcript, request)
+            finally:
+                # 本轮未完成（如 LLM 调用失败）时丢弃未写入的回答，客户端重试不会重复记录
+                transcript.discard_unsealed()
+
+            self._remember_answer(request, response)
+            return response
+
+    async def _answer_turn(self, session: SessionState, transcript: transcript_store.Transcript, request: AnswerRequest) -> AnswerResponse:
+        # 检查用户是否主动结束面试
+        if request.finish_interview:
+            print(f"[面试结束] 用户主动结束面试")
+            await self._finish_session(session, transcript)
 
             return AnswerResponse(
-                next_question=full_response,
-                instant_score=instant_score,
-                hint=hint,
-                is_finished=False,
-                audio_url=audio_url
+                next_question=None,
+                instant_score=None,
+                hint="感谢您参加本次面试，报告正在生成",
+                is_finished=True
             )
-        else:
-            # 面试结束
-            session.is_finished = True
-            session.finished_at = datetime.utcnow()
-            db.commit()
 
-            # 生成报告
-            report = self.generate_report(request.session_id, db)
+        # 判断是否完成所有主题
+        if self._all_topics_completed(session):
+            # 面试结束（报告在后台生成）
+            await self._finish_session(session, transcript)
 
             return AnswerResponse(
                 next_question=None,
@@ -684,42 +969,292 @@ class InterviewService:
                 is_finished=True
             )
 
-    def generate_report(self, session_id: str, db: Session) -> InterviewReportSchema:
-        """生成面试报告"""
-        # 获取会话
-        session = db.query(InterviewSession).filter(
-            InterviewSession.session_id == session_id
-        ).first()
+        # 继续面试
+        messages, system_prompt, topic_state = await self._build_turn_prompt(session, transcript, request)
+
+        response_text, summary_result = await asyncio.gather(
+            self._call_llm(messages, "turn", system=system_prompt, temperature=0.8),
+            self._refresh_summary(session, transcript)
+        )
+        print(f"[DEBUG] Qwen 原始响应: {response_text}")
+
+        # 解析响应
+        result = self._parse_turn_response(response_text)
+        self._store_summary(session, summary_result)
+        full_response = self._apply_turn_result(session, transcript, topic_state, result)
+
+        # 下一个问题的TTS音频在后台合成
+        audio_job_id = self._submit_question_audio(full_response)
+
+        return AnswerResponse(
+            next_question=full_response,
+            instant_score=result["score"],
+            hint=result["hint"],
+            is_finished=False,
+            audio_url=audio_jobs.audio_url(audio_job_id) if audio_job_id else None,
+            audio_job_id=audio_job_id
+        )
+
+    async def process_answer_stream(self, request: AnswerRequest) -> AsyncIterator[tuple[str, dict]]:
+        """流式处理候选人回答
+
+        按 LLM 输出进度依次产出事件 (event, data)：
+        - feedback：互动反馈
+        - score：即时评分和改进提示
+        - question：下一个问题的增量片段
+        - done：最终的 AnswerResponse（对话记录已保存）
+
+        与 process_answer 一样串行处理同一会话的回答，带幂等键的重试只产出 done 事件。
+        """
+        replay = await self.find_answered(request, check_db=False)
+        if replay is not None:
+            print(f"[幂等] 重复提交，返回已处理的响应: {request.session_id}")
+            yield "done", replay.model_dump()
+            return
+
+        async with self._serialize_turn(request.session_id):
+            session, replay = await self._get_turn_session(request)
+            if replay is not None:
+                print(f"[幂等] 重复提交，返回已处理的响应: {request.session_id}")
+                yield "done", replay.model_dump()
+                return
+
+            # 流被关闭时立即关闭内层生成器：未完成的回答在释放会话锁之前丢弃，而不是等垃圾回收
+            async with aclosing(self._answer_turn_stream(session, request)) as events:
+                async for event, data in events:
+                    yield event, data
+
+    async def _answer_turn_stream(self, session: SessionState, request: AnswerRequest) -> AsyncIterator[tuple[str, dict]]:
+        transcript = session.transcript
+        self._record_answer(session, transcript, request)
+
+        try:
+            if request.finish_interview or self._all_topics_completed(session):
+                # 结束面试没有需要流式输出的内容，直接复用非流式逻辑
+                print(f"[面试结束] 流式接口结束面试")
+                await self._finish_session(session, transcript)
+
+                response = AnswerResponse(
+                    next_question=None,
+                    instant_score=None,
+                    hint="感谢您参加本次面试，报告正在生成" if request.finish_interview else "面试已结束，感谢您的参与！",
+                    is_finished=True
+                )
+                self._remember_answer(request, response)
+                yield "done", response.model_dump()
+                return
+
+            messages, system_prompt, topic_state = await self._build_turn_prompt(session, transcript, request)
+            summary_task = asyncio.create_task(self._refresh_summary(session, transcript))
+
+            parser = IncrementalJSONParser()
+            score_sent = False
+            question_sent = 0
+            try:
+                async for chunk in self.qwen_service.achat_stream_task("turn", messages=messages, system=system_prompt, temperature=0.8):
+                    for key, value in parser.feed(chunk):
+                        if key == "feedback":
+                            yield "feedback", {"feedback": value}
+
+                    # 评分和提示都完整后一起推送
+                    if not score_sent and "score" in parser.fields and "hint" in parser.fields:
+                        score_sent = True
+                        yield "score", {"score": parser.fields["score"], "hint": parser.fields["hint"]}
+
+                    # 下一个问题边生成边推送
+                    question = parser.partial("next_question")
+                    if score_sent and question and len(question) > question_sent:
+                        yield "question", {"delta": question[question_sent:]}
+                        question_sent = len(question)
+            except BaseException:
+                # 流中断（客户端断开、生成器被关闭）或失败时不再需要摘要：取消后台摘要任务并取回结果
+                summary_task.cancel()
+                await asyncio.gather(summary_task, return_exceptions=True)
+                raise
+
+            print(f"[DEBUG] Qwen 流式原始响应: {parser.text}")
+
+            # 流结束后统一解析并持久化
+            result = self._parse_turn_response(parser.text)
+            self._store_summary(session, await summary_task)
+            full_response = self._apply_turn_result(session, transcript, topic_state, result)
+            audio_job_id = self._submit_question_audio(full_response)
+
+            response = AnswerResponse(
+                next_question=full_response,
+                instant_score=result["score"],
+                hint=result["hint"],
+                is_finished=False,
+                audio_url=audio_jobs.audio_url(audio_job_id) if audio_job_id else None,
+                audio_job_id=audio_job_id
+            )
+            self._remember_answer(request, response)
+            yield "done", response.model_dump()
+        finally:
+            # 流中断或失败时丢弃未写入的回答
+            transcript.discard_unsealed()
+
+    async def get_report_status(self, session_id: str, db: AsyncSession) -> ReportStatus:
+        """查询报告生成状态"""
+        session = await db.scalar(
+            select(InterviewSession).options(SESSION_REPORT_STATUS_COLUMNS).where(InterviewSession.session_id == session_id)
+        )
 
         if not session:
             raise ValueError("会话不存在")
 
-        # 检查是否已有报告
-        existing_report = db.query(InterviewReport).filter(
-            InterviewReport.session_id == session_id
-        ).first()
+        if not session.report_status and session.is_finished:
+            # 旧数据或之前入队失败：已有报告直接标记 ready，否则重新提交后台生成
+            has_report = await db.scalar(
+                select(InterviewReport.id).where(InterviewReport.session_id == session_id)
+            ) is not None
+            if has_report:
+                session.report_status = "ready"
+                await db.commit()
+            else:
+                await self._enqueue_report(session, db)
+        elif session.report_status == "pending":
+            await self._resubmit_lost_report(session_id, session.report_requested_at)
 
-        if existing_report:
-            return InterviewReportSchema(
-                session_id=existing_report.session_id,
-                total_score=existing_report.total_score,
-                technical_skill=existing_report.technical_skill,
-                communication=existing_report.communication,
-                logic_thinking=existing_report.logic_thinking,
-                experience=existing_report.experience,
-                suggestions=existing_report.suggestions,
-                transcript=existing_report.transcript,
-                created_at=existing_report.created_at
+        status = session.report_status
+        if not status:
+            status = "pending" if session.is_finished else "not_started"
+
+        return ReportStatus(
+            session_id=session_id,
+            status=status,
+            error=session.report_error if status == "failed" else None
+        )
+
+    async def get_report(self, session_id: str, db: AsyncSession) -> InterviewReportSchema:
+        """
+        获取面试报告：后台仍在生成时等待完成，失败或超时则直接生成
+
+        Raises:
+            ValueError: 会话不存在
+            ReportPending: 报告仍在其他进程中生成
+        """
+        session = (await db.execute(
+            select(InterviewSession.id, InterviewSession.report_status, InterviewSession.report_requested_at).where(
+                InterviewSession.session_id == session_id
             )
+        )).first()
+
+        if not session:
+            raise ValueError("会话不存在")
+
+        if session.report_status == "pending":
+            await self._resubmit_lost_report(session_id, session.report_requested_at)
+            status = await self.report_queue.wait(session_id, db, settings.report_wait_timeout)
+            print(f"[报告] 等待后台生成结束: {session_id}, 状态={status}")
+
+        return await self.generate_report(session_id, db)
+
+    async def _resubmit_lost_report(self, session_id: str, requested_at: Optional[datetime]):
+        """pending 的报告任务丢失（进程重启或崩溃）时重新提交，避免一直 pending"""
+        if self.report_queue.is_lost(session_id, requested_at, settings.report_pending_timeout):
+            await self.report_queue.resubmit(session_id, requested_at)
+
+    @staticmethod
+    async def _load_report(session_id: str, db: AsyncSession) -> Optional[InterviewReportSchema]:
+        """读取已保存的报告，不存在返回 None"""
+        existing_report = await db.scalar(
+            select(InterviewReport).where(InterviewReport.session_id == session_id)
+        )
+
+        if not existing_report:
+            return None
+
+        return InterviewReportSchema(
+            session_id=existing_report.session_id,
+            total_score=existing_report.total_score,
+            technical_skill=existing_report.technical_skill,
+            communication=existing_report.communication,
+            logic_thinking=existing_report.logic_thinking,
+            experience=existing_report.experience,
+            suggestions=existing_report.suggestions,
+            # 旧版报告保存了对话快照，新报告直接读取 interview_turns
+            transcript=existing_report.transcript or await transcript_store.load_transcript(db, session_id),
+            created_at=existing_report.created_at
+        )
+
+    async def generate_report(self, session_id: str, db: AsyncSession) -> InterviewReportSchema:
+        """生成面试报告（同一会话的并发调用只生成一次，其余调用等待并共享结果）"""
+        # 检查会话是否存在（只取主键）
+        session_exists = await db.scalar(
+            select(InterviewSession.id).where(InterviewSession.session_id == session_id)
+        )
+
+        if session_exists is None:
+            raise ValueError("会话不存在")
+
+        # 检查是否已有报告
+        existing_report = await self._load_report(session_id, db)
+        if existing_report:
+            return existing_report
+
+        # 结束只读事务归还连接，等待生成（大模型调用）期间不占用调用方的连接
+        await db.commit()
+
+        # 进程内 single-flight：已有同一会话的生成任务时直接等待其结果
+        flight = self._report_flights.get(session_id)
+        if flight is None:
+            flight = asyncio.ensure_future(self._generate_report_exclusive(session_id))
+            self._report_flights[session_id] = flight
+            flight.add_done_callback(lambda _: self._report_flights.pop(session_id, None))
+        else:
+            print(f"[报告] {session_id} 正在生成，等待已有任务")
+
+        # shield：调用方断开时不取消共享任务，其他等待者仍能拿到结果
+        return await asyncio.shield(flight)
+
+    async def _generate_report_job(self, session_id: str) -> InterviewReportSchema:
+        """报告队列的生成任务"""
+        async with SessionLocal() as db:
+            return await self.generate_report(session_id, db)
+
+    async def _generate_report_exclusive(self, session_id: str) -> InterviewReportSchema:
+        """
+        跨进程互斥地生成报告（不依赖发起请求的生命周期）
+
+        读取会话和对话记录后立即归还连接，调用大模型期间只占用持有生成锁的那条连接。
+
+        Raises:
+            ReportPending: 等待生成锁超时，报告仍在其他进程中生成
+        """
+        async with advisory_lock(f"report:{session_id}", timeout=settings.report_lock_timeout) as acquired:
+            async with SessionLocal() as db:
+                # 拿到锁（或等待超时）后再检查一次，其他 worker 可能已经生成完毕
+                existing_report = await self._load_report(session_id, db)
+                if existing_report:
+                    print(f"[报告] {session_id} 已由其他进程生成")
+                    return existing_report
+                if not acquired:
+                    # 其他 worker 仍在生成，不重复调用大模型
+                    raise ReportPending(session_id)
+
+                session = await db.scalar(
+                    select(InterviewSession).options(SESSION_REPORT_COLUMNS).where(InterviewSession.session_id == session_id)
+                )
+                transcript = await self.load_transcript(session, db)
+
+            return await self._create_report(session, transcript)
+
+    async def _create_report(self, session: InterviewSession, transcript: transcript_store.Transcript) -> InterviewReportSchema:
+        """调用大模型评估面试表现，并用新的短会话保存报告"""
+        session_id = session.session_id
 
         # 使用大模型分析面试表现
         system_prompt = f"""你是一位专业的{session.position}面试评估专家。
 请根据以下面试对话记录，生成详细的面试评估报告。"""
 
-        transcript_text = "\n\n".join([
-            f"{'面试官' if item['role'] == 'interviewer' else '候选人'}: {item['content']}"
-            for item in session.transcript
-        ])
+        # 摘要 + 每题得分 + 预算内的近期对话原文，长面试的报告提示词不再无限增长
+        transcript_text = context_builder.build_report_transcript(
+            transcript,
+            session.transcript_summary,
+            session.summary_upto or 0,
+            settings.context_report_token_budget
+        )
 
         messages = [{
             "role": "user",
@@ -752,16 +1287,14 @@ class InterviewService:
 suggestions要包含3-5条具体的改进建议。"""
         }]
 
-        response_text = self._call_llm(messages, system=system_prompt, temperature=0.5)
+        response_text = await self._call_llm(messages, "report", system=system_prompt, temperature=0.5)
 
         # 解析报告
         try:
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                report_data = json.loads(json_match.group())
-            else:
-                report_data = json.loads(response_text)
+            report_data = parse_json_object(response_text)
+            for key in ("total_score", "technical_skill", "communication", "logic_thinking", "experience", "suggestions"):
+                if key not in report_data:
+                    raise ValueError(f"报告缺少字段: {key}")
         except:
             # 默认评分
             report_data = {
@@ -782,11 +1315,22 @@ suggestions要包含3-5条具体的改进建议。"""
             communication=report_data["communication"],
             logic_thinking=report_data["logic_thinking"],
             experience=report_data["experience"],
-            suggestions=report_data["suggestions"],
-            transcript=session.transcript
+            suggestions=report_data["suggestions"]
         )
-        db.add(report)
-        db.commit()
+        async with SessionLocal() as db:
+            db.add(report)
+            await db.execute(
+                update(InterviewSession).where(
+                    InterviewSession.session_id == session_id
+                ).values(report_status="ready", report_error=None)
+            )
+            try:
+                await db.commit()
+            except IntegrityError:
+                # 非 Postgres 数据库没有跨进程锁，并发生成的兜底：以先写入的报告为准
+                await db.rollback()
+                print(f"[报告] {session_id} 报告已存在，使用已保存的报告")
+                return await self._load_report(session_id, db)
 
         return InterviewReportSchema(
             session_id=session_id,
@@ -796,6 +1340,6 @@ suggestions要包含3-5条具体的改进建议。"""
             logic_thinking=report_data["logic_thinking"],
             experience=report_data["experience"],
             suggestions=report_data["suggestions"],
-            transcript=session.transcript,
+            transcript=transcript,
             created_at=report.created_at
         )
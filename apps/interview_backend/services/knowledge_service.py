@@ -1,12 +1,40 @@
 """知识库服务 - 直接连接 ES"""
-from typing import List, Dict, Optional
-from elasticsearch import Elasticsearch
+import asyncio
+from collections import OrderedDict
+from typing import Iterable, List, Dict, Optional
+from elasticsearch import AsyncElasticsearch
 from config import settings
 import dashscope
 from dashscope import TextEmbedding
-from functools import lru_cache
 from datetime import datetime, timedelta
 
+from services.embedding_cache import EmbeddingCache, normalize_text
+from services.position_pool_cache import PositionPoolCache
+from services.question_index import VECTOR_FIELD, check_index
+from services.question_ref import QuestionRef
+from services.resilience import CircuitOpenError, resilience_policies, upstream_error
+
+
+def rrf_fuse(ranked_lists: List[List[Dict]], k: int) -> List[Dict]:
+    """
+    RRF 融合多路排序结果：得分 = Σ 1 / (k + 排名)
+
+    只使用排名，不使用各路原始得分（BM25 与余弦相似度的量纲不同，不能直接相加）。
+    按 _id 合并命中，返回按融合得分降序排列的命中，_score 替换为融合得分。
+
+    Args:
+        ranked_lists: 各路按得分降序排列的 ES 命中
+        k: 排名常数，越大各名次之间的得分差距越小
+    """
+    scores: Dict[str, float] = {}
+    hits: Dict[str, Dict] = {}
+    for ranked in ranked_lists:
+        for rank, hit in enumerate(ranked, start=1):
+            scores[hit["_id"]] = scores.get(hit["_id"], 0.0) + 1.0 / (k + rank)
+            hits.setdefault(hit["_id"], hit)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [{**hits[doc_id], "_score": scores[doc_id]} for doc_id in ordered]
+
 
 class KnowledgeService:
     """知识库服务 - 直接访问 Elasticsearch"""
@@ -18,53 +46,110 @@ class KnowledgeService:
         self.es_host = getattr(settings, 'es_host', 'http://47.93.141.137:9200')
         self.es_index = getattr(settings, 'es_index', 'interview_questions')
 
-        # 创建 ES 客户端
-        self.es = Elasticsearch([self.es_host])
+        # 创建异步 ES 客户端（连接池复用连接，不嗅探节点：单一地址或经负载均衡访问）
+        self.es = AsyncElasticsearch(
+            [self.es_host],
+            basic_auth=(settings.es_username, settings.es_password) if settings.es_username else None,
+            connections_per_node=settings.es_connections_per_node,
+            request_timeout=settings.es_request_timeout,
+            max_retries=settings.es_max_retries,
+            retry_on_timeout=True,
+            sniff_on_start=False,
+            sniff_on_node_failure=False
+        )
 
         # 配置 DashScope（用于向量化查询）
         dashscope.api_key = settings.dashscope_api_key
 
         # 缓存统计信息
         self._cache_stats = {
-            "position_queries_hit": 0,
-            "position_queries_miss": 0,
+            "question_cache_hit": 0,
+            "question_cache_miss": 0,
             "last_cache_clear": datetime.utcnow()
         }
 
-    def _get_query_vector(self, text: str) -> Optional[List[float]]:
+        # 岗位题库池缓存（按条目 TTL 过期，过期后先返回旧数据并在后台刷新）
+        self._position_cache = PositionPoolCache(
+            loader=self._load_position_pool,
+            ttl=settings.position_cache_ttl,
+            stale_ttl=settings.position_cache_stale_ttl,
+            max_bytes=settings.position_cache_max_bytes
+        )
+
+        # 题目缓存 {题目ID: 精简字段}，会话中只保存题目ID，取用时从这里解析
+        self._question_cache: "OrderedDict[str, QuestionRef]" = OrderedDict()
+        self._question_cache_size = settings.question_cache_size
+
+        # 查询向量缓存（岗位名称、回答关键词等查询文本会反复出现）
+        self.embedding_model = TextEmbedding.Models.text_embedding_v2
+        self._embedding_cache = EmbeddingCache(
+            model=self.embedding_model,
+            max_bytes=settings.embedding_cache_max_bytes,
+            disk_dir=settings.embedding_cache_dir,
+            disk_max_entries=settings.embedding_cache_disk_max_entries
+        )
+
+    async def _get_query_vector(self, text: str) -> Optional[List[float]]:
         """将文本转换为向量
 
+        文本规范化后先查向量缓存，未命中才调用向量化接口（失败结果不缓存）
+
         Args:
             text: 查询文本
 
         Returns:
-            1536维向量，失败返回None
+            1536维向量，失败或熔断时返回None（调用方降级为关键词搜索）
         """
-        try:
+        normalized = normalize_text(text)
+        if self._embedding_cache.has_disk:
+            # 磁盘层需要文件 IO（读取索引、mmap、可能等待文件锁）：内存层未命中时才放到线程中查找
+            cached = self._embedding_cache.get_memory(normalized)
+            if cached is None:
+                cached = await asyncio.to_thread(self._embedding_cache.get, normalized)
+        else:
+            cached = self._embedding_cache.get(normalized)
+        if cached is not None:
+            return cached
+
+        def embed() -> List[float]:
             response = TextEmbedding.call(
-                model=TextEmbedding.Models.text_embedding_v2,
-                input=text
+                model=self.embedding_model,
+                input=normalized
             )
-            if response.status_code == 200:
-                return response.output['embeddings'][0]['embedding']
-            else:
-                print(f"[ERROR] 向量化失败: {response.message}")
-                return None
+            if response.status_code != 200:
+                raise upstream_error(response.status_code, f"向量化失败: {response.message}")
+            return response.output['embeddings'][0]['embedding']
+
+        try:
+            # 经过容错策略：截止时间 + 对冲请求 + 熔断（DashScope SDK 是同步的，在线程中执行）
+            vector = await resilience_policies["embedding"].call(lambda: asyncio.to_thread(embed))
+        except CircuitOpenError as e:
+            print(f"[WARNING] {e}，跳过向量化")
+            return None
         except Exception as e:
             print(f"[ERROR] 向量化异常: {e}")
             return None
 
-    def search_questions(
+        if self._embedding_cache.has_disk:
+            # 写入磁盘层需要文件锁，放到线程中执行
+            await asyncio.to_thread(self._embedding_cache.put, normalized, vector)
+        else:
+            self._embedding_cache.put(normalized, vector)
+        return vector
+
+    async def search_questions(
         self,
         query: str,
         position: Optional[str] = None,
         round_name: Optional[str] = None,
         size: int = 10,
         search_type: str = "hybrid"
-    ) -> List[Dict]:
+    ) -> List[QuestionRef]:
         """
         搜索面试题（支持关键词、向量、混合搜索）
 
+        ES 只返回 QuestionRef.SOURCE_FIELDS 中的字段，结果为精简的 QuestionRef 记录
+
         Args:
             query: 搜索关键词（如：Python 列表、HTTP 协议）
             position: 岗位（如：Python后端开发）
@@ -98,98 +183,34 @@ class KnowledgeService:
             if round_name:
                 filter_clauses.append({"term": {"round": round_name}})
 
-            # 根据搜索类型构建查询
             if search_type == "keyword":
                 # 纯关键词搜索
-                body = {
-                    "query": {
-                        "bool": {
-                            "must": {
-                                "multi_match": {
-                                    "query": query,
-                                    "fields": ["question^2", "answer"],
-                                    "type": "best_fields"
-                                }
-                            },
-                            "filter": filter_clauses
-                        }
-                    },
-                    "size": size
-                }
+                hits = await self._search_hits(self._keyword_body(query, size, filter_clauses))
 
             elif search_type == "vector":
-                # 纯向量搜索
-                query_vector = self._get_query_vector(query)
+                # 纯向量搜索（HNSW 近似 kNN，筛选条件在图检索过程中生效）
+                query_vector = await self._get_query_vector(query)
                 if not query_vector:
                     # 向量化失败，降级为关键词搜索
                     print(f"[WARNING] 向量化失败，降级为关键词搜索")
-                    return self.search_questions(query, position, round_name, size, "keyword")
-
-                body = {
-                    "query": {
-                        "script_score": {
-                            "query": {
-                                "bool": {
-                                    "filter": filter_clauses
-                                }
-                            },
-                            "script": {
-                                "source": "cosineSimilarity(params.query_vector, 'question_vector') + 1.0",
-                                "params": {"query_vector": query_vector}
-                            }
-                        }
-                    },
-                    "size": size
-                }
-
-            else:  # hybrid
-                # 混合搜索：关键词 + 向量（RRF融合）
-                query_vector = self._get_query_vector(query)
-                if not query_vector:
-                    # 向量化失败，降级为关键词搜索
-                    print(f"[WARNING] 向量化失败，使用纯关键词搜索")
-                    return self.search_questions(query, position, round_name, size, "keyword")
+                    return await self.search_questions(query, position, round_name, size, "keyword")
 
-                # 使用 RRF (Reciprocal Rank Fusion) 混合搜索
-                body = {
-                    "query": {
-                        "bool": {
-                            "should": [
-                                {
-                                    "multi_match": {
-                                        "query": query,
-                                        "fields": ["question^2", "answer"],
-                                        "type": "best_fields",
-                                        "boost": 0.5  # 关键词权重0.5
-                                    }
-                                },
-                                {
-                                    "script_score": {
-                                        "query": {"match_all": {}},
-                                        "script": {
-                                            "source": "cosineSimilarity(params.query_vector, 'question_vector') + 1.0",
-                                            "params": {"query_vector": query_vector}
-                                        },
-                                        "boost": 0.5  # 向量权重0.5
-                                    }
-                                }
-                            ],
-                            "filter": filter_clauses,
-                            "minimum_should_match": 1
-                        }
-                    },
-                    "size": size
-                }
+                try:
+                    hits = await self._search_hits(self._knn_body(query_vector, size, filter_clauses))
+                except Exception as e:
+                    # 索引尚未迁移到 HNSW 映射等情况：kNN 查询失败时降级为关键词搜索
+                    print(f"[WARNING] kNN 查询失败，降级为关键词搜索: {e}")
+                    return await self.search_questions(query, position, round_name, size, "keyword")
 
-            # 执行搜索
-            response = self.es.search(index=self.es_index, body=body)
+            else:  # hybrid
+                hits = await self._hybrid_hits(query, size, filter_clauses)
 
-            # 解析结果
+            # 解析结果（得分为相似度分数，混合搜索为 RRF 融合得分；会话中只保存题目ID）
             results = []
-            for hit in response["hits"]["hits"]:
-                result = hit["_source"]
-                result["_score"] = hit["_score"]  # 保存相似度分数
+            for hit in hits:
+                result = QuestionRef.from_source(hit["_id"], hit["_source"], hit["_score"])
                 results.append(result)
+                self._cache_question(result)
 
             print(f"[知识库] {search_type}搜索 '{query}' 返回 {len(results)} 条结果")
             return results
@@ -200,31 +221,92 @@ class KnowledgeService:
             traceback.print_exc()
             return []
 
-    @lru_cache(maxsize=128)
-    def _cached_search_by_position(self, position: str, limit: int) -> tuple:
+    # 查询只返回需要的字段（不返回 question_vector 等大字段，减小响应体积和解码时间）
+    SOURCE_FILTER = {"includes": list(QuestionRef.SOURCE_FIELDS), "excludes": [VECTOR_FIELD]}
+
+    def _keyword_body(self, query: str, size: int, filter_clauses: List[Dict]) -> Dict:
+        """关键词查询（BM25）"""
+        return {
+            "query": {
+                "bool": {
+                    "must": {
+                        "multi_match": {
+                            "query": query,
+                            "fields": ["question^2", "answer"],
+                            "type": "best_fields"
+                        }
+                    },
+                    "filter": filter_clauses
+                }
+            },
+            "_source": self.SOURCE_FILTER,
+            "size": size
+        }
+
+    def _knn_body(self, query_vector: List[float], size: int, filter_clauses: List[Dict]) -> Dict:
+        """kNN 查询（question_vector 上的 HNSW 近似检索，代价随题库规模亚线性增长）"""
+        return {
+            "knn": {
+                "field": VECTOR_FIELD,
+                "query_vector": query_vector,
+                "k": size,
+                "num_candidates": max(settings.es_knn_num_candidates, size),
+                "filter": filter_clauses
+            },
+            "_source": self.SOURCE_FILTER,
+            "size": size
+        }
+
+    async def _search_hits(self, body: Dict) -> List[Dict]:
+        """执行查询，返回命中列表"""
+        response = await self.es.search(index=self.es_index, body=body)
+        return response["hits"]["hits"]
+
+    async def _hybrid_hits(self, query: str, size: int, filter_clauses: List[Dict]) -> List[Dict]:
         """
-        缓存版本的岗位题目查询（使用tuple以支持缓存）
+        混合搜索：关键词和向量两路并发查询，按 RRF（Reciprocal Rank Fusion）融合排名
 
-        注意：lru_cache 要求参数必须是可哈希的，所以返回 tuple
+        关键词一路与「向量化 + kNN」一路同时进行，耗时取决于较慢的一路。
+        任意一路失败时只用另一路的结果。
         """
-        results = self.search_questions(
-            query=position,
-            position=position,
-            size=limit,
-            search_type="hybrid"
+        async def knn_leg() -> List[Dict]:
+            query_vector = await self._get_query_vector(query)
+            if not query_vector:
+                print(f"[WARNING] 向量化失败，使用纯关键词结果")
+                return []
+            try:
+                return await self._search_hits(
+                    self._knn_body(query_vector, max(settings.es_hybrid_knn_size, size), filter_clauses)
+                )
+            except Exception as e:
+                print(f"[WARNING] kNN 查询失败，使用纯关键词结果: {e}")
+                return []
+
+        keyword_hits, knn_hits = await asyncio.gather(
+            self._search_hits(self._keyword_body(query, max(settings.es_hybrid_keyword_size, size), filter_clauses)),
+            knn_leg(),
+            return_exceptions=True
         )
-        # 将结果转为 tuple，使其可被缓存
-        return tuple(results)
+        if isinstance(knn_hits, BaseException):
+            raise knn_hits
+        if isinstance(keyword_hits, BaseException):
+            if not knn_hits:
+                raise keyword_hits
+            print(f"[WARNING] 关键词查询失败，使用纯向量结果: {keyword_hits}")
+            keyword_hits = []
+
+        return rrf_fuse([keyword_hits, knn_hits], settings.es_rrf_k)[:size]
 
-    def search_by_position(
+    async def search_by_position(
         self,
         position: str,
         limit: int = 15
-    ) -> List[Dict]:
+    ) -> List[QuestionRef]:
         """
         根据岗位获取参考题目（用于面试开始时）
 
-        ⚡ 带缓存优化：相同岗位的查询结果会被缓存，避免重复 ES 查询
+        ⚡ 带缓存优化：相同岗位的查询结果会被缓存，避免重复 ES 查询；
+        缓存过期后先返回旧结果并在后台刷新，用户不等待 ES
 
         Args:
             position: 岗位名称
@@ -233,31 +315,30 @@ class KnowledgeService:
         Returns:
             问题列表
         """
-        # 检查是否命中缓存
-        cache_info = self._cached_search_by_position.cache_info()
-        hits_before = cache_info.hits
-
-        # 调用缓存函数
-        cached_results = self._cached_search_by_position(position, limit)
-
-        # 统计缓存命中情况
-        cache_info_after = self._cached_search_by_position.cache_info()
-        if cache_info_after.hits > hits_before:
-            self._cache_stats["position_queries_hit"] += 1
+        results, state = await self._position_cache.get(position, limit)
+        if state == "hit":
             print(f"[缓存命中] 岗位题库: {position} (limit={limit})")
+        elif state == "stale":
+            print(f"[缓存命中] 岗位题库: {position} (limit={limit}), 已过期，后台刷新")
         else:
-            self._cache_stats["position_queries_miss"] += 1
             print(f"[缓存未命中] 岗位题库: {position} (limit={limit}), 查询 ES")
+        return list(results)
 
-        # 转回 list 返回
-        return list(cached_results)
+    async def _load_position_pool(self, position: str, limit: int) -> List[QuestionRef]:
+        """查询岗位题库池（岗位题库池缓存未命中或后台刷新时调用）"""
+        return await self.search_questions(
+            query=position,
+            position=position,
+            size=limit,
+            search_type="hybrid"
+        )
 
-    def search_related_questions(
+    async def search_related_questions(
         self,
         keywords: str,
         position: Optional[str] = None,
         limit: int = 5
-    ) -> List[Dict]:
+    ) -> List[QuestionRef]:
         """
         根据关键词搜索相关问题（用于追问）
 
@@ -269,14 +350,57 @@ class KnowledgeService:
         Returns:
             问题列表
         """
-        return self.search_questions(
+        return await self.search_questions(
             query=keywords,
             position=position,
             size=limit,
             search_type="vector"  # 使用向量搜索，更智能
         )
 
-    def health_check(self) -> bool:
+    def _cache_question(self, question: QuestionRef):
+        """写入题目缓存（超出容量时淘汰最久未使用的题目）"""
+        self._question_cache[question.id] = question
+        self._question_cache.move_to_end(question.id)
+        while len(self._question_cache) > self._question_cache_size:
+            self._question_cache.popitem(last=False)
+
+    async def get_questions_by_ids(self, question_ids: Iterable[str]) -> List[QuestionRef]:
+        """
+        根据题目ID获取题目（优先读缓存，未命中的批量从 ES 获取）
+
+        Args:
+            question_ids: 题目ID列表
+
+        Returns:
+            题目列表（顺序与输入一致，已删除的题目会被跳过）
+        """
+        question_ids = list(question_ids)
+        missing = [qid for qid in question_ids if qid not in self._question_cache]
+        self._cache_stats["question_cache_hit"] += len(question_ids) - len(missing)
+        self._cache_stats["question_cache_miss"] += len(missing)
+
+        if missing:
+            try:
+                response = await self.es.mget(
+                    index=self.es_index,
+                    ids=missing,
+                    _source_includes=list(QuestionRef.SOURCE_FIELDS)
+                )
+                for doc in response["docs"]:
+                    if doc.get("found"):
+                        self._cache_question(QuestionRef.from_source(doc["_id"], doc["_source"]))
+            except Exception as e:
+                print(f"[ERROR] ES 批量获取题目失败: {e}")
+
+        questions = []
+        for qid in question_ids:
+            question = self._question_cache.get(qid)
+            if question:
+                self._question_cache.move_to_end(qid)
+                questions.append(question)
+        return questions
+
+    async def health_check(self) -> bool:
         """
         检查 ES 是否可用
 
@@ -284,10 +408,29 @@ class KnowledgeService:
             True 如果可用
         """
         try:
-            return self.es.ping()
+            return await self.es.ping()
         except:
             return False
 
+    async def check_index(self) -> Dict:
+        """
+        检查题库索引映射（启动时调用），question_vector 不支持 kNN 时提示运行迁移命令
+
+        Returns:
+            {"exists", "knn", "dims"}，ES 不可用时返回 {"error": ...}
+        """
+        try:
+            status = await check_index(self.es, self.es_index)
+        except Exception as e:
+            print(f"[知识库] 检查题库索引失败: {e}")
+            return {"error": str(e)}
+        if not status["exists"]:
+            print(f"[知识库] ⚠️ 题库索引 {self.es_index} 不存在，运行 scripts/reindex_questions.py 按托管映射创建")
+        elif not status["knn"]:
+            print(f"[知识库] ⚠️ 题库索引 {self.es_index} 的 {VECTOR_FIELD} 不支持 kNN，向量检索将降级为关键词搜索，"
+                  f"请运行 scripts/reindex_questions.py 重建索引")
+        return status
+
     def get_cache_stats(self) -> Dict:
         """
         获取缓存统计信息
@@ -295,29 +438,47 @@ class KnowledgeService:
         Returns:
             缓存命中率等统计数据
         """
-        cache_info = self._cached_search_by_position.cache_info()
-        total_queries = self._cache_stats["position_queries_hit"] + self._cache_stats["position_queries_miss"]
-        hit_rate = (self._cache_stats["position_queries_hit"] / total_queries * 100) if total_queries > 0 else 0
-
         return {
-            "position_cache": {
-                "hits": cache_info.hits,
-                "misses": cache_info.misses,
-                "maxsize": cache_info.maxsize,
-                "currsize": cache_info.currsize,
-                "hit_rate": f"{hit_rate:.2f}%"
+            "position_cache": self._position_cache.get_stats(),
+            "question_cache": {
+                "size": len(self._question_cache),
+                "maxsize": self._question_cache_size,
+                "hits": self._cache_stats["question_cache_hit"],
+                "misses": self._cache_stats["question_cache_miss"]
             },
-            "total_queries": total_queries,
+            "embedding_cache": self._embedding_cache.get_stats(),
             "last_cache_clear": self._cache_stats["last_cache_clear"].isoformat()
         }
 
-    def clear_cache(self):
+    def clear_cache(self, position: Optional[str] = None):
         """
-        清除所有缓存（在题库更新时调用）
+        清除题库相关缓存（在题库更新时调用）
+
+        查询向量只取决于查询文本和向量模型，与题库无关，不随题库更新清除
+
+        Args:
+            position: 岗位名称（与 search_by_position 的参数一致），只清除该岗位的题库池和其中的题目；
+                      为空时清除全部
         """
-        self._cached_search_by_position.cache_clear()
-        self._cache_stats["last_cache_clear"] = datetime.utcnow()
-        print("[缓存清除] 知识库缓存已清空")
+        removed = self._position_cache.invalidate(position)
+        if position is None:
+            self._question_cache.clear()
+            self._cache_stats["last_cache_clear"] = datetime.utcnow()
+            print("[缓存清除] 知识库缓存已清空")
+            return
+
+        for question in removed:
+            self._question_cache.pop(question.id, None)
+        print(f"[缓存清除] 岗位题库已清除: {position}（{len(removed)} 条题目）")
+
+    def cached_positions(self) -> List[str]:
+        """已缓存题库池的岗位"""
+        return self._position_cache.positions()
+
+    async def aclose(self):
+        """停止后台刷新并关闭 ES 连接池（应用关闭时调用）"""
+        await self._position_cache.aclose()
+        await self.es.close()
 
 
 # 全局单例
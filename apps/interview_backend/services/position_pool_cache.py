@@ -0,0 +1,196 @@
+"""岗位题库池缓存 - 按条目 TTL 过期、过期后先返回旧数据并在后台刷新
+
+每个岗位的参考题目池（search_by_position 的结果）：
+- 新鲜期（ttl 内）：直接返回
+- 过期但在宽限期内（ttl ~ ttl + stale_ttl）：返回旧数据，同时在后台刷新（stale-while-revalidate），用户不等待 ES
+- 超过宽限期或不存在：等待查询；同一岗位的并发查询只发一次请求
+- 容量按字节计算，超出预算时淘汰最久未使用的条目
+- 可以只失效某个岗位，其他岗位不受影响
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from services.question_ref import QuestionRef
+
+
+CacheKey = Tuple[str, int]
+
+
+class _PoolEntry:
+    __slots__ = ("results", "size", "fetched_at")
+
+    def __init__(self, results: List[QuestionRef], size: int, fetched_at: float):
+        self.results = results
+        self.size = size
+        self.fetched_at = fetched_at
+
+
+def estimate_size(results: List[QuestionRef]) -> int:
+    """估算题目列表占用的内存字节数"""
+    return sum(question.nbytes for question in results)
+
+
+class PositionPoolCache:
+    """岗位题库池缓存（只在事件循环中使用）"""
+
+    def __init__(
+        self,
+        loader: Callable[[str, int], Awaitable[List[QuestionRef]]],
+        ttl: float,
+        stale_ttl: float,
+        max_bytes: int
+    ):
+        """
+        Args:
+            loader: 查询岗位题库池的协程函数 (岗位, 条数) -> 题目列表
+            ttl: 新鲜期（秒）
+            stale_ttl: 过期后仍可返回旧数据并后台刷新的宽限期（秒）
+            max_bytes: 字节预算
+        """
+        self._loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, _PoolEntry]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        # 岗位失效计数：查询期间岗位被失效时，查询结果不写入缓存
+        self._generations: Dict[str, int] = {}
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0, "evictions": 0}
+
+    async def get(self, position: str, limit: int) -> Tuple[List[QuestionRef], str]:
+        """
+        获取岗位题库池
+
+        Returns:
+            (题目列表, 状态)，状态为 hit / stale / miss
+        """
+        key = (position, limit)
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry.results, "hit"
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self._stats["stale_hits"] += 1
+                self._schedule_refresh(key)
+                return entry.results, "stale"
+
+        self._stats["misses"] += 1
+        return await self._load(key), "miss"
+
+    def _load(self, key: CacheKey) -> "asyncio.Future[List[QuestionRef]]":
+        """查询并写入缓存（同一键的并发查询共享一个请求）"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield：某个等待者被取消时不影响共享的查询
+        return asyncio.shield(future)
+
+    async def _fetch(self, key: CacheKey) -> List[QuestionRef]:
+        position, limit = key
+        generation = self._generations.get(position, 0)
+        results = await self._loader(position, limit)
+        # 查询失败（空结果）不缓存，下次重试；查询期间岗位被失效时也不缓存
+        if results and self._generations.get(position, 0) == generation:
+            self._store(key, results)
+        return results
+
+    def _schedule_refresh(self, key: CacheKey):
+        """后台刷新过期条目（已在查询中时不重复发起）"""
+        if key in self._inflight:
+            return
+
+        self._stats["refreshes"] += 1
+        # 立即登记为进行中的查询：紧接着的过期命中不会再发起刷新
+        pending = self._load(key)
+
+        async def refresh():
+            try:
+                results = await pending
+                if not results:
+                    self._stats["refresh_failures"] += 1
+            except Exception as e:
+                self._stats["refresh_failures"] += 1
+                print(f"[岗位题库缓存] 后台刷新失败 {key[0]}: {e}")
+
+        task = asyncio.create_task(refresh())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    def _store(self, key: CacheKey, results: List[QuestionRef]):
+        """写入条目，超出字节预算时淘汰最久未使用的条目"""
+        size = estimate_size(results)
+        if size > self.max_bytes:
+            return
+        self._discard(key)
+        self._entries[key] = _PoolEntry(results, size, time.monotonic())
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            evicted_key = next(iter(self._entries))
+            self._discard(evicted_key)
+            self._stats["evictions"] += 1
+
+    def _discard(self, key: CacheKey) -> Optional[_PoolEntry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def invalidate(self, position: Optional[str] = None) -> List[QuestionRef]:
+        """
+        失效缓存
+
+        Args:
+            position: 岗位名称，为空时失效全部岗位
+
+        Returns:
+            被移除条目中的题目（用于同步清理题目缓存）
+        """
+        if position is None:
+            keys = list(self._entries)
+            for pos, _ in list(self._inflight):
+                self._generations[pos] = self._generations.get(pos, 0) + 1
+        else:
+            keys = [key for key in self._entries if key[0] == position]
+            self._generations[position] = self._generations.get(position, 0) + 1
+
+        removed = []
+        for key in keys:
+            entry = self._discard(key)
+            if entry is not None:
+                removed.extend(entry.results)
+        return removed
+
+    def positions(self) -> List[str]:
+        """已缓存的岗位"""
+        return sorted({position for position, _ in self._entries})
+
+    async def aclose(self):
+        """取消进行中的后台刷新"""
+        for task in list(self._refresh_tasks):
+            task.cancel()
+        await asyncio.gather(*self._refresh_tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        total = self._stats["hits"] + self._stats["stale_hits"] + self._stats["misses"]
+        now = time.monotonic()
+        return {
+            **self._stats,
+            "hit_rate": f"{((total - self._stats['misses']) / total * 100) if total else 0:.2f}%",
+            "entries": len(self._entries),
+            "stale_entries": sum(1 for entry in self._entries.values() if now - entry.fetched_at >= self.ttl),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+        }
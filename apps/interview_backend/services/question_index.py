@@ -0,0 +1,103 @@
+"""题库索引映射管理 - question_vector 使用 HNSW 索引的 dense_vector，支持近似 kNN 检索
+
+ES 不能原地把已有的 dense_vector 改为带索引，已有题库需要重建索引：
+新建带版本号的索引（如 interview_questions_v20261017120000）→ _reindex 复制数据 → 把别名 es_index 指向新索引。
+命令见 scripts/reindex_questions.py。
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from config import settings
+
+
+VECTOR_FIELD = "question_vector"
+
+
+def vector_field_mapping() -> Dict:
+    """question_vector 字段映射（HNSW 图索引，余弦相似度）"""
+    return {
+        "type": "dense_vector",
+        "dims": settings.es_vector_dims,
+        "index": True,
+        "similarity": "cosine",
+        "index_options": {
+            "type": "hnsw",
+            "m": settings.es_hnsw_m,
+            "ef_construction": settings.es_hnsw_ef_construction
+        }
+    }
+
+
+def build_index_mapping(existing_properties: Optional[Dict] = None) -> Dict:
+    """
+    题库索引映射
+
+    Args:
+        existing_properties: 旧索引的字段映射，重建索引时保留其中除向量外的字段（分词器等）
+
+    Returns:
+        mappings 定义
+    """
+    properties = {
+        "question": {"type": "text"},
+        "answer": {"type": "text"},
+        "position": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+        "round": {"type": "keyword"},
+    }
+    if existing_properties:
+        properties.update({k: v for k, v in existing_properties.items() if k != VECTOR_FIELD})
+    properties[VECTOR_FIELD] = vector_field_mapping()
+    return {"properties": properties}
+
+
+async def get_properties(es: AsyncElasticsearch, index: str) -> Optional[Dict]:
+    """读取索引（或别名指向的索引）的字段映射，不存在时返回 None"""
+    if not await es.indices.exists(index=index):
+        return None
+    mappings = (await es.indices.get_mapping(index=index)).body
+    # 别名可能指向多个索引，取任意一个（重建后只指向一个）
+    return next(iter(mappings.values()))["mappings"].get("properties", {})
+
+
+def supports_knn(properties: Optional[Dict]) -> bool:
+    """question_vector 是否为带索引的 dense_vector（8.11 起 dense_vector 默认带索引）"""
+    if not properties:
+        return False
+    field = properties.get(VECTOR_FIELD) or {}
+    return field.get("type") == "dense_vector" and field.get("index", True) is True
+
+
+async def check_index(es: AsyncElasticsearch, index: str) -> Dict:
+    """
+    检查题库索引映射
+
+    Returns:
+        {"exists", "knn", "dims"}
+    """
+    properties = await get_properties(es, index)
+    field = (properties or {}).get(VECTOR_FIELD) or {}
+    return {
+        "exists": properties is not None,
+        "knn": supports_knn(properties),
+        "dims": field.get("dims"),
+    }
+
+
+async def ensure_index(es: AsyncElasticsearch, alias: str) -> Dict:
+    """
+    题库索引不存在时按托管映射创建（新建的带版本号索引 + 别名），已存在时只检查
+
+    Returns:
+        同 check_index
+    """
+    if not await es.indices.exists(index=alias):
+        target = versioned_index_name(alias)
+        await es.indices.create(index=target, mappings=build_index_mapping(), aliases={alias: {}})
+        print(f"[知识库] 已创建题库索引 {target}（别名 {alias}）")
+    return await check_index(es, alias)
+
+
+def versioned_index_name(alias: str) -> str:
+    return f"{alias}_v{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
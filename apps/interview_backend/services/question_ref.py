@@ -0,0 +1,61 @@
+"""题库检索结果的精简记录
+
+ES 查询只返回 SOURCE_FIELDS 中的字段（不返回 question_vector 等大字段），结果物化为 QuestionRef：
+使用 __slots__ 而不是字典，岗位题库池缓存、题目缓存中的每条题目只占用几个字段的内存。
+"""
+import sys
+from typing import Dict, Optional
+
+from config import settings
+
+
+class QuestionRef:
+    """题目记录（ID、题目、参考答案摘要、岗位、轮次、检索得分）"""
+
+    __slots__ = ("id", "question", "answer", "position", "round", "score")
+
+    # 从 ES 获取的 _source 字段
+    SOURCE_FIELDS = ("question", "answer", "position", "round")
+
+    def __init__(
+        self,
+        id: str,
+        question: str = "",
+        answer: str = "",
+        position: Optional[str] = None,
+        round: Optional[str] = None,
+        score: Optional[float] = None
+    ):
+        self.id = id
+        self.question = question
+        self.answer = answer
+        self.position = position
+        self.round = round
+        self.score = score
+
+    @classmethod
+    def from_source(cls, doc_id: str, source: Dict, score: Optional[float] = None) -> "QuestionRef":
+        """由 ES 文档的 _source 构建（参考答案只保留前 QUESTION_ANSWER_SNIPPET_CHARS 个字符）"""
+        answer = source.get("answer") or ""
+        limit = settings.question_answer_snippet_chars
+        if len(answer) > limit:
+            answer = answer[:limit] + "…"
+        return cls(
+            id=doc_id,
+            question=source.get("question") or "",
+            answer=answer,
+            position=source.get("position"),
+            round=source.get("round"),
+            score=score
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """占用的内存字节数（估算，用于缓存的字节预算）"""
+        return sys.getsizeof(self) + sum(sys.getsizeof(getattr(self, field)) for field in self.__slots__)
+
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"QuestionRef(id={self.id!r}, question={self.question[:20]!r}, score={self.score})"
@@ -0,0 +1,104 @@
+"""每日面试次数配额
+
+检查和扣减合并为一条条件 UPDATE ... RETURNING：跨天时重置计数，未超限时预占一次，
+并发开始面试不会绕过每日上限，用户行也不会在面试启动的大模型调用期间保持未提交的修改。
+启动失败时调用 refund_slot 退还预占的次数。
+"""
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database.db import User
+
+
+class QuotaExceeded(Exception):
+    """今日次数已用完"""
+
+    def __init__(self, daily_limit: int):
+        super().__init__(f"今日免费次数已用完（{daily_limit}次/天），请购买会员")
+        self.daily_limit = daily_limit
+
+
+def _today_start() -> datetime:
+    """UTC 当天零点（与 last_free_date 一样统一使用 UTC）"""
+    now = datetime.utcnow()
+    return datetime(now.year, now.month, now.day)
+
+
+def _daily_limit_expr():
+    """按 VIP 类型取每日上限（超级VIP不受限制，不参与比较）"""
+    return case(
+        (User.vip_type == "normal", settings.normal_vip_daily_limit),
+        else_=settings.free_user_daily_limit
+    )
+
+
+async def reserve_slot(db: AsyncSession, user_id: str) -> Tuple[int, bool]:
+    """
+    原子地预占一次面试次数并提交
+
+    Returns:
+        (预占后的今日次数, 是否实际扣减了次数)；超级VIP不扣减
+
+    Raises:
+        ValueError: 用户不存在
+        QuotaExceeded: 今日次数已用完
+    """
+    today_start = _today_start()
+    same_day = User.last_free_date >= today_start
+    # 超级VIP只随跨天重置计数，不累加
+    increment = case((User.vip_type == "super", 0), else_=1)
+
+    row = (await db.execute(
+        update(User).where(
+            User.user_id == user_id,
+            or_(
+                User.vip_type == "super",
+                User.last_free_date.is_(None),
+                User.last_free_date < today_start,
+                func.coalesce(User.free_count_today, 0) < _daily_limit_expr()
+            )
+        ).values(
+            free_count_today=case(
+                (same_day, func.coalesce(User.free_count_today, 0) + increment),
+                else_=increment
+            ),
+            last_free_date=case((same_day, User.last_free_date), else_=datetime.utcnow())
+        ).returning(User.free_count_today, User.vip_type)
+        .execution_options(synchronize_session=False)
+    )).first()
+    await db.commit()
+
+    if row is not None:
+        free_count_today, vip_type = row
+        return free_count_today, vip_type != "super"
+
+    # 未更新：用户不存在或次数已用完（只在失败路径多一次查询）
+    user = (await db.execute(select(User.id, User.vip_type).where(User.user_id == user_id))).first()
+    if user is None:
+        raise ValueError("用户不存在，请重新登录")
+    raise QuotaExceeded(settings.normal_vip_daily_limit if user.vip_type == "normal" else settings.free_user_daily_limit)
+
+
+async def refund_slot(db: AsyncSession, user_id: str) -> Optional[int]:
+    """
+    退还本日预占的一次面试次数（面试启动失败时调用）
+
+    Returns:
+        退还后的今日次数；跨天或计数已为 0 时不退还，返回 None
+    """
+    today_start = _today_start()
+    row = (await db.execute(
+        update(User).where(
+            User.user_id == user_id,
+            and_(User.last_free_date >= today_start, User.last_free_date < today_start + timedelta(days=1)),
+            User.free_count_today > 0
+        ).values(free_count_today=User.free_count_today - 1)
+        .returning(User.free_count_today)
+        .execution_options(synchronize_session=False)
+    )).first()
+    await db.commit()
+    return row[0] if row is not None else None
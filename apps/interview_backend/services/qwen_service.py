@@ -1,19 +1,54 @@
 """通义千问 Qwen API 服务"""
 import os
-from typing import List, Dict, Optional
+import json
+import time
+import asyncio
+from typing import AsyncIterator, List, Dict, Optional
+import aiohttp
 import dashscope
 from dashscope import Generation
 
+from services.resilience import CircuitOpenError, ResiliencePolicy, UpstreamTimeoutError, is_non_retryable, upstream_error
+
+
+DEFAULT_API_URL = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
+
 
 class QwenService:
-    """通义千问服务封装"""
+    """通义千问服务封装
+
+    同时提供两套调用方式：
+    - chat / chat_stream：同步 SDK 调用（脚本、离线任务使用）
+    - achat：异步调用，基于共享的 aiohttp 连接池，供 async 路由使用，不阻塞事件循环
+    """
 
-    def __init__(self, api_key: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        api_url: str = DEFAULT_API_URL,
+        pool_size: int = 100,
+        keepalive_timeout: float = 60.0,
+        max_concurrency: int = 64,
+        request_timeout: float = 90.0,
+        routes: Optional[Dict[str, dict]] = None,
+        fallback_model: Optional[str] = None,
+        fallback_timeout: float = 30.0,
+        resilience: Optional[ResiliencePolicy] = None,
+    ):
         """
         初始化 Qwen 服务
 
         Args:
             api_key: DashScope API Key，如果不提供则从环境变量读取
+            api_url: 文本生成 HTTP 接口地址
+            pool_size: 异步连接池最大连接数
+            keepalive_timeout: 空闲连接保活时间（秒）
+            max_concurrency: 同时在途的异步请求上限
+            request_timeout: 单次异步请求总超时（秒）
+            routes: 按调用场景的模型路由 {task: {model, max_tokens, timeout}}
+            fallback_model: 主模型超出延迟预算时降级使用的模型
+            fallback_timeout: 降级模型的超时（秒）
+            resilience: 容错策略（截止时间、对冲请求、熔断），默认仅使用 request_timeout 作为截止时间
         """
         self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
         if self.api_key:
@@ -21,6 +56,125 @@ class QwenService:
         else:
             print("警告：未配置 DASHSCOPE_API_KEY")
 
+        self.api_url = api_url
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.routes = routes or {}
+        self.fallback_model = fallback_model
+        self.fallback_timeout = fallback_timeout
+        self.resilience = resilience or ResiliencePolicy("qwen", deadline=request_timeout)
+
+        # 异步客户端在首次使用时创建（必须在事件循环内创建）
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的 aiohttp 会话（懒加载，复用 keep-alive 连接）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+            )
+        return self._session
+
+    async def aclose(self):
+        """关闭异步连接池（应用退出时调用）"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @staticmethod
+    def _build_payload(
+        messages: List[Dict[str, str]],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+        **parameters,
+    ) -> dict:
+        """构建 DashScope 文本生成 HTTP 请求体"""
+        return {
+            "model": model,
+            "input": {"messages": messages},
+            "parameters": {
+                "result_format": "message",
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "top_p": top_p,
+                **parameters,
+            },
+        }
+
+    @staticmethod
+    def _format_error(status_code: int, data: dict) -> str:
+        """格式化 DashScope 错误信息（与同步 SDK 的错误格式保持一致）"""
+        error_msg = f"Qwen API 调用失败 - 状态码: {status_code}"
+        if data.get("code"):
+            error_msg += f", 错误码: {data['code']}"
+        if data.get("message"):
+            error_msg += f", 错误信息: {data['message']}"
+        return error_msg
+
+    async def _post_generation(self, payload: dict) -> str:
+        """发送一次文本生成请求（非流式）"""
+        async with self._semaphore:
+            async with self._get_session().post(self.api_url, json=payload) as resp:
+                data = await resp.json(content_type=None)
+                if resp.status != 200:
+                    error_msg = self._format_error(resp.status, data or {})
+                    print(error_msg)
+                    raise upstream_error(resp.status, error_msg)
+
+        return data["output"]["choices"][0]["message"]["content"]
+
+    async def achat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "qwen-max",
+        system: Optional[str] = None,
+        max_tokens: int = 2000,
+        temperature: float = 0.8,
+        top_p: float = 0.8,
+        hedge_after: Optional[float] = None,
+    ) -> str:
+        """
+        异步调用 Qwen 对话 API
+
+        参数与返回值同 chat()，区别在于等待模型生成期间不会阻塞事件循环。
+        请求经过容错策略：超过截止时间失败，超过 hedge_after 补发对冲请求，熔断期间直接失败。
+
+        Args:
+            hedge_after: 对冲阈值（秒），默认使用容错策略的配置
+        """
+        if system:
+            messages = [{"role": "system", "content": system}] + messages
+
+        payload = self._build_payload(messages, model, max_tokens, temperature, top_p)
+
+        try:
+            return await self.resilience.call(
+                lambda: self._post_generation(payload),
+                hedge_after=hedge_after,
+                latency_key=model,
+            )
+
+        except (asyncio.TimeoutError, UpstreamTimeoutError):
+            print(f"调用 Qwen API 超时（{self.request_timeout}s）")
+            raise Exception(f"调用 Qwen API 失败: 请求超时（{self.request_timeout}s）")
+        except Exception as e:
+            print(f"调用 Qwen API 出错: {str(e)}")
+            raise Exception(f"调用 Qwen API 失败: {str(e)}")
+
     def chat(
         self,
         messages: List[Dict[str, str]],
@@ -78,6 +232,168 @@ class QwenService:
             print(f"调用 Qwen API 出错: {str(e)}")
             raise Exception(f"调用 Qwen API 失败: {str(e)}")
 
+    async def achat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "qwen-max",
+        system: Optional[str] = None,
+        max_tokens: int = 2000,
+        temperature: float = 0.8,
+        top_p: float = 0.8,
+    ) -> AsyncIterator[str]:
+        """
+        异步调用 Qwen 流式对话 API（SSE + 增量输出）
+
+        Args:
+            参数同 chat() 方法
+
+        Yields:
+            流式生成的文本片段
+        """
+        if system:
+            messages = [{"role": "system", "content": system}] + messages
+
+        payload = self._build_payload(
+            messages, model, max_tokens, temperature, top_p,
+            incremental_output=True,  # 启用增量输出
+        )
+
+        # 流式输出无法整体重放，只接入熔断和延迟统计
+        start = time.monotonic()
+        finished = False
+        try:
+            self.resilience.check()
+            async with self._semaphore:
+                async with self._get_session().post(
+                    self.api_url,
+                    json=payload,
+                    headers={"X-DashScope-SSE": "enable"},
+                ) as resp:
+                    if resp.status != 200:
+                        data = await resp.json(content_type=None)
+                        error_msg = self._format_error(resp.status, data or {})
+                        print(error_msg)
+                        raise upstream_error(resp.status, error_msg)
+
+                    # SSE 按行解析，只关心 data: 行
+                    async for raw_line in resp.content:
+                        line = raw_line.decode("utf-8").strip()
+                        if not line.startswith("data:"):
+                            continue
+                        data = json.loads(line[5:])
+                        if "output" not in data:
+                            error_msg = self._format_error(resp.status, data)
+                            print(error_msg)
+                            raise Exception(error_msg)
+                        content = data["output"]["choices"][0]["message"]["content"]
+                        if content:
+                            yield content
+
+            finished = True
+            self.resilience.record_success(time.monotonic() - start, latency_key=f"{model}:stream")
+
+        except asyncio.TimeoutError:
+            self.resilience.record_failure(timeout=True)
+            finished = True
+            print(f"调用 Qwen 流式 API 超时（{self.request_timeout}s）")
+            raise Exception(f"调用 Qwen 流式 API 失败: 请求超时（{self.request_timeout}s）")
+        except CircuitOpenError as e:
+            finished = True
+            print(f"调用 Qwen 流式 API 出错: {str(e)}")
+            raise Exception(f"调用 Qwen 流式 API 失败: {str(e)}")
+        except Exception as e:
+            if is_non_retryable(e):
+                self.resilience.record_rejected()
+            else:
+                self.resilience.record_failure()
+            finished = True
+            print(f"调用 Qwen 流式 API 出错: {str(e)}")
+            raise Exception(f"调用 Qwen 流式 API 失败: {str(e)}")
+        finally:
+            if not finished:
+                # 调用方提前结束消费（如切换到降级模型），既不算成功也不算失败
+                self.resilience.breaker.release()
+
+    def _get_route(self, task: str) -> dict:
+        """获取调用场景的模型路由，未配置的场景使用默认参数"""
+        return self.routes.get(task, {"model": "qwen-max", "max_tokens": 2000, "timeout": self.request_timeout, "hedge_after": 0.0})
+
+    def _can_fallback(self, route: dict) -> bool:
+        return bool(self.fallback_model) and self.fallback_model != route["model"]
+
+    async def achat_task(
+        self,
+        task: str,
+        messages: List[Dict[str, str]],
+        system: Optional[str] = None,
+        temperature: float = 0.8,
+    ) -> str:
+        """
+        按调用场景路由的异步对话
+
+        使用场景配置的模型和 max_tokens；主模型超过延迟预算时放弃本次请求，改用降级模型重试。
+
+        Args:
+            task: 调用场景（plan / first_question / turn / report）
+            其余参数同 chat()
+        """
+        route = self._get_route(task)
+        kwargs = dict(
+            messages=messages, system=system, max_tokens=route["max_tokens"],
+            temperature=temperature, hedge_after=route.get("hedge_after"),
+        )
+
+        try:
+            return await asyncio.wait_for(self.achat(model=route["model"], **kwargs), timeout=route["timeout"])
+        except asyncio.TimeoutError:
+            if not self._can_fallback(route):
+                raise Exception(f"调用 Qwen API 失败: {route['model']} 超过延迟预算（{route['timeout']}s）")
+
+        print(f"[模型路由] {task}: {route['model']} 超过延迟预算 {route['timeout']}s，降级到 {self.fallback_model}")
+        try:
+            return await asyncio.wait_for(self.achat(model=self.fallback_model, **kwargs), timeout=self.fallback_timeout)
+        except asyncio.TimeoutError:
+            raise Exception(f"调用 Qwen API 失败: 降级模型 {self.fallback_model} 超时（{self.fallback_timeout}s）")
+
+    async def achat_stream_task(
+        self,
+        task: str,
+        messages: List[Dict[str, str]],
+        system: Optional[str] = None,
+        temperature: float = 0.8,
+    ) -> AsyncIterator[str]:
+        """
+        按调用场景路由的异步流式对话
+
+        延迟预算按首个分片计时：主模型迟迟没有输出时切换到降级模型。
+        """
+        route = self._get_route(task)
+        kwargs = dict(messages=messages, system=system, max_tokens=route["max_tokens"], temperature=temperature)
+
+        stream = self.achat_stream(model=route["model"], **kwargs)
+        try:
+            first = await asyncio.wait_for(stream.__anext__(), timeout=route["timeout"])
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            await stream.aclose()
+            if not self._can_fallback(route):
+                raise Exception(f"调用 Qwen 流式 API 失败: {route['model']} 首个分片超过延迟预算（{route['timeout']}s）")
+
+            print(f"[模型路由] {task}: {route['model']} 首个分片超过 {route['timeout']}s，降级到 {self.fallback_model}")
+            stream = self.achat_stream(model=self.fallback_model, **kwargs)
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), timeout=self.fallback_timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                await stream.aclose()
+                raise Exception(f"调用 Qwen 流式 API 失败: 降级模型 {self.fallback_model} 超时（{self.fallback_timeout}s）")
+
+        yield first
+        async for chunk in stream:
+            yield chunk
+
     def chat_stream(
         self,
         messages: List[Dict[str, str]],
@@ -0,0 +1,243 @@
+"""面试报告后台生成队列
+
+面试结束时把会话放入队列，由后台 worker 调用大模型生成报告，
+最后一次回答可以立即返回，客户端请求报告时通常已经生成完毕。
+
+状态保存在 InterviewSession.report_status（pending / ready / failed），多个 uvicorn worker 之间共享。
+进程重启或崩溃会丢失队列中的任务：应用启动时重新提交 pending 的报告，查询报告时 pending 超过
+report_pending_timeout 且本进程没有对应任务的也会重新提交（条件更新 report_requested_at 认领，只有一个进程提交）。
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import SessionLocal, InterviewSession
+
+
+class ReportPending(Exception):
+    """报告正在其他进程中生成（等待生成锁超时），本次不重复生成"""
+
+    def __init__(self, session_id: str):
+        super().__init__(f"报告仍在生成中，请稍后查询: {session_id}")
+        self.session_id = session_id
+
+
+class ReportQueue:
+    """报告生成队列（进程内 asyncio worker 池）"""
+
+    def __init__(self, generate: Callable[[str], Awaitable], workers: int = 2, maxsize: int = 1000):
+        """
+        Args:
+            generate: 报告生成函数 generate(session_id)，自行使用短会话读写数据库（调用大模型期间不占用连接），
+                成功时负责把状态置为 ready
+            workers: 并发生成报告的 worker 数量
+            maxsize: 队列最大长度
+        """
+        self._generate = generate
+        self._workers = workers
+        self._maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Dict[str, asyncio.Future] = {}
+        self._started_at: Optional[datetime] = None
+        self._stats = {"enqueued": 0, "succeeded": 0, "failed": 0, "resubmitted": 0}
+
+    async def start(self):
+        """启动 worker（应用启动时调用）"""
+        self._queue = asyncio.Queue(maxsize=self._maxsize)
+        self._started_at = datetime.utcnow()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self._workers)]
+        print(f"[报告队列] 已启动 {self._workers} 个 worker")
+
+    async def stop(self):
+        """停止 worker（应用关闭时调用），未完成的任务保持 pending，下次启动时重新提交"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # 还在队列中的任务不会再执行，通知等待者
+        for job in self._jobs.values():
+            if not job.done():
+                job.set_result("cancelled")
+        self._jobs.clear()
+
+    def has_job(self, session_id: str) -> bool:
+        """本进程是否有该会话的报告任务（排队中或生成中）"""
+        return session_id in self._jobs
+
+    def is_lost(self, session_id: str, requested_at: Optional[datetime], timeout: float) -> bool:
+        """pending 的报告任务是否已丢失：本进程没有该任务，且提交时间超过 timeout（秒）"""
+        if self.has_job(session_id):
+            return False
+        return requested_at is None or datetime.utcnow() - requested_at > timedelta(seconds=timeout)
+
+    async def resubmit(self, session_id: str, requested_at: Optional[datetime]) -> bool:
+        """
+        重新提交 pending 的报告任务
+
+        先用条件更新认领（report_requested_at 仍是读到的值才更新为当前时间），多个进程同时发现时只有一个提交。
+
+        Args:
+            requested_at: 读到的 report_requested_at
+
+        Returns:
+            是否由本进程重新提交
+        """
+        if self.has_job(session_id):
+            return True
+
+        condition = (
+            InterviewSession.report_requested_at.is_(None) if requested_at is None
+            else InterviewSession.report_requested_at == requested_at
+        )
+        async with SessionLocal() as db:
+            result = await db.execute(
+                update(InterviewSession).where(
+                    InterviewSession.session_id == session_id,
+                    InterviewSession.report_status == "pending",
+                    condition
+                ).values(report_requested_at=datetime.utcnow())
+            )
+            await db.commit()
+        if result.rowcount != 1:
+            # 其他进程已重新提交，或报告已生成完毕
+            return False
+
+        print(f"[报告队列] {session_id} 的任务已丢失，重新提交")
+        if not self.enqueue(session_id):
+            return False
+        self._stats["resubmitted"] += 1
+        return True
+
+    async def recover(self) -> int:
+        """
+        重新提交 pending 的报告（应用启动时调用，在 start 之后）
+
+        只认领本进程启动前提交的任务：同时启动的其他进程刚认领（重新提交）的任务不会再次提交。
+
+        Returns:
+            重新提交的任务数
+        """
+        async with SessionLocal() as db:
+            rows = (await db.execute(
+                select(InterviewSession.session_id, InterviewSession.report_requested_at).where(
+                    InterviewSession.report_status == "pending",
+                    or_(
+                        InterviewSession.report_requested_at.is_(None),
+                        InterviewSession.report_requested_at < self._started_at
+                    )
+                ).order_by(InterviewSession.report_requested_at).limit(self._maxsize)
+            )).all()
+
+        recovered = 0
+        for session_id, requested_at in rows:
+            if await self.resubmit(session_id, requested_at):
+                recovered += 1
+        if rows:
+            print(f"[报告队列] 启动时发现 {len(rows)} 个 pending 报告，重新提交 {recovered} 个")
+        return recovered
+
+    def enqueue(self, session_id: str) -> bool:
+        """
+        提交报告生成任务（调用前会话的 report_status 应已提交为 pending）
+
+        Returns:
+            是否成功入队；队列未启动或已满时返回 False，报告将在客户端请求时按需生成
+        """
+        if self._queue is None or not self._tasks:
+            print(f"[报告队列] 队列未启动，{session_id} 的报告将按需生成")
+            return False
+        if session_id in self._jobs:
+            return True
+        try:
+            self._queue.put_nowait(session_id)
+        except asyncio.QueueFull:
+            print(f"[报告队列] 队列已满，{session_id} 的报告将按需生成")
+            return False
+
+        self._jobs[session_id] = asyncio.get_running_loop().create_future()
+        self._stats["enqueued"] += 1
+        print(f"[报告队列] 已提交: {session_id}")
+        return True
+
+    async def wait(self, session_id: str, db: AsyncSession, timeout: float) -> Optional[str]:
+        """
+        等待 pending 状态的报告生成结束
+
+        本进程内的任务直接等待结果；其他 worker 提交的任务轮询数据库状态。
+        等待前和每次轮询后都会结束 db 的事务，等待期间不占用连接。
+
+        Returns:
+            结束时的状态（ready / failed / cancelled，其他进程仍在生成时为 pending），超时返回 None
+        """
+        await db.commit()
+        job = self._jobs.get(session_id)
+        if job is not None:
+            try:
+                return await asyncio.wait_for(asyncio.shield(job), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        deadline = asyncio.get_running_loop().time() + timeout
+        while asyncio.get_running_loop().time() < deadline:
+            status = await db.scalar(
+                select(InterviewSession.report_status).where(InterviewSession.session_id == session_id)
+            )
+            await db.commit()
+            if status != "pending":
+                return status
+            await asyncio.sleep(1)
+        return None
+
+    async def _worker(self, index: int):
+        while True:
+            session_id = await self._queue.get()
+            started = datetime.utcnow()
+            # 生成过程中 worker 被取消（应用关闭）时，等待者收到 cancelled
+            status = "cancelled"
+            try:
+                try:
+                    await self._generate(session_id)
+                    status = "ready"
+                    self._stats["succeeded"] += 1
+                    print(f"[报告队列] worker-{index} 生成完成: {session_id}，耗时 {(datetime.utcnow() - started).total_seconds():.1f}s")
+                except ReportPending:
+                    # 其他进程持有生成锁，由其写入报告和状态，这里不标记失败
+                    status = "pending"
+                    print(f"[报告队列] worker-{index} {session_id} 正在其他进程中生成，跳过")
+                except Exception as e:
+                    status = "failed"
+                    self._stats["failed"] += 1
+                    print(f"[报告队列] worker-{index} 生成失败: {session_id}, {e}")
+                    await self._mark_failed(session_id, str(e))
+            finally:
+                job = self._jobs.pop(session_id, None)
+                if job is not None and not job.done():
+                    job.set_result(status)
+                self._queue.task_done()
+
+    @staticmethod
+    async def _mark_failed(session_id: str, error: str):
+        async with SessionLocal() as db:
+            try:
+                await db.execute(
+                    update(InterviewSession).where(
+                        InterviewSession.session_id == session_id
+                    ).values(report_status="failed", report_error=error[:500])
+                )
+                await db.commit()
+            except Exception as e:
+                print(f"[报告队列] 记录失败状态出错: {e}")
+                await db.rollback()
+
+    def get_stats(self) -> Dict:
+        """获取队列统计信息"""
+        return {
+            **self._stats,
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "in_progress": len(self._jobs),
+        }
@@ -0,0 +1,401 @@
+"""上游调用容错层 - 截止时间、对冲请求、熔断器
+
+为 DashScope 的各类调用（Qwen 对话、文本向量化、语音识别）提供统一的保护：
+1. 截止时间：超过 deadline 直接失败，不再无限占用 worker 和数据库会话
+2. 对冲请求：请求超过 hedge_after（约为该上游的 p95 延迟）仍未返回时，补发一个相同请求，先返回者胜出；
+   首个请求快速失败时，对冲请求即作为一次重试
+3. 熔断器：连续失败达到阈值后熔断，熔断期间直接抛出 CircuitOpenError，调用方走已有的降级逻辑
+
+上游明确拒绝的请求（4xx，如参数错误、鉴权失败；408/429 除外）重试没有意义，也不说明上游不可用：
+不对冲、不重试，直接抛出，也不计入熔断。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait as wait_futures
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import settings
+
+
+class CircuitOpenError(Exception):
+    """熔断器已打开，调用被快速拒绝"""
+
+
+class UpstreamTimeoutError(Exception):
+    """上游调用超过截止时间"""
+
+
+class NonRetryableError(Exception):
+    """上游拒绝了请求（4xx），重试不会成功"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# 可以重试的 4xx：请求超时、限流
+RETRYABLE_CLIENT_STATUS = (408, 429)
+
+
+def upstream_error(status_code: int, message: str) -> Exception:
+    """按状态码构造上游错误：不可重试的 4xx 返回 NonRetryableError，其余返回普通 Exception"""
+    if 400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_STATUS:
+        return NonRetryableError(message, status_code)
+    return Exception(message)
+
+
+def is_non_retryable(error: Optional[BaseException]) -> bool:
+    """是否为不可重试的错误（NonRetryableError，或带 4xx status_code 的 SDK 异常）"""
+    if isinstance(error, NonRetryableError):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_STATUS
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    状态流转：closed --(连续失败达到阈值)--> open --(恢复时间到)--> half_open
+    half_open 只放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """是否允许发起调用"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"[熔断] 连续失败 {self.consecutive_failures} 次，熔断 {self.recovery_timeout}s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release(self):
+        """调用被取消（既非成功也非失败）时释放探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout": self.recovery_timeout,
+            }
+            if self.state == "open":
+                stats["retry_in"] = round(max(self.recovery_timeout - (time.monotonic() - self.opened_at), 0), 2)
+            return stats
+
+
+class ResiliencePolicy:
+    """
+    单个上游的容错策略
+
+    异步调用使用 call()，同步 SDK 调用使用 call_sync()（在专用线程池中执行）；
+    流式调用无法整体重放，使用 check() + record_success()/record_failure() 只接入熔断和统计。
+    """
+
+    # 每个延迟统计键保留的样本数
+    LATENCY_WINDOW = 200
+
+    def __init__(
+        self,
+        name: str,
+        deadline: float,
+        hedge_after: float = 0.0,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        max_workers: int = 16,
+    ):
+        """
+        Args:
+            name: 上游名称（用于日志和统计）
+            deadline: 默认截止时间（秒）
+            hedge_after: 默认对冲阈值（秒），0 表示不对冲
+            failure_threshold: 熔断阈值（连续失败次数）
+            recovery_timeout: 熔断持续时间（秒）
+            max_workers: 同步调用线程池大小
+        """
+        self.name = name
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(failure_threshold, recovery_timeout)
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._latencies: Dict[str, deque] = {}
+        self._stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "short_circuited": 0,
+            "rejected": 0,
+        }
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix=f"{self.name}-call")
+        return self._executor
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+
+    def check(self):
+        """调用前检查熔断器，已熔断时抛出 CircuitOpenError"""
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(f"{self.name} 已熔断，暂停调用")
+
+    def record_success(self, elapsed: float, latency_key: Optional[str] = None):
+        self.breaker.record_success()
+        with self._lock:
+            self._stats["successes"] += 1
+            window = self._latencies.setdefault(latency_key or self.name, deque(maxlen=self.LATENCY_WINDOW))
+            window.append(elapsed)
+
+    def record_failure(self, timeout: bool = False):
+        self.breaker.record_failure()
+        self._count("failures")
+        if timeout:
+            self._count("timeouts")
+
+    def record_rejected(self):
+        """上游拒绝了请求（4xx）：不计入熔断，只释放可能占用的探测名额"""
+        self.breaker.release()
+        self._count("rejected")
+
+    def _plan_attempt(self, elapsed: float, remaining: float, hedge_after: float, in_flight: int, hedged: bool):
+        """决定下一步：返回 (本轮等待时长, 是否立即发出对冲请求)"""
+        if hedged or hedge_after <= 0:
+            return remaining, False
+        if in_flight == 0:
+            # 首个请求已失败，对冲请求作为一次重试
+            return remaining, True
+        if elapsed >= hedge_after:
+            return remaining, True
+        return min(remaining, hedge_after - elapsed), False
+
+    def _log_hedge(self, elapsed: float, in_flight: int):
+        if in_flight:
+            print(f"[容错] {self.name} 请求 {elapsed:.2f}s 未返回，发出对冲请求")
+        else:
+            print(f"[容错] {self.name} 请求失败，重试一次")
+
+    async def call(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        deadline: Optional[float] = None,
+        hedge_after: Optional[float] = None,
+        latency_key: Optional[str] = None,
+    ) -> Any:
+        """
+        受保护的异步调用
+
+        Args:
+            factory: 每次调用都返回一个新协程的工厂函数（对冲时会调用两次）
+            deadline: 截止时间（秒），默认使用策略配置
+            hedge_after: 对冲阈值（秒），默认使用策略配置
+            latency_key: 延迟统计键（如模型名），默认使用上游名称
+        """
+        self.check()
+        deadline = deadline or self.deadline
+        hedge_after = self.hedge_after if hedge_after is None else hedge_after
+
+        start = time.monotonic()
+        tasks: List[asyncio.Task] = [asyncio.ensure_future(factory())]
+        hedge_task: Optional[asyncio.Task] = None
+        last_error: Optional[BaseException] = None
+
+        try:
+            while True:
+                elapsed = time.monotonic() - start
+                remaining = deadline - elapsed
+                if remaining <= 0:
+                    break
+
+                wait_time, launch_hedge = self._plan_attempt(elapsed, remaining, hedge_after, len(tasks), hedge_task is not None)
+                if launch_hedge:
+                    self._log_hedge(elapsed, in_flight=len(tasks))
+                    hedge_task = asyncio.ensure_future(factory())
+                    tasks.append(hedge_task)
+                    self._count("hedged")
+                    continue
+                if not tasks:
+                    break
+
+                done, _ = await asyncio.wait(tasks, timeout=wait_time, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.remove(task)
+                    if is_non_retryable(task.exception()):
+                        self.record_rejected()
+                        raise task.exception()
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self._count("hedge_wins")
+                        self.record_success(time.monotonic() - start, latency_key)
+                        return task.result()
+                    last_error = task.exception()
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if tasks or last_error is None:
+            self.record_failure(timeout=True)
+            raise UpstreamTimeoutError(f"{self.name} 调用超过截止时间（{deadline}s）")
+        self.record_failure()
+        raise last_error
+
+    def call_sync(
+        self,
+        func: Callable[[], Any],
+        deadline: Optional[float] = None,
+        hedge_after: Optional[float] = None,
+        latency_key: Optional[str] = None,
+    ) -> Any:
+        """
+        受保护的同步调用（在线程池中执行阻塞的 SDK 调用）
+
+        参数同 call()，func 为普通函数。超时的调用会在后台线程中自然结束，结果被丢弃。
+        """
+        self.check()
+        deadline = deadline or self.deadline
+        hedge_after = self.hedge_after if hedge_after is None else hedge_after
+        executor = self._get_executor()
+
+        start = time.monotonic()
+        futures: List[Future] = [executor.submit(func)]
+        hedge_future: Optional[Future] = None
+        last_error: Optional[BaseException] = None
+
+        try:
+            while True:
+                elapsed = time.monotonic() - start
+                remaining = deadline - elapsed
+                if remaining <= 0:
+                    break
+
+                wait_time, launch_hedge = self._plan_attempt(elapsed, remaining, hedge_after, len(futures), hedge_future is not None)
+                if launch_hedge:
+                    self._log_hedge(elapsed, in_flight=len(futures))
+                    hedge_future = executor.submit(func)
+                    futures.append(hedge_future)
+                    self._count("hedged")
+                    continue
+                if not futures:
+                    break
+
+                done, _ = wait_futures(futures, timeout=wait_time, return_when=FIRST_COMPLETED)
+                for future in done:
+                    futures.remove(future)
+                    if is_non_retryable(future.exception()):
+                        self.record_rejected()
+                        raise future.exception()
+                    if future.exception() is None:
+                        if future is hedge_future:
+                            self._count("hedge_wins")
+                        self.record_success(time.monotonic() - start, latency_key)
+                        return future.result()
+                    last_error = future.exception()
+        finally:
+            for future in futures:
+                future.cancel()
+
+        if futures or last_error is None:
+            self.record_failure(timeout=True)
+            raise UpstreamTimeoutError(f"{self.name} 调用超过截止时间（{deadline}s）")
+        self.record_failure()
+        raise last_error
+
+    @staticmethod
+    def _quantile(samples: List[float], q: float) -> float:
+        ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+    def get_stats(self) -> Dict:
+        """获取策略配置、熔断状态和延迟分布"""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = {key: list(window) for key, window in self._latencies.items()}
+
+        stats["deadline"] = self.deadline
+        stats["hedge_after"] = self.hedge_after
+        stats["breaker"] = self.breaker.get_stats()
+        stats["latency"] = {
+            key: {
+                "samples": len(samples),
+                "p50": round(self._quantile(samples, 0.5), 3),
+                "p95": round(self._quantile(samples, 0.95), 3),
+                "p99": round(self._quantile(samples, 0.99), 3),
+            }
+            for key, samples in latencies.items() if samples
+        }
+        return stats
+
+
+# 各上游的容错策略（全局单例）
+resilience_policies: Dict[str, ResiliencePolicy] = {
+    "qwen": ResiliencePolicy(
+        "qwen",
+        deadline=settings.qwen_request_timeout,
+        failure_threshold=settings.breaker_failure_threshold,
+        recovery_timeout=settings.breaker_recovery_timeout,
+    ),
+    "embedding": ResiliencePolicy(
+        "embedding",
+        deadline=settings.embedding_deadline,
+        hedge_after=settings.embedding_hedge_after,
+        failure_threshold=settings.breaker_failure_threshold,
+        recovery_timeout=settings.breaker_recovery_timeout,
+    ),
+    "asr": ResiliencePolicy(
+        "asr",
+        deadline=settings.asr_deadline,
+        hedge_after=settings.asr_hedge_after,
+        failure_threshold=settings.breaker_failure_threshold,
+        recovery_timeout=settings.breaker_recovery_timeout,
+    ),
+}
+
+
+def get_resilience_stats() -> Dict:
+    """获取所有上游的容错统计"""
+    return {name: policy.get_stats() for name, policy in resilience_policies.items()}
@@ -0,0 +1,426 @@
+"""进行中面试的会话状态缓存
+
+每轮回答不再重新查询 InterviewSession、反序列化面试计划和对话记录：
+会话状态常驻进程内存，回答处理期间不占用数据库连接。修改由后台任务每 session_flush_interval 秒写回增量
+（write-behind），面试结束时立即写回；进程崩溃最多丢失这段时间内的修改。
+
+多 worker 部署：
+- 缓存会话的进程持有会话行上的所有权租约（turn_lock_owner / turn_lock_until），持有期间其他进程不会修改该会话，
+  本进程处理回答不需要任何数据库往返；续期与增量写回合并在同一条 UPDATE 中
+- 会话闲置 handoff_idle 秒后写回并释放所有权，其他进程才能接手；获取所有权的 UPDATE 同时返回会话版本，
+  版本未变化时继续使用缓存的状态，否则重新加载
+- 有会话亲和路由（如 Nginx hash）时可调大 handoff_idle，同一会话的回答始终命中持有所有权的进程
+
+写回遇到冲突或数据错误（IntegrityError / DataError）时重试不会成功：丢弃缓存的状态，
+下次访问从数据库重新加载，错误抛给调用方。
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import DataError, IntegrityError
+
+from database.db import SessionLocal, InterviewSession, SESSION_STATE_COLUMNS
+from services import transcript_store
+
+
+# 重试不会成功的写回错误：对话序号冲突（其他进程已写入）、数据超出列定义等
+PERMANENT_FLUSH_ERRORS = (IntegrityError, DataError)
+
+
+class OwnershipLost(ValueError):
+    """写回时本进程的所有权已失效（租约过期后被其他进程接手）"""
+
+
+class SessionState:
+    """
+    进行中面试的内存状态（属性名与 InterviewSession 一致，面试服务可直接替换使用）
+
+    对 PERSISTED_FIELDS 中字段的赋值会被记录，写回时只更新这些列。
+    """
+
+    # 可修改并需要写回的字段
+    PERSISTED_FIELDS = (
+        "interview_plan", "transcript_summary", "summary_upto", "current_question",
+        "question_count", "is_finished", "finished_at", "report_status", "report_error",
+        "report_requested_at",
+    )
+    # 只读字段
+    READONLY_FIELDS = ("session_id", "user_id", "position", "round", "resume")
+
+    def __init__(self, session: InterviewSession, transcript: transcript_store.Transcript):
+        object.__setattr__(self, "dirty", set())
+        for field in self.READONLY_FIELDS + self.PERSISTED_FIELDS:
+            object.__setattr__(self, field, getattr(session, field))
+        object.__setattr__(self, "transcript", transcript)
+        # 数据库中已确认的版本（question_count），用于跨进程校验
+        object.__setattr__(self, "persisted_version", session.question_count)
+        object.__setattr__(self, "last_access", time.monotonic())
+        # 本进程持有会话所有权的截止时间（time.monotonic()），0 表示未持有
+        object.__setattr__(self, "lease_deadline", 0.0)
+        # 同一会话的写回和所有权变更串行执行（后台写回与面试结束时的立即写回可能同时发生）
+        object.__setattr__(self, "persist_lock", asyncio.Lock())
+
+    def __setattr__(self, name, value):
+        if name in self.PERSISTED_FIELDS:
+            self.dirty.add(name)
+        object.__setattr__(self, name, value)
+
+    @property
+    def owned(self) -> bool:
+        """本进程是否仍持有会话所有权"""
+        return self.lease_deadline > time.monotonic()
+
+    @property
+    def has_changes(self) -> bool:
+        """是否有尚未写回的修改"""
+        return bool(self.dirty) or self.transcript.persisted < self.transcript.sealed
+
+
+class SessionCache:
+    """进行中面试的会话状态缓存"""
+
+    def __init__(
+        self,
+        flush_interval: float = 1.0,
+        lease_ttl: float = 120.0,
+        handoff_idle: float = 10.0,
+        claim_timeout: float = 60.0,
+        idle_ttl: float = 1800.0,
+        max_entries: int = 2000,
+        poll_interval: float = 0.2,
+    ):
+        """
+        Args:
+            flush_interval: 写回间隔（秒）
+            lease_ttl: 所有权租约有效期（秒），由后台写回续期，持有者崩溃后自动失效
+            handoff_idle: 会话闲置多久后释放所有权（秒），其他进程此后才能接手
+            claim_timeout: 等待其他进程释放所有权的最长时间（秒）
+            idle_ttl: 会话闲置多久后移出缓存（秒）
+            max_entries: 最多缓存的会话数
+            poll_interval: 等待所有权时的轮询间隔（秒）
+        """
+        self.flush_interval = flush_interval
+        self.lease_ttl = lease_ttl
+        self.handoff_idle = handoff_idle
+        self.claim_timeout = claim_timeout
+        self.idle_ttl = idle_ttl
+        self.max_entries = max_entries
+        self.poll_interval = poll_interval
+        # 本进程的所有权标识
+        self.owner = uuid.uuid4().hex
+        self._states: "OrderedDict[str, SessionState]" = OrderedDict()
+        # 正在处理回答的会话 {session_id: 计数}，处理期间不释放所有权、不移出缓存
+        self._busy: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "hits": 0, "misses": 0, "claims": 0, "stale_reloads": 0, "handoffs": 0,
+            "flushes": 0, "flush_errors": 0, "dropped": 0,
+        }
+
+    async def start(self):
+        """启动后台写回任务（应用启动时调用）"""
+        self._task = asyncio.create_task(self._flush_loop())
+        print(f"[会话缓存] 已启动，写回间隔 {self.flush_interval}s，闲置 {self.handoff_idle}s 后释放所有权")
+
+    async def stop(self):
+        """停止后台任务，写回所有修改并释放所有权（应用关闭时调用）"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush_all(release_all=True)
+
+    @asynccontextmanager
+    async def hold(self, session_id: str):
+        """处理一轮回答期间持有会话：后台任务不会释放其所有权或把它移出缓存"""
+        self._busy[session_id] = self._busy.get(session_id, 0) + 1
+        try:
+            yield
+        finally:
+            self._busy[session_id] -= 1
+            if self._busy[session_id] == 0:
+                del self._busy[session_id]
+            state = self._states.get(session_id)
+            if state is not None:
+                state.last_access = time.monotonic()
+
+    async def get_active(self, session_id: str) -> SessionState:
+        """
+        获取进行中的会话状态，本进程未持有所有权时先获取（其他进程持有时等待其释放）
+
+        Raises:
+            ValueError: 会话不存在、已结束，或等待其他进程释放所有权超时
+        """
+        state = self._states.get(session_id)
+        if state is not None and state.owned:
+            self._stats["hits"] += 1
+        else:
+            state = await self._acquire(session_id, state)
+
+        if session_id in self._states:
+            self._states.move_to_end(session_id)
+        state.last_access = time.monotonic()
+
+        if state.is_finished:
+            raise ValueError("面试已结束")
+        return state
+
+    async def _acquire(self, session_id: str, cached: Optional[SessionState]) -> SessionState:
+        """获取所有权；缓存的状态与数据库版本一致时继续使用，否则重新加载"""
+        started = time.monotonic()
+        if cached is not None:
+            # 与后台释放所有权的写回串行，避免先获取、后被释放
+            async with cached.persist_lock:
+                version = await self._claim(session_id)
+        else:
+            version = await self._claim(session_id)
+        self._stats["claims"] += 1
+
+        state = cached
+        if state is not None and (self._states.get(session_id) is not state or state.persisted_version != version):
+            self._stats["stale_reloads"] += 1
+            print(f"[会话缓存] {session_id} 已被其他进程更新，重新加载")
+            self._drop(state)
+            state = None
+
+        if state is None:
+            self._stats["misses"] += 1
+            state = await self._load(session_id)
+            # 加载期间其他请求可能已放入缓存，以先放入的为准
+            state = self._states.setdefault(session_id, state)
+            await self._evict_overflow()
+
+        object.__setattr__(state, "lease_deadline", started + self.lease_ttl)
+        return state
+
+    async def _claim(self, session_id: str) -> Optional[int]:
+        """
+        获取会话所有权（一条条件 UPDATE，同时返回数据库中的版本 question_count）
+
+        Raises:
+            ValueError: 会话不存在、已结束，或等待超时
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.claim_timeout
+        while True:
+            claimed, version = await self._try_claim(session_id)
+            if claimed:
+                return version
+            if loop.time() >= deadline:
+                print(f"[会话缓存] 等待 {session_id} 的所有权超时（{self.claim_timeout}s）")
+                raise ValueError("上一个回答仍在处理中，请稍后重试")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _try_claim(self, session_id: str) -> Tuple[bool, Optional[int]]:
+        now = datetime.utcnow()
+        async with SessionLocal() as db:
+            row = (await db.execute(
+                update(InterviewSession).where(
+                    InterviewSession.session_id == session_id,
+                    or_(InterviewSession.is_finished.is_(None), InterviewSession.is_finished.is_(False)),
+                    or_(
+                        InterviewSession.turn_lock_owner.is_(None),
+                        InterviewSession.turn_lock_owner == self.owner,
+                        InterviewSession.turn_lock_until < now
+                    )
+                ).values(
+                    turn_lock_owner=self.owner, turn_lock_until=now + timedelta(seconds=self.lease_ttl)
+                ).returning(InterviewSession.question_count)
+            )).first()
+            await db.commit()
+            if row is not None:
+                return True, row.question_count
+
+            # 未获取到：区分会话不存在、已结束和其他进程持有
+            is_finished = (await db.execute(
+                select(InterviewSession.is_finished).where(InterviewSession.session_id == session_id)
+            )).first()
+        if is_finished is None:
+            raise ValueError("会话不存在")
+        if is_finished[0]:
+            raise ValueError("面试已结束")
+        return False, None
+
+    async def _load(self, session_id: str) -> SessionState:
+        async with SessionLocal() as db:
+            session = await db.scalar(
+                select(InterviewSession).options(SESSION_STATE_COLUMNS).where(InterviewSession.session_id == session_id)
+            )
+
+            if not session:
+                raise ValueError("会话不存在")
+
+            transcript = await transcript_store.load_transcript(db, session_id)
+            return SessionState(session, transcript)
+
+    async def persist(self, state: SessionState, release: bool = False):
+        """
+        写回会话的增量修改（新增对话 + 修改过的列），同一条 UPDATE 续期或释放本进程的所有权
+
+        没有修改且租约不需要续期时不访问数据库。
+
+        Args:
+            release: 写回后释放所有权
+
+        Raises:
+            OwnershipLost: 所有权已失效（租约过期后被其他进程接手），缓存的状态已丢弃
+            IntegrityError / DataError: 重试不会成功的错误，缓存的状态已丢弃
+            其他数据库异常: 修改保留，稍后重试
+        """
+        held = state.lease_deadline > 0
+        if release:
+            # 先在本地标记为未持有（不等待数据库）：之后到达的请求会等本次写回完成再重新获取所有权
+            object.__setattr__(state, "lease_deadline", 0.0)
+
+        async with state.persist_lock:
+            renew = held and not release and state.lease_deadline - time.monotonic() < self.lease_ttl / 2
+            if not state.has_changes and not renew and not (release and held):
+                return
+
+            transcript = state.transcript
+            persisted_before = transcript.persisted
+            # 写回前取快照并清空 dirty：等待数据库期间新的修改会重新记入 dirty
+            fields = set(state.dirty)
+            values = {field: getattr(state, field) for field in fields}
+            version = state.question_count
+            state.dirty.clear()
+            started = time.monotonic()
+            if release:
+                values.update(turn_lock_owner=None, turn_lock_until=None)
+            else:
+                values["turn_lock_until"] = datetime.utcnow() + timedelta(seconds=self.lease_ttl)
+            try:
+                async with SessionLocal() as db:
+                    transcript.flush(db)
+                    result = await db.execute(
+                        update(InterviewSession).where(
+                            InterviewSession.session_id == state.session_id,
+                            InterviewSession.turn_lock_owner == self.owner
+                        ).values(**values)
+                    )
+                    if result.rowcount != 1:
+                        await db.rollback()
+                        raise OwnershipLost("会话已被其他进程接管")
+                    await db.commit()
+            except OwnershipLost:
+                self._stats["flush_errors"] += 1
+                self._drop(state)
+                print(f"[会话缓存] 写回 {state.session_id} 失败（所有权已失效），已丢弃缓存的状态")
+                raise
+            except PERMANENT_FLUSH_ERRORS as e:
+                # 保留修改只会每次重试都失败：丢弃缓存的状态，下次访问从数据库重新加载
+                self._stats["flush_errors"] += 1
+                self._drop(state)
+                print(f"[会话缓存] 写回 {state.session_id} 失败（无法重试），已丢弃缓存的状态: {e}")
+                await self._release(state.session_id)
+                raise
+            except Exception:
+                transcript.persisted = persisted_before
+                state.dirty.update(fields)
+                if release and held:
+                    # 释放失败：仍由本进程持有，下次写回时再释放
+                    object.__setattr__(state, "lease_deadline", started + self.lease_ttl)
+                self._stats["flush_errors"] += 1
+                raise
+
+            object.__setattr__(state, "persisted_version", version)
+            if release:
+                self._stats["handoffs"] += 1
+            else:
+                object.__setattr__(state, "lease_deadline", started + self.lease_ttl)
+            self._stats["flushes"] += 1
+
+    async def _release(self, session_id: str):
+        """尽力释放所有权（丢弃状态后调用），失败时租约在 lease_ttl 后自动失效"""
+        try:
+            async with SessionLocal() as db:
+                await db.execute(
+                    update(InterviewSession).where(
+                        InterviewSession.session_id == session_id,
+                        InterviewSession.turn_lock_owner == self.owner
+                    ).values(turn_lock_owner=None, turn_lock_until=None)
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"[会话缓存] 释放 {session_id} 的所有权失败: {e}")
+
+    def _drop(self, state: SessionState):
+        """把会话状态移出缓存（只移出同一个对象，不影响已重新加载的状态）"""
+        object.__setattr__(state, "lease_deadline", 0.0)
+        if self._states.get(state.session_id) is state:
+            self._states.pop(state.session_id, None)
+            self._stats["dropped"] += 1
+
+    async def finish(self, state: SessionState):
+        """面试结束：立即写回、释放所有权并移出缓存"""
+        await self.persist(state, release=True)
+        if self._states.get(state.session_id) is state:
+            self._states.pop(state.session_id, None)
+
+    async def flush_session(self, session_id: str):
+        """立即写回指定会话（其他接口读取数据库前调用）"""
+        state = self._states.get(session_id)
+        if state is not None:
+            await self.persist(state)
+
+    async def flush_all(self, release_all: bool = False):
+        """
+        写回所有会话的修改并续期所有权；闲置超过 handoff_idle 的会话释放所有权，闲置超过 idle_ttl 的移出缓存
+
+        Args:
+            release_all: 释放所有未在处理回答的会话的所有权（应用关闭时）
+        """
+        now = time.monotonic()
+        for session_id, state in list(self._states.items()):
+            busy = session_id in self._busy
+            idle = now - state.last_access
+            release = state.lease_deadline > 0 and not busy and (release_all or idle > self.handoff_idle)
+            try:
+                await self.persist(state, release=release)
+            except (OwnershipLost, *PERMANENT_FLUSH_ERRORS):
+                continue
+            except Exception as e:
+                print(f"[会话缓存] 写回 {session_id} 失败，稍后重试: {e}")
+                continue
+            if not busy and idle > self.idle_ttl and not state.owned and self._states.get(session_id) is state:
+                self._states.pop(session_id, None)
+
+    async def _evict_overflow(self):
+        """超出容量时移出最久未使用的会话（先写回并释放所有权，正在处理回答的会话跳过）"""
+        for session_id, state in list(self._states.items()):
+            if len(self._states) <= self.max_entries:
+                return
+            if session_id in self._busy:
+                continue
+            try:
+                await self.persist(state, release=True)
+            except (OwnershipLost, *PERMANENT_FLUSH_ERRORS):
+                # 已丢弃，继续检查容量
+                continue
+            except Exception as e:
+                print(f"[会话缓存] 写回 {session_id} 失败，暂不移出: {e}")
+                return
+            if self._states.get(session_id) is state:
+                self._states.pop(session_id, None)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_all()
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        return {
+            **self._stats,
+            "size": len(self._states),
+            "owned": sum(1 for state in self._states.values() if state.owned),
+            "dirty": sum(1 for state in self._states.values() if state.has_changes),
+            "flush_interval": self.flush_interval,
+            "handoff_idle": self.handoff_idle,
+        }
@@ -0,0 +1,166 @@
+"""对话记录存储 - interview_turns 表的读写
+
+每条发言是 interview_turns 中的一行，只追加不修改；读取时序列化为旧版 transcript 的 dict 列表格式，
+接口响应、提示词构建等代码无需感知存储方式。
+旧会话的对话仍在 InterviewSession.transcript（JSON）中，interview_turns 没有数据时才读取该列，首次追加时整体迁移到 interview_turns。
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Float, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import InterviewSession, InterviewTurn
+
+
+# transcript dict 中与 interview_turns 列一一对应的字段
+_TURN_FIELDS = ("score", "hint", "feedback", "topic", "action", "style")
+# 只写入 interview_turns、不随对话记录返回给客户端的字段
+_INTERNAL_FIELDS = ("idempotency_key",)
+
+
+def _fit_column(field: str, value):
+    """
+    按 interview_turns 的列类型修正取值（大模型生成或旧版 JSON 中的值可能不合法，Postgres 会拒绝写入）：
+    字符串按列宽截断，数值列无法转换为数值时置空
+    """
+    column_type = InterviewTurn.__table__.c[field].type
+    if isinstance(column_type, Float) and value is not None:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    length = getattr(column_type, "length", None)
+    if length and isinstance(value, str) and len(value) > length:
+        return value[:length]
+    return value
+
+
+class Transcript(list):
+    """
+    会话的对话记录（dict 列表，格式同旧版 transcript）
+
+    新发言直接 append，条目在 seal() 之前仍可修改（如补充评分），seal() 之后才会被 flush() 插入；
+    本轮处理失败时用 discard_unsealed() 丢弃未完成的条目。
+    """
+
+    def __init__(self, session_id: str, entries: List[dict], persisted: int, answer_keys: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            session_id: 会话ID
+            entries: 已有的对话记录
+            persisted: 已写入 interview_turns 的条数
+            answer_keys: 已有回答的幂等键 {idempotency_key: 条目下标}（条目本身不含内部字段时提供）
+        """
+        super().__init__(entries)
+        self.session_id = session_id
+        self.persisted = persisted
+        self.sealed = 0
+        self.answer_keys: Dict[str, int] = dict(answer_keys or {})
+        self.seal()
+
+    def seal(self):
+        """标记当前所有条目已完成，可以写入"""
+        for index in range(self.sealed, len(self)):
+            key = self[index].get("idempotency_key")
+            if key:
+                self.answer_keys[key] = index
+        self.sealed = len(self)
+
+    def find_answer(self, idempotency_key: str) -> Optional[Tuple[dict, Optional[dict]]]:
+        """按幂等键在已完成的条目中查找回答，返回值同模块级的 find_answer()"""
+        index = self.answer_keys.get(idempotency_key)
+        if index is None:
+            return None
+        return self[index], self[index + 1] if index + 1 < self.sealed else None
+
+    def discard_unsealed(self):
+        """丢弃尚未完成的条目"""
+        del self[self.sealed:]
+
+    def flush(self, db: AsyncSession):
+        """把已完成但尚未写入的发言插入 interview_turns（随调用方的事务一起提交，失败时调用方需回退 persisted）"""
+        for seq in range(self.persisted, self.sealed):
+            db.add(entry_to_turn(self.session_id, seq, self[seq]))
+        self.persisted = self.sealed
+
+
+def turn_to_dict(turn: InterviewTurn) -> dict:
+    """序列化为旧版 transcript 条目格式（空字段和内部字段省略）"""
+    entry = {
+        "role": turn.role,
+        "content": turn.content,
+        "timestamp": turn.created_at.isoformat() if turn.created_at else None,
+        "question_number": turn.question_number,
+    }
+    for field in _TURN_FIELDS:
+        value = getattr(turn, field)
+        if value is not None:
+            entry[field] = value
+    return entry
+
+
+def entry_to_turn(session_id: str, seq: int, entry: dict) -> InterviewTurn:
+    """把 transcript 条目转换为 interview_turns 行"""
+    timestamp = entry.get("timestamp")
+    return InterviewTurn(
+        session_id=session_id,
+        seq=seq,
+        question_number=entry.get("question_number"),
+        role=_fit_column("role", entry["role"]),
+        content=entry.get("content") or "",
+        created_at=datetime.fromisoformat(timestamp) if timestamp else datetime.utcnow(),
+        **{field: _fit_column(field, entry.get(field)) for field in _TURN_FIELDS + _INTERNAL_FIELDS}
+    )
+
+
+async def load_transcript(db: AsyncSession, session_id: str) -> Transcript:
+    """
+    读取会话的对话记录
+
+    interview_turns 中没有数据时回退到旧版 JSON 对话记录（多一次单列查询），下次 flush 时迁移。
+    """
+    turns = (await db.scalars(
+        select(InterviewTurn).where(
+            InterviewTurn.session_id == session_id
+        ).order_by(InterviewTurn.seq)
+    )).all()
+
+    if turns:
+        return Transcript(
+            session_id,
+            [turn_to_dict(turn) for turn in turns],
+            persisted=len(turns),
+            answer_keys={turn.idempotency_key: index for index, turn in enumerate(turns) if turn.idempotency_key}
+        )
+
+    legacy = await db.scalar(
+        select(InterviewSession.transcript).where(InterviewSession.session_id == session_id)
+    )
+    return Transcript(session_id, [dict(entry) for entry in (legacy or [])], persisted=0)
+
+
+async def find_answer(db: AsyncSession, session_id: str, idempotency_key: str) -> Optional[Tuple[dict, Optional[dict]]]:
+    """
+    按幂等键查找已处理的回答
+
+    Returns:
+        (候选人回答, 紧随其后的面试官提问或 None)，未找到返回 None
+    """
+    answer = await db.scalar(
+        select(InterviewTurn).where(
+            InterviewTurn.session_id == session_id,
+            InterviewTurn.idempotency_key == idempotency_key
+        )
+    )
+
+    if not answer:
+        return None
+
+    next_turn = await db.scalar(
+        select(InterviewTurn).where(
+            InterviewTurn.session_id == session_id,
+            InterviewTurn.seq == answer.seq + 1
+        )
+    )
+    return turn_to_dict(answer), turn_to_dict(next_turn) if next_turn else None
@@ -0,0 +1,161 @@
+"""问题语音后台合成
+
+出题接口不再同步等待火山引擎 TTS：返回问题时只提交合成任务，并立即给出确定性的音频地址
+/api/v1/tts/audio/{job_id}。任务 ID 由音色和文本哈希得到，同一问题不会重复合成；
+音频未就绪时请求该地址会等待合成完成，客户端也可以轮询 /tts/audio/{job_id}/status。
+"""
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import settings
+from services.volcengine_tts_service import get_volcengine_tts_service
+
+
+DEFAULT_VOICE = "zh_male_shenyeboke_moon_bigtts"
+
+
+class AudioJobManager:
+    """问题语音合成任务管理（进程内）"""
+
+    # 保留的失败记录条数
+    MAX_FAILED = 1000
+
+    def __init__(self, static_dir: str, max_concurrency: int = 4):
+        """
+        Args:
+            static_dir: 音频文件保存目录
+            max_concurrency: 同时进行的合成请求数
+        """
+        self.static_dir = static_dir
+        self._max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._failed: "OrderedDict[str, str]" = OrderedDict()
+        self._stats = {"submitted": 0, "deduplicated": 0, "succeeded": 0, "failed": 0}
+
+    @staticmethod
+    def job_id(text: str, voice: str = DEFAULT_VOICE) -> str:
+        """根据音色和文本生成确定性的任务 ID"""
+        return hashlib.sha1(f"{voice}\n{text}".encode("utf-8")).hexdigest()[:20]
+
+    @staticmethod
+    def audio_url(job_id: str) -> str:
+        """任务对应的音频地址（未就绪时请求会等待合成完成）"""
+        return f"/api/v1/tts/audio/{job_id}"
+
+    def file_path(self, job_id: str) -> str:
+        return os.path.join(self.static_dir, f"q_{job_id}.mp3")
+
+    def submit(self, text: str, voice: str = DEFAULT_VOICE) -> str:
+        """
+        提交合成任务（需在事件循环中调用）
+
+        Returns:
+            任务 ID；音频已存在或已有相同任务时不会重复合成
+        """
+        job_id = self.job_id(text, voice)
+        if os.path.exists(self.file_path(job_id)) or job_id in self._jobs:
+            self._stats["deduplicated"] += 1
+            return job_id
+
+        self._failed.pop(job_id, None)
+        task = asyncio.create_task(self._synthesize(job_id, text, voice))
+        self._jobs[job_id] = task
+        task.add_done_callback(lambda _: self._jobs.pop(job_id, None))
+        self._stats["submitted"] += 1
+        return job_id
+
+    async def _synthesize(self, job_id: str, text: str, voice: str) -> bool:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async with self._semaphore:
+            audio_data = await asyncio.to_thread(
+                get_volcengine_tts_service().text_to_speech, text, voice_type=voice
+            )
+
+        if not audio_data:
+            self._mark_failed(job_id, "语音合成失败")
+            return False
+
+        try:
+            await asyncio.to_thread(self._write_file, job_id, audio_data)
+        except OSError as e:
+            self._mark_failed(job_id, f"保存音频文件失败: {e}")
+            return False
+
+        self._stats["succeeded"] += 1
+        print(f"[TTS] 后台合成完成: {job_id} ({len(audio_data)} bytes)")
+        return True
+
+    def _write_file(self, job_id: str, audio_data: bytes):
+        """先写临时文件再重命名，其他进程不会读到写了一半的音频"""
+        os.makedirs(self.static_dir, exist_ok=True)
+        path = self.file_path(job_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio_data)
+        os.replace(tmp_path, path)
+
+    def _mark_failed(self, job_id: str, error: str):
+        print(f"[TTS] 后台合成失败: {job_id}, {error}")
+        self._stats["failed"] += 1
+        self._failed[job_id] = error
+        while len(self._failed) > self.MAX_FAILED:
+            self._failed.popitem(last=False)
+
+    def status(self, job_id: str) -> Dict:
+        """查询任务状态：ready / pending / failed / unknown（不在本进程，可能由其他 worker 合成中）"""
+        if os.path.exists(self.file_path(job_id)):
+            status = "ready"
+        elif job_id in self._jobs:
+            status = "pending"
+        elif job_id in self._failed:
+            status = "failed"
+        else:
+            status = "unknown"
+
+        result = {"job_id": job_id, "status": status, "audio_url": self.audio_url(job_id)}
+        if status == "failed":
+            result["error"] = self._failed[job_id]
+        return result
+
+    async def wait(self, job_id: str, timeout: float, poll_interval: float = 0.3) -> Optional[str]:
+        """
+        等待音频就绪
+
+        Returns:
+            音频文件路径，失败或超时返回 None
+        """
+        path = self.file_path(job_id)
+        task = self._jobs.get(job_id)
+        if task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+            return path if os.path.exists(path) else None
+
+        # 其他 worker 提交的任务：轮询文件
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            if os.path.exists(path):
+                return path
+            if job_id in self._failed or loop.time() >= deadline:
+                return None
+            await asyncio.sleep(poll_interval)
+
+    def get_stats(self) -> Dict:
+        """获取合成任务统计信息"""
+        return {**self._stats, "pending": len(self._jobs)}
+
+
+# 全局单例
+audio_jobs = AudioJobManager(
+    static_dir=os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "tts"),
+    max_concurrency=settings.tts_max_concurrency,
+)
@@ -0,0 +1,12 @@
+"""测试公共配置：补齐必需的环境变量，并把后端目录加入导入路径"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Settings 要求这些字段必须由环境变量提供；单元测试不连接真实服务
+os.environ.setdefault("DASHSCOPE_API_KEY", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
@@ -0,0 +1,106 @@
+"""查询向量缓存测试"""
+import os
+from array import array
+
+from services.embedding_cache import DiskVectorStore, EmbeddingCache, normalize_text
+
+DIM = 4
+ROW_BYTES = DIM * 4
+
+
+def vec(value: float):
+    return [value] * DIM
+
+
+def test_normalize_text():
+    assert normalize_text("  ＭｙＳＱＬ\t Redis \n") == "mysql redis"
+
+
+def test_lru_byte_accounting():
+    cache = EmbeddingCache("m", max_bytes=3 * ROW_BYTES)
+    for i in range(3):
+        cache.put(f"q{i}", vec(i))
+    assert cache.get_stats()["bytes"] == 3 * ROW_BYTES
+
+    # 访问 q0 后它变为最近使用，超出预算时淘汰 q1
+    assert cache.get("q0") == vec(0)
+    cache.put("q3", vec(3))
+    stats = cache.get_stats()
+    assert stats["bytes"] == 3 * ROW_BYTES
+    assert stats["entries"] == 3
+    assert stats["evictions"] == 1
+    assert cache.get("q1") is None
+    assert cache.get("q0") == vec(0)
+
+
+def test_overwrite_does_not_double_count():
+    cache = EmbeddingCache("m", max_bytes=10 * ROW_BYTES)
+    cache.put("q", vec(1))
+    cache.put("q", vec(2))
+    assert cache.get_stats()["bytes"] == ROW_BYTES
+    assert cache.get("q") == vec(2)
+
+
+def test_vector_larger_than_budget_is_not_cached():
+    cache = EmbeddingCache("m", max_bytes=ROW_BYTES - 1)
+    cache.put("q", vec(1))
+    assert cache.get_stats()["bytes"] == 0
+    assert cache.get("q") is None
+
+
+def test_clear_memory_resets_bytes():
+    cache = EmbeddingCache("m", max_bytes=10 * ROW_BYTES)
+    cache.put("q", vec(1))
+    cache.clear_memory()
+    assert cache.get_stats()["bytes"] == 0
+
+
+def test_memory_only_cache_has_no_disk():
+    assert not EmbeddingCache("m", max_bytes=ROW_BYTES).has_disk
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    first = EmbeddingCache("m", max_bytes=10 * ROW_BYTES, disk_dir=str(tmp_path))
+    assert first.has_disk
+    first.put("q", vec(1.5))
+
+    second = EmbeddingCache("m", max_bytes=10 * ROW_BYTES, disk_dir=str(tmp_path))
+    assert second.get_memory("q") is None
+    assert second.get("q") == vec(1.5)
+    assert second.get_stats()["disk_hits"] == 1
+    # 磁盘命中后放入内存层
+    assert second.get_memory("q") == vec(1.5)
+
+
+def test_disk_tier_ignores_other_model(tmp_path):
+    EmbeddingCache("m1", max_bytes=10 * ROW_BYTES, disk_dir=str(tmp_path)).put("q", vec(1))
+    other = EmbeddingCache("m2", max_bytes=10 * ROW_BYTES, disk_dir=str(tmp_path))
+    assert other.get("q") is None
+
+
+def test_disk_put_truncates_partial_row(tmp_path):
+    store = DiskVectorStore(str(tmp_path), "m", DIM, max_entries=10)
+    assert store.put("a", array("f", vec(1)))
+
+    # 模拟写入中途崩溃：向量文件末尾留下不完整的记录，索引中没有对应条目
+    vectors_path = os.path.join(str(tmp_path), "vectors.f32")
+    with open(vectors_path, "ab") as f:
+        f.write(b"\x00" * (ROW_BYTES // 2))
+
+    assert store.put("b", array("f", vec(2)))
+    assert os.path.getsize(vectors_path) == 2 * ROW_BYTES
+
+    reopened = DiskVectorStore(str(tmp_path), "m", DIM, max_entries=10)
+    assert reopened.get("a").tolist() == vec(1)
+    assert reopened.get("b").tolist() == vec(2)
+    store.close()
+    reopened.close()
+
+
+def test_disk_put_respects_max_entries_and_dim(tmp_path):
+    store = DiskVectorStore(str(tmp_path), "m", DIM, max_entries=1)
+    assert store.put("a", array("f", vec(1)))
+    assert not store.put("b", array("f", vec(2)))
+    assert not store.put("c", array("f", [1.0] * (DIM + 1)))
+    assert len(store) == 1
+    store.close()
@@ -0,0 +1,79 @@
+"""增量 JSON 解析器测试"""
+import pytest
+
+from utils.json_stream import IncrementalJSONParser, parse_json_object
+
+
+def feed_all(chunks):
+    parser = IncrementalJSONParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser
+
+
+def test_whole_object():
+    parser = feed_all(['{"a": "x", "b": 3, "c": true, "d": null}'])
+    assert parser.done
+    assert parser.fields == {"a": "x", "b": 3, "c": True, "d": None}
+
+
+def test_split_at_every_character():
+    text = '{"question": "你好\\n世界", "score": 8.5, "tags": ["a", {"k": [1, 2]}]}'
+    parser = feed_all(list(text))
+    assert parser.fields == {
+        "question": "你好\n世界",
+        "score": 8.5,
+        "tags": ["a", {"k": [1, 2]}],
+    }
+
+
+def test_escape_split_between_chunks():
+    parser = feed_all(['{"q": "a\\', '"b\\', '\\c"}'])
+    assert parser.fields == {"q": 'a"b\\c'}
+
+
+def test_unicode_escape_split_between_chunks():
+    parser = feed_all(['{"q": "\\u4f', '60\\u597', 'd"}'])
+    assert parser.fields == {"q": "你好"}
+
+
+def test_partial_string_while_streaming():
+    parser = IncrementalJSONParser()
+    parser.feed('{"feedback": "回答')
+    assert parser.partial("feedback") == "回答"
+    parser.feed('不错", "next')
+    assert parser.partial("feedback") == "回答不错"
+    assert parser.partial("next") is None
+    assert not parser.done
+
+
+def test_partial_hides_incomplete_escape():
+    parser = IncrementalJSONParser()
+    parser.feed('{"q": "ab\\u4f')
+    assert parser.partial("q") == "ab"
+    parser.feed('60"}')
+    assert parser.partial("q") == "ab你"
+
+
+def test_scalar_terminated_by_closing_brace():
+    parser = feed_all(['{"score": 7', '}'])
+    assert parser.fields == {"score": 7}
+
+
+def test_code_fence_and_comments():
+    parser = feed_all(['```json\n{"a": 1, // 注释\n', '"b": "x"}\n```'])
+    assert parser.fields == {"a": 1, "b": "x"}
+
+
+def test_feed_returns_fields_as_they_complete():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": "x", "b"') == [("a", "x")]
+    assert parser.feed(': 2}') == [("b", 2)]
+    assert parser.done
+
+
+def test_parse_json_object_rejects_missing_or_unclosed_object():
+    with pytest.raises(ValueError):
+        parse_json_object("not json")
+    with pytest.raises(ValueError):
+        parse_json_object('{"a": "x"')
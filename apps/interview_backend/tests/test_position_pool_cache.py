@@ -0,0 +1,240 @@
+"""岗位题库池缓存测试（stale-while-revalidate、single-flight、按岗位失效）"""
+import asyncio
+
+import pytest
+
+from services import position_pool_cache
+from services.position_pool_cache import PositionPoolCache, estimate_size
+from services.question_ref import QuestionRef
+
+TTL = 10.0
+STALE_TTL = 20.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class Loader:
+    """可控的题库查询：记录调用次数，gate 未放行时查询挂起"""
+
+    def __init__(self):
+        self.calls = []
+        self.version = 0
+        self.gate = None
+        self.fail = False
+
+    async def __call__(self, position: str, limit: int):
+        self.calls.append((position, limit))
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("es down")
+        return [QuestionRef(f"{position}-{self.version}-{i}", question=f"q{i}") for i in range(limit)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(position_pool_cache, "time", fake)
+    return fake
+
+
+def make_cache(loader, max_bytes=10 ** 7):
+    return PositionPoolCache(loader, ttl=TTL, stale_ttl=STALE_TTL, max_bytes=max_bytes)
+
+
+def ids(results):
+    return [question.id for question in results]
+
+
+async def settle():
+    """让后台刷新任务跑完"""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_miss_then_hit(clock):
+    async def scenario():
+        loader = Loader()
+        cache = make_cache(loader)
+        first, status = await cache.get("java", 2)
+        assert status == "miss"
+        second, status = await cache.get("java", 2)
+        assert status == "hit"
+        assert second is first
+        assert len(loader.calls) == 1
+    asyncio.run(scenario())
+
+
+def test_concurrent_misses_share_one_query(clock):
+    async def scenario():
+        loader = Loader()
+        loader.gate = asyncio.Event()
+        cache = make_cache(loader)
+        waiters = [asyncio.ensure_future(cache.get("java", 2)) for _ in range(3)]
+        await settle()
+        loader.gate.set()
+        results = await asyncio.gather(*waiters)
+        assert len(loader.calls) == 1
+        assert all(status == "miss" for _, status in results)
+        assert len({id(questions) for questions, _ in results}) == 1
+    asyncio.run(scenario())
+
+
+def test_stale_entry_is_served_and_refreshed_once(clock):
+    async def scenario():
+        loader = Loader()
+        cache = make_cache(loader)
+        old, _ = await cache.get("java", 2)
+
+        clock.now += TTL + 1
+        loader.version = 1
+        loader.gate = asyncio.Event()
+        for _ in range(3):
+            results, status = await cache.get("java", 2)
+            assert status == "stale"
+            assert results is old
+        await settle()
+        # 刷新进行中，多次过期命中只发起一次查询
+        assert len(loader.calls) == 2
+
+        loader.gate.set()
+        await settle()
+        results, status = await cache.get("java", 2)
+        assert status == "hit"
+        assert ids(results) == ["java-1-0", "java-1-1"]
+        assert cache.get_stats()["refreshes"] == 1
+    asyncio.run(scenario())
+
+
+def test_entry_past_grace_period_is_reloaded(clock):
+    async def scenario():
+        loader = Loader()
+        cache = make_cache(loader)
+        await cache.get("java", 2)
+
+        clock.now += TTL + STALE_TTL + 1
+        loader.version = 1
+        results, status = await cache.get("java", 2)
+        assert status == "miss"
+        assert ids(results) == ["java-1-0", "java-1-1"]
+    asyncio.run(scenario())
+
+
+def test_failed_refresh_keeps_stale_entry(clock):
+    async def scenario():
+        loader = Loader()
+        cache = make_cache(loader)
+        old, _ = await cache.get("java", 2)
+
+        clock.now += TTL + 1
+        loader.fail = True
+        results, status = await cache.get("java", 2)
+        await settle()
+        assert status == "stale"
+        assert cache.get_stats()["refresh_failures"] == 1
+        results, status = await cache.get("java", 2)
+        assert status == "stale"
+        assert results is old
+    asyncio.run(scenario())
+
+
+def test_empty_results_are_not_cached(clock):
+    async def scenario():
+        async def empty(position, limit):
+            return []
+        cache = make_cache(empty)
+        assert await cache.get("java", 2) == ([], "miss")
+        assert await cache.get("java", 2) == ([], "miss")
+        assert cache.get_stats()["entries"] == 0
+    asyncio.run(scenario())
+
+
+def test_invalidate_during_query_discards_result(clock):
+    async def scenario():
+        loader = Loader()
+        loader.gate = asyncio.Event()
+        cache = make_cache(loader)
+        waiter = asyncio.ensure_future(cache.get("java", 2))
+        await settle()
+
+        cache.invalidate("java")
+        loader.gate.set()
+        results, status = await waiter
+        # 本次调用仍拿到结果，但结果不写入缓存
+        assert status == "miss" and len(results) == 2
+        assert cache.get_stats()["entries"] == 0
+    asyncio.run(scenario())
+
+
+def test_invalidate_during_stale_refresh_discards_refresh(clock):
+    async def scenario():
+        loader = Loader()
+        cache = make_cache(loader)
+        await cache.get("java", 2)
+        await cache.get("go", 2)
+
+        clock.now += TTL + 1
+        loader.gate = asyncio.Event()
+        await cache.get("java", 2)
+        await settle()
+        cache.invalidate("java")
+        loader.gate.set()
+        await settle()
+
+        assert cache.positions() == ["go"]
+        loader.gate = None
+        _, status = await cache.get("java", 2)
+        assert status == "miss"
+    asyncio.run(scenario())
+
+
+def test_invalidate_all_bumps_inflight_generations(clock):
+    async def scenario():
+        loader = Loader()
+        cache = make_cache(loader)
+        await cache.get("go", 2)
+        loader.gate = asyncio.Event()
+        waiter = asyncio.ensure_future(cache.get("java", 2))
+        await settle()
+
+        removed = cache.invalidate()
+        assert ids(removed) == ["go-0-0", "go-0-1"]
+        loader.gate.set()
+        await waiter
+        assert cache.positions() == []
+    asyncio.run(scenario())
+
+
+def test_invalidate_one_position_keeps_others(clock):
+    async def scenario():
+        loader = Loader()
+        cache = make_cache(loader)
+        await cache.get("java", 2)
+        await cache.get("go", 2)
+        cache.invalidate("java")
+        assert cache.positions() == ["go"]
+        _, status = await cache.get("go", 2)
+        assert status == "hit"
+    asyncio.run(scenario())
+
+
+def test_byte_budget_evicts_least_recently_used(clock):
+    async def scenario():
+        loader = Loader()
+        sample = await loader("x", 2)
+        cache = make_cache(loader, max_bytes=estimate_size(sample) * 2 + 1)
+        await cache.get("a", 2)
+        await cache.get("b", 2)
+        await cache.get("a", 2)
+        await cache.get("c", 2)
+        assert cache.positions() == ["a", "c"]
+        stats = cache.get_stats()
+        assert stats["evictions"] == 1
+        assert stats["bytes"] <= cache.max_bytes
+    asyncio.run(scenario())
@@ -0,0 +1,115 @@
+"""每日面试次数配额测试（使用临时 SQLite 数据库）"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from config import settings
+from database.db import Base, User
+from services import quota_service
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'quota.db'}")
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+def run(session_factory, action):
+    async def wrapper():
+        async with session_factory() as db:
+            return await action(db)
+    return asyncio.run(wrapper())
+
+
+def add_user(session_factory, **fields):
+    async def action(db):
+        db.add(User(user_id="u1", openid="o1", **fields))
+        await db.commit()
+    run(session_factory, action)
+
+
+def load_user(session_factory):
+    async def action(db):
+        return await db.scalar(select(User).where(User.user_id == "u1"))
+    return run(session_factory, action)
+
+
+def reserve(session_factory):
+    return run(session_factory, lambda db: quota_service.reserve_slot(db, "u1"))
+
+
+def refund(session_factory):
+    return run(session_factory, lambda db: quota_service.refund_slot(db, "u1"))
+
+
+def yesterday() -> datetime:
+    return datetime.utcnow() - timedelta(days=1)
+
+
+def test_reserve_counts_until_daily_limit(session_factory):
+    add_user(session_factory)
+    for used in range(1, settings.free_user_daily_limit + 1):
+        assert reserve(session_factory) == (used, True)
+    with pytest.raises(quota_service.QuotaExceeded):
+        reserve(session_factory)
+
+
+def test_reserve_resets_count_on_new_day(session_factory):
+    add_user(session_factory, free_count_today=settings.free_user_daily_limit, last_free_date=yesterday())
+
+    assert reserve(session_factory) == (1, True)
+    user = load_user(session_factory)
+    assert user.free_count_today == 1
+    assert user.last_free_date.date() == datetime.utcnow().date()
+
+
+def test_reserve_first_use_without_date(session_factory):
+    add_user(session_factory, free_count_today=None, last_free_date=None)
+    assert reserve(session_factory) == (1, True)
+
+
+def test_normal_vip_limit(session_factory):
+    add_user(session_factory, vip_type="normal")
+    for used in range(1, settings.normal_vip_daily_limit + 1):
+        assert reserve(session_factory) == (used, True)
+    with pytest.raises(quota_service.QuotaExceeded) as exc_info:
+        reserve(session_factory)
+    assert exc_info.value.daily_limit == settings.normal_vip_daily_limit
+
+
+def test_super_vip_is_not_counted(session_factory):
+    add_user(session_factory, vip_type="super", free_count_today=5, last_free_date=yesterday())
+
+    assert reserve(session_factory) == (0, False)
+    assert reserve(session_factory) == (0, False)
+
+
+def test_unknown_user(session_factory):
+    with pytest.raises(ValueError):
+        reserve(session_factory)
+
+
+def test_refund_same_day(session_factory):
+    add_user(session_factory)
+    reserve(session_factory)
+
+    assert refund(session_factory) == 0
+    # 计数已为 0 时不再退还
+    assert refund(session_factory) is None
+
+
+def test_refund_skipped_after_day_rollover(session_factory):
+    add_user(session_factory, free_count_today=1, last_free_date=yesterday())
+
+    assert refund(session_factory) is None
+    assert load_user(session_factory).free_count_today == 1
@@ -0,0 +1,55 @@
+"""RRF 融合测试"""
+import pytest
+
+from services.knowledge_service import rrf_fuse
+
+
+def hits(*ids, score=1.0):
+    return [{"_id": doc_id, "_score": score, "_source": {"question": doc_id}} for doc_id in ids]
+
+
+def ids(fused):
+    return [hit["_id"] for hit in fused]
+
+
+def test_documents_in_both_lists_rank_first():
+    fused = rrf_fuse([hits("a", "b", "c"), hits("c", "d")], k=60)
+    assert ids(fused)[0] == "c"
+    assert fused[0]["_score"] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_tied_scores_keep_first_seen_order():
+    # a、x 都只在各自列表中排第一，融合得分相同：按先出现的列表排序，结果稳定
+    fused = rrf_fuse([hits("a", "b"), hits("x", "y")], k=60)
+    assert ids(fused) == ["a", "x", "b", "y"]
+    assert fused[0]["_score"] == fused[1]["_score"]
+    assert fused[2]["_score"] == fused[3]["_score"]
+
+
+def test_symmetric_ranks_tie():
+    # a 分别排第 1、2，b 分别排第 2、1：得分相同，按第一路的顺序
+    fused = rrf_fuse([hits("a", "b"), hits("b", "a")], k=60)
+    assert ids(fused) == ["a", "b"]
+    assert fused[0]["_score"] == pytest.approx(fused[1]["_score"])
+
+
+def test_original_scores_are_ignored():
+    # 同一路中原始得分相同（或量纲悬殊）的命中仍按名次计分
+    bm25 = hits("a", "b", score=12.5)
+    knn = hits("b", score=0.99)
+    fused = rrf_fuse([bm25, knn], k=1)
+    assert ids(fused) == ["b", "a"]
+    assert fused[0]["_score"] == pytest.approx(1 / 3 + 1 / 2)
+    assert fused[1]["_score"] == pytest.approx(1 / 2)
+
+
+def test_first_hit_source_is_kept():
+    first = [{"_id": "a", "_score": 1.0, "_source": {"from": "bm25"}}]
+    second = [{"_id": "a", "_score": 0.5, "_source": {"from": "knn"}}]
+    fused = rrf_fuse([first, second], k=60)
+    assert fused == [{"_id": "a", "_score": pytest.approx(2 / 61), "_source": {"from": "bm25"}}]
+
+
+def test_empty_lists():
+    assert rrf_fuse([], k=60) == []
+    assert rrf_fuse([[], []], k=60) == []
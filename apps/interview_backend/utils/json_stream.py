@@ -0,0 +1,218 @@
+"""
+增量 JSON 解析模块
+用于解析大模型流式输出的 JSON 对象：每个顶层字段一旦生成完整即可取用，无需等待整段输出结束
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 解析状态
+_BEFORE = 0          # 等待对象开始的 '{'（跳过 ```json 等前缀）
+_EXPECT_KEY = 1      # 等待字段名或 '}'
+_KEY = 2             # 读取字段名
+_EXPECT_COLON = 3    # 等待 ':'
+_EXPECT_VALUE = 4    # 等待字段值
+_STRING = 5          # 读取字符串值
+_SCALAR = 6          # 读取数值 / true / false / null
+_NESTED = 7          # 读取嵌套对象或数组（原样收集，结束后整体解析）
+_COMMENT = 8         # 跳过 // 注释（模型偶尔会照抄提示词中的注释）
+_DONE = 9            # 顶层对象已结束
+
+_SCALAR_END = set(",}/ \t\r\n")
+
+
+class IncrementalJSONParser:
+    """
+    顶层 JSON 对象的增量解析器
+
+    每次 feed() 只扫描新到达的字符，返回本次新完成的字段。
+    仅解析第一个顶层对象，对象之前和之后的内容会被忽略。
+
+    使用示例：
+        parser = IncrementalJSONParser()
+        async for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...
+            parser.partial("next_question")  # 正在生成中的字符串字段
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.text = ""
+        self._state = _BEFORE
+        self._return_state = _EXPECT_KEY
+        self._key: Optional[str] = None
+        self._buf: List[str] = []
+        self._escape: Optional[str] = None  # 未完成的转义序列
+        self._depth = 0
+        self._nested_in_string = False
+        self._nested_escape = False
+
+    @property
+    def done(self) -> bool:
+        """顶层对象是否已完整解析"""
+        return self._state == _DONE
+
+    @property
+    def started(self) -> bool:
+        """是否已经读到对象开始的 '{'"""
+        return self._state != _BEFORE
+
+    def partial(self, key: str) -> Optional[str]:
+        """获取字符串字段当前已生成的内容（已完成的字段返回完整值）"""
+        if key in self.fields:
+            value = self.fields[key]
+            return value if isinstance(value, str) else None
+        if self._state == _STRING and self._key == key:
+            return "".join(self._buf)
+        return None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        追加一段文本
+
+        Returns:
+            本次新完成的字段列表 [(key, value)]
+        """
+        self.text += chunk
+        completed = []
+        for ch in chunk:
+            if self._state == _DONE:
+                break
+            field = self._step(ch)
+            if field is not None:
+                completed.append(field)
+        return completed
+
+    def _emit(self, value: Any) -> Tuple[str, Any]:
+        key = self._key
+        self.fields[key] = value
+        self._key = None
+        self._buf = []
+        self._state = _EXPECT_KEY
+        return key, value
+
+    def _read_string_char(self, ch: str) -> bool:
+        """读取字符串中的一个字符（处理转义），遇到结束引号返回 True"""
+        if self._escape is not None:
+            self._escape += ch
+            width = 6 if self._escape[1] == "u" else 2
+            if len(self._escape) == width:
+                try:
+                    self._buf.append(json.loads(f'"{self._escape}"'))
+                except ValueError:
+                    self._buf.append(self._escape[1:])
+                self._escape = None
+            return False
+        if ch == "\\":
+            self._escape = ch
+            return False
+        if ch == '"':
+            return True
+        self._buf.append(ch)
+        return False
+
+    def _step(self, ch: str) -> Optional[Tuple[str, Any]]:
+        state = self._state
+
+        if state == _BEFORE:
+            if ch == "{":
+                self._state = _EXPECT_KEY
+
+        elif state == _EXPECT_KEY:
+            if ch == '"':
+                self._buf = []
+                self._state = _KEY
+            elif ch == "}":
+                self._state = _DONE
+            elif ch == "/":
+                self._return_state = _EXPECT_KEY
+                self._state = _COMMENT
+
+        elif state == _KEY:
+            if self._read_string_char(ch):
+                self._key = "".join(self._buf)
+                self._buf = []
+                self._state = _EXPECT_COLON
+
+        elif state == _EXPECT_COLON:
+            if ch == ":":
+                self._state = _EXPECT_VALUE
+
+        elif state == _EXPECT_VALUE:
+            if ch == '"':
+                self._state = _STRING
+            elif ch in "{[":
+                self._buf = [ch]
+                self._depth = 1
+                self._nested_in_string = False
+                self._nested_escape = False
+                self._state = _NESTED
+            elif ch == "/":
+                self._return_state = _EXPECT_VALUE
+                self._state = _COMMENT
+            elif not ch.isspace():
+                self._buf = [ch]
+                self._state = _SCALAR
+
+        elif state == _STRING:
+            if self._read_string_char(ch):
+                return self._emit("".join(self._buf))
+
+        elif state == _SCALAR:
+            if ch in _SCALAR_END:
+                token = "".join(self._buf)
+                try:
+                    value = json.loads(token)
+                except ValueError:
+                    value = token
+                field = self._emit(value)
+                # 终止符本身仍需按结构字符处理
+                self._step(ch)
+                return field
+            self._buf.append(ch)
+
+        elif state == _NESTED:
+            self._buf.append(ch)
+            if self._nested_in_string:
+                if self._nested_escape:
+                    self._nested_escape = False
+                elif ch == "\\":
+                    self._nested_escape = True
+                elif ch == '"':
+                    self._nested_in_string = False
+            elif ch == '"':
+                self._nested_in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = "".join(self._buf)
+                    try:
+                        value = json.loads(raw)
+                    except ValueError:
+                        value = raw
+                    return self._emit(value)
+
+        elif state == _COMMENT:
+            if ch == "\n":
+                self._state = self._return_state
+
+        return None
+
+
+def parse_json_object(text: str) -> Dict[str, Any]:
+    """
+    从完整的模型输出中解析第一个 JSON 对象
+
+    Raises:
+        ValueError: 输出中没有 JSON 对象，或对象未闭合
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    if not parser.started:
+        raise ValueError("模型输出中未找到 JSON 对象")
+    if not parser.done:
+        raise ValueError("模型输出的 JSON 对象不完整")
+    return parser.fields
@@ -4,7 +4,9 @@ const app = getApp()
 Page({
   data: {
     historyList: [],
-    loading: false
+    loading: false,
+    nextCursor: '',  // 下一页游标，为空表示没有更多
+    hasMore: false
   },
 
   onLoad() {
@@ -16,8 +18,8 @@ Page({
     this.loadHistory()
   },
 
-  // 加载面试记录
-  loadHistory() {
+  // 加载面试记录（loadMore 为 true 时加载下一页并追加）
+  loadHistory(loadMore = false) {
     const userId = app.globalData.userId
     if (!userId) {
       wx.showToast({
@@ -32,22 +34,35 @@ Page({
       return
     }
 
+    if (loadMore && (!this.data.hasMore || this.data.loading)) {
+      return
+    }
+
     this.setData({ loading: true })
 
+    const cursor = loadMore ? this.data.nextCursor : ''
+
     wx.request({
       url: `${app.globalData.baseUrl}/user/${userId}/history`,
       method: 'GET',
+      data: cursor ? { cursor } : {},
       success: (res) => {
         this.setData({ loading: false })
 
         if (res.statusCode === 200) {
-          const historyList = res.data.map(item => ({
+          const items = res.data.map(item => ({
             ...item,
             date: this.formatDate(item.created_at),
             level: item.total_score ? this.getScoreLevel(item.total_score) : '未完成',
             score: item.total_score ? item.total_score.toFixed(1) : '-'
           }))
-          this.setData({ historyList })
+          const headers = res.header || {}
+          const nextCursor = headers['X-Next-Cursor'] || headers['x-next-cursor'] || ''
+          this.setData({
+            historyList: loadMore ? this.data.historyList.concat(items) : items,
+            nextCursor,
+            hasMore: !!nextCursor
+          })
         }
       },
       fail: () => {
@@ -120,6 +135,11 @@ Page({
     })
   },
 
+  // 上拉加载更多
+  onReachBottom() {
+    this.loadHistory(true)
+  },
+
   // 下拉刷新
   onPullDownRefresh() {
     this.loadHistory()
@@ -0,0 +1,55 @@
+-- 添加回答串行化和幂等字段
+-- 执行时间: 2026-10-17
+-- 说明: interview_sessions.turn_lock_owner / turn_lock_until 记录回答处理租约（跨 worker 串行化同一会话的回答），
+--       interview_turns.idempotency_key 记录候选人回答的幂等键（重试时返回已处理的结果）
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'interview_sessions'
+        AND column_name = 'turn_lock_owner'
+    ) THEN
+        ALTER TABLE interview_sessions ADD COLUMN turn_lock_owner VARCHAR(64);
+        RAISE NOTICE 'turn_lock_owner 字段已添加';
+    ELSE
+        RAISE NOTICE 'turn_lock_owner 字段已存在，跳过';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'interview_sessions'
+        AND column_name = 'turn_lock_until'
+    ) THEN
+        ALTER TABLE interview_sessions ADD COLUMN turn_lock_until TIMESTAMP;
+        RAISE NOTICE 'turn_lock_until 字段已添加';
+    ELSE
+        RAISE NOTICE 'turn_lock_until 字段已存在，跳过';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'interview_turns'
+        AND column_name = 'idempotency_key'
+    ) THEN
+        ALTER TABLE interview_turns ADD COLUMN idempotency_key VARCHAR(64);
+        RAISE NOTICE 'idempotency_key 字段已添加';
+    ELSE
+        RAISE NOTICE 'idempotency_key 字段已存在，跳过';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_constraint
+        WHERE conname = 'uq_interview_turns_session_idempotency'
+    ) THEN
+        ALTER TABLE interview_turns
+            ADD CONSTRAINT uq_interview_turns_session_idempotency UNIQUE (session_id, idempotency_key);
+        RAISE NOTICE 'uq_interview_turns_session_idempotency 约束已添加';
+    ELSE
+        RAISE NOTICE 'uq_interview_turns_session_idempotency 约束已存在，跳过';
+    END IF;
+END $$;
@@ -0,0 +1,7 @@
+-- 添加 interview_sessions (user_id, created_at) 复合索引
+-- 执行时间: 2026-10-17
+-- 说明: 面试历史接口改为按 created_at 倒序的 keyset 分页，按用户筛选并排序可直接走索引
+-- 使用 CONCURRENTLY 创建，不阻塞线上写入（不能放在事务中执行）
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_interview_sessions_user_created
+    ON interview_sessions (user_id, created_at);
@@ -0,0 +1,19 @@
+-- 添加报告任务提交时间字段到 interview_sessions 表
+-- 执行时间: 2026-10-17
+-- 说明: report_requested_at 记录报告任务最近一次提交时间；进程重启或崩溃丢失的任务（pending 过久）
+--       在应用启动或查询报告时重新提交，多个进程用条件更新该字段认领，只有一个进程重新提交
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'interview_sessions'
+        AND column_name = 'report_requested_at'
+    ) THEN
+        ALTER TABLE interview_sessions ADD COLUMN report_requested_at TIMESTAMP;
+        RAISE NOTICE 'report_requested_at 字段已添加';
+    ELSE
+        RAISE NOTICE 'report_requested_at 字段已存在，跳过';
+    END IF;
+END $$;
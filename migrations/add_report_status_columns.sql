@@ -0,0 +1,36 @@
+-- 添加报告生成状态字段到 interview_sessions 表
+-- 执行时间: 2026-10-17
+-- 说明: 面试结束后报告改为后台生成，report_status 记录 pending / ready / failed
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'interview_sessions'
+        AND column_name = 'report_status'
+    ) THEN
+        ALTER TABLE interview_sessions ADD COLUMN report_status VARCHAR(20);
+        RAISE NOTICE 'report_status 字段已添加';
+    ELSE
+        RAISE NOTICE 'report_status 字段已存在，跳过';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'interview_sessions'
+        AND column_name = 'report_error'
+    ) THEN
+        ALTER TABLE interview_sessions ADD COLUMN report_error TEXT;
+        RAISE NOTICE 'report_error 字段已添加';
+    ELSE
+        RAISE NOTICE 'report_error 字段已存在，跳过';
+    END IF;
+END $$;
+
+-- 已有报告的会话标记为 ready
+UPDATE interview_sessions
+SET report_status = 'ready'
+WHERE report_status IS NULL
+AND session_id IN (SELECT session_id FROM interview_reports);
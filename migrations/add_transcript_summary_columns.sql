@@ -0,0 +1,35 @@
+-- 添加滚动摘要字段到 interview_sessions 表
+-- 执行时间: 2026-10-17
+-- 说明: 较早的对话增量压缩为摘要，追问和报告的提示词只包含「摘要 + 最近对话」
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'interview_sessions'
+        AND column_name = 'transcript_summary'
+    ) THEN
+        ALTER TABLE interview_sessions ADD COLUMN transcript_summary TEXT;
+        RAISE NOTICE 'transcript_summary 字段已添加';
+    ELSE
+        RAISE NOTICE 'transcript_summary 字段已存在，跳过';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'interview_sessions'
+        AND column_name = 'summary_upto'
+    ) THEN
+        ALTER TABLE interview_sessions ADD COLUMN summary_upto INTEGER DEFAULT 0;
+        RAISE NOTICE 'summary_upto 字段已添加';
+    ELSE
+        RAISE NOTICE 'summary_upto 字段已存在，跳过';
+    END IF;
+END $$;
+
+-- 已有会话从头开始摘要
+UPDATE interview_sessions
+SET summary_upto = 0
+WHERE summary_upto IS NULL;
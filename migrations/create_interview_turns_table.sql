@@ -0,0 +1,46 @@
+-- 创建 interview_turns 表并迁移已有对话记录
+-- 执行时间: 2026-10-17
+-- 说明: 对话记录由 interview_sessions.transcript（JSON，每轮整体重写）改为每条发言一行、只追加的 interview_turns 表
+--       未迁移的旧会话在首次提交回答时也会由应用自动迁移，本脚本可重复执行
+
+CREATE TABLE IF NOT EXISTS interview_turns (
+    id SERIAL PRIMARY KEY,
+    session_id VARCHAR(100) NOT NULL,
+    seq INTEGER NOT NULL,
+    question_number INTEGER,
+    role VARCHAR(20) NOT NULL,
+    content TEXT NOT NULL,
+    score DOUBLE PRECISION,
+    hint TEXT,
+    feedback VARCHAR(100),
+    topic VARCHAR(50),
+    action VARCHAR(20),
+    style VARCHAR(20),
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'utc'),
+    CONSTRAINT uq_interview_turns_session_seq UNIQUE (session_id, seq)
+);
+
+CREATE INDEX IF NOT EXISTS ix_interview_turns_id ON interview_turns (id);
+CREATE INDEX IF NOT EXISTS ix_interview_turns_session_question ON interview_turns (session_id, question_number);
+
+-- 迁移旧会话的 JSON 对话记录（已有 turns 的会话跳过）
+INSERT INTO interview_turns (session_id, seq, question_number, role, content, score, hint, feedback, topic, action, style, created_at)
+SELECT
+    s.session_id,
+    t.ordinality - 1,
+    CASE WHEN t.entry->>'question_number' ~ '^-?[0-9]+$' THEN (t.entry->>'question_number')::INTEGER ELSE NULL END,
+    LEFT(t.entry->>'role', 20),
+    COALESCE(t.entry->>'content', ''),
+    -- 评分偶尔不是数值（如 "8分"），无法转换时置空，避免整个迁移失败
+    CASE WHEN t.entry->>'score' ~ '^-?[0-9]+(\.[0-9]+)?$' THEN (t.entry->>'score')::DOUBLE PRECISION ELSE NULL END,
+    t.entry->>'hint',
+    LEFT(t.entry->>'feedback', 100),
+    LEFT(t.entry->>'topic', 50),
+    LEFT(t.entry->>'action', 20),
+    LEFT(t.entry->>'style', 20),
+    COALESCE((t.entry->>'timestamp')::TIMESTAMP, s.created_at)
+FROM interview_sessions s
+CROSS JOIN LATERAL json_array_elements(s.transcript::json) WITH ORDINALITY AS t(entry, ordinality)
+WHERE s.transcript IS NOT NULL
+AND json_typeof(s.transcript::json) = 'array'
+AND NOT EXISTS (SELECT 1 FROM interview_turns it WHERE it.session_id = s.session_id);
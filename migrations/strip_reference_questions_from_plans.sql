@@ -0,0 +1,10 @@
+-- 清理 interview_plan 中保存的完整参考题目
+-- 执行时间: 2026-10-17
+-- 说明: 新会话的 interview_plan 只保存 reference_question_ids，题目内容从知识库服务的题目缓存解析
+--       已结束的旧会话不再需要参考题目，删除 reference_questions 以缩小会话行；进行中的旧会话保持不变
+
+UPDATE interview_sessions
+SET interview_plan = (interview_plan::jsonb - 'reference_questions')::json
+WHERE is_finished = TRUE
+AND interview_plan IS NOT NULL
+AND interview_plan::jsonb ? 'reference_questions';